@@ -0,0 +1,4 @@
+from controlbox.protocol.objects import (
+    register_object_types,
+    register_object_codec
+)
@@ -0,0 +1,35 @@
+"""
+Delays between attempts to reach a controller device again.
+"""
+import random
+
+
+class Backoff:
+    """
+    Jittered exponential backoff.
+
+    The first attempt is made right away, then the delay before each next
+    attempt starts at initial seconds and is multiplied by factor, up to
+    maximum. Each delay is shortened by a random fraction of up to jitter,
+    so devices lost at once don't retry in lockstep.
+    """
+    def __init__(self, initial=0.01, maximum=5.0, factor=2.0, jitter=0.5, rng=random.random):
+        if not 0 <= jitter <= 1:
+            raise ValueError("jitter must be between 0 and 1")
+
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self.rng = rng
+
+    def delays(self):
+        """
+        Yield the delays to wait before each attempt, endlessly
+        """
+        yield 0.0
+
+        delay = self.initial
+        while True:
+            yield delay * (1.0 - self.jitter * self.rng())
+            delay = min(delay * self.factor, self.maximum)
@@ -0,0 +1,486 @@
+"""
+Benchmarks of the codecs, the resolver, the framing and of whole
+controllers, the latter against VirtualControllers, up to pools of
+hundreds of them.
+
+Run with:
+
+    python -m controlbox.benchmark --output results.json
+
+Results are written as JSON, with the time per operation of every repeat,
+so runs before and after a change can be compared with --compare.
+Everything runs without any device or network, and in process but for
+the sharding benchmarks, which start worker processes.
+"""
+import argparse
+import asyncio
+import datetime
+import gc
+import json
+import logging
+import platform
+import statistics
+import sys
+import time
+import timeit
+
+import construct
+
+from .controller import Controller, ControlboxCommandMatcher
+from .conduit.framing import HexLineFraming, SLIPFraming, COBSFraming
+from .conduit.serial import SerialProtocol
+from .conduit.virtual import VirtualControllerConduit
+from .pool import ControllerPool
+from .protocol import commands
+from .protocol.commands import ReadValueCommandRequest, CBoxOpcodeEnum
+from .protocol.decoder import ResponseDecoder
+from .protocol.utils import VariableLengthIDAdapter
+from .protocol.v1 import ProtocolV1
+from .resolver import IndexedRequestResponseResolver
+from .sharding import ShardedControllers
+from .virtual import VirtualController
+
+LOGGER = logging.getLogger(__name__)
+
+OBJECT_TYPE = "SETPOINT_SIMPLE"
+
+# A request of every opcode, answered by the device of sample_device()
+SAMPLE_REQUESTS = {
+    'READ_VALUE': {"id": (1, 2), "type": OBJECT_TYPE},
+    'WRITE_VALUE': {"id": (1, 2), "type": OBJECT_TYPE, "data": b"\x00\x01\x02\x03"},
+    'CREATE_OBJECT': {"id": (1, 9), "type": OBJECT_TYPE, "reserved_size": 4, "data": b"\x00\x01\x02\x03"},
+    'DELETE_OBJECT': {"id": (1, 2)},
+    'LIST_OBJECTS': {"profile_id": 0},
+    'FREE_SLOT': {"id": (1,)},
+    'CREATE_PROFILE': {},
+    'DELETE_PROFILE': {"profile_id": 0},
+    'ACTIVATE_PROFILE': {"profile_id": 0},
+    'LOG_VALUES': {"flags": {"id_chain": True}, "id": (1,)},
+    'RESET': {"flags": {"hard_reset": True}},
+    'FREE_SLOT_ROOT': {},
+    'LIST_PROFILES': {},
+    'READ_SYSTEM_VALUE': {"id": (2,), "type": 3},
+    'SET_SYSTEM_VALUE': {"id": (2,), "type": 3, "data": b"\x00\x01"},
+    'SET_MASK_VALUE': {"id": (1, 2), "type": OBJECT_TYPE, "data": b"\xff\x00\xff\x00", "mask": b"\x0f\x0f\x0f\x0f"},
+}
+
+
+def sample_device():
+    """
+    Return a VirtualController with a container of 8 objects, and a system
+    object
+    """
+    device = VirtualController()
+    device.process_command_request(commands.CreateObjectCommandRequest.build(
+        {"id": (1,), "type": OBJECT_TYPE, "reserved_size": 0, "data": b""}))
+    for i in range(8):
+        device.process_command_request(commands.CreateObjectCommandRequest.build(
+            {"id": (1, i), "type": OBJECT_TYPE, "reserved_size": 4, "data": bytes([i, 1, 2, 3])}))
+    device.process_command_request(commands.SetSystemValueCommandRequest.build(
+        {"id": (2,), "type": 3, "data": b"\x00\x01"}))
+    return device
+
+
+def sample_conduit():
+    """
+    Return a conduit to a sample_device(), also in worker processes
+    """
+    return VirtualControllerConduit(sample_device())
+
+
+def sample_messages():
+    """
+    Return the (request, response) bytes of the sample command of every
+    opcode, each processed by a new sample device
+    """
+    mapping = ProtocolV1.command_mapping
+    messages = {}
+    for name, sample in SAMPLE_REQUESTS.items():
+        request_struct, _ = mapping[CBoxOpcodeEnum.encmapping[name]]
+        request = request_struct.build(sample)
+        messages[name] = (request, sample_device().process_command_request(request))
+    return messages
+
+
+def struct_names():
+    """
+    Return the names of the structs of the commands module, by struct
+    """
+    return {id(value): key for key, value in vars(commands).items()
+            if isinstance(value, construct.Construct)}
+
+
+class BenchmarkRunner:
+    """
+    Runs benchmarks and collects their results.
+
+    Every benchmark is repeated repeat times, and reports the time per
+    operation of each repeat. Operation counts are multiplied by scale,
+    so a small scale gives a quick, rougher run. Only the benchmarks whose
+    name contains one of the strings of only are run, when given.
+    """
+    def __init__(self, repeat=5, scale=1.0, only=None, loop=None):
+        self.repeat = repeat
+        self.scale = scale
+        self.only = only
+        self.loop = loop or asyncio.new_event_loop()
+        self.results = []
+
+    def count(self, operations):
+        return max(1, int(operations * self.scale))
+
+    def selected(self, name):
+        return not self.only or any(pattern in name for pattern in self.only)
+
+    def measure(self, name, func, calls, operations_per_call=1):
+        """
+        Time calls calls of func, each doing operations_per_call operations
+        """
+        if not self.selected(name):
+            return
+
+        number = self.count(calls)
+        timer = timeit.Timer(func)
+        # Warm up caches and lazy imports
+        timer.timeit(1)
+        operations = number * operations_per_call
+        times = [elapsed / operations for elapsed in timer.repeat(self.repeat, number)]
+        self._add(name, operations, times)
+
+    def measure_async(self, name, bench, operations):
+        """
+        Time a coroutine function doing operations operations, given their
+        count, and returning the seconds they took
+        """
+        if not self.selected(name):
+            return
+
+        number = self.count(operations)
+        times = []
+        for i in range(self.repeat):
+            # Collect garbage beforehand and not during the run, like timeit
+            gc.collect()
+            gc.disable()
+            try:
+                times.append(self.loop.run_until_complete(bench(number)) / number)
+            finally:
+                gc.enable()
+
+        self._add(name, number, times)
+
+    def _add(self, name, number, times):
+        median = statistics.median(times)
+        result = {
+            'name': name,
+            'operations': number,
+            'repeat': len(times),
+            'best': min(times),
+            'median': median,
+            'ops_per_second': 1.0 / median if median else None,
+            'times': times
+        }
+        self.results.append(result)
+        LOGGER.info("{0:<60} {1:>12.3f} us/op".format(name, median * 1e6))
+
+    def report(self):
+        return {
+            'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'construct': construct.version_string,
+            'repeat': self.repeat,
+            'scale': self.scale,
+            'unit': 'seconds per operation',
+            'results': self.results
+        }
+
+
+def bench_ids(runner):
+    adapter = VariableLengthIDAdapter()
+    for object_id in [(1,), (1, 2, 3), (1, 2, 3, 4, 5, 6, 7, 8)]:
+        raw = adapter.build(object_id)
+        label = "{0}-level".format(len(object_id))
+        runner.measure("id.build.{0}".format(label), lambda: adapter.build(object_id), 20000)
+        runner.measure("id.parse.{0}".format(label), lambda: adapter.parse(raw), 20000)
+
+
+def bench_structs(runner, messages):
+    names = struct_names()
+    for opcode, (request_struct, response_struct) in sorted(ProtocolV1.command_mapping.items()):
+        request, response = messages[CBoxOpcodeEnum.decmapping[opcode]]
+        sample = SAMPLE_REQUESTS[CBoxOpcodeEnum.decmapping[opcode]]
+        parsed_response = response_struct.parse(response)
+
+        for struct, built, parsed in [(request_struct, request, sample),
+                                      (response_struct, response, parsed_response)]:
+            name = "commands.{0}".format(names[id(struct)])
+            runner.measure(name + ".build", lambda: struct.build(parsed), 2000)
+            runner.measure(name + ".parse", lambda: struct.parse(built), 2000)
+
+
+def bench_decoder(runner, messages):
+    decoders = [("decoder", ResponseDecoder(ProtocolV1.command_mapping)),
+                ("decoder.lazy", ResponseDecoder(ProtocolV1.command_mapping, lazy=True))]
+    for prefix, decoder in decoders:
+        for opcode_name, (_, response) in sorted(messages.items()):
+            runner.measure("{0}.from_bytes.{1}".format(prefix, opcode_name),
+                           lambda: decoder.from_bytes(response), 5000)
+
+
+def bench_framing(runner, messages):
+    """
+    SerialProtocol receiving a burst of READ_VALUE responses, in the chunks
+    a serial port is read in
+    """
+    _, response = messages['READ_VALUE']
+    burst_size = runner.count(10000)
+    chunk_size = 4096
+
+    for framing in [HexLineFraming(), SLIPFraming(), COBSFraming()]:
+        name = "framing.{0}.burst".format(type(framing).__name__)
+        if not runner.selected(name):
+            continue
+
+        protocol = SerialProtocol(framing)
+        stream = framing.encode_many([response] * burst_size)
+        chunks = [stream[i:i + chunk_size] for i in range(0, len(stream), chunk_size)]
+        queue = protocol._msg_queue
+
+        def receive_burst():
+            for chunk in chunks:
+                protocol.data_received(chunk)
+            for i in range(queue.qsize()):
+                queue.get_nowait()
+
+        runner.measure(name, receive_burst, 1, burst_size)
+
+
+def bench_resolver(runner):
+    """
+    Queueing and resolving 10k pending requests at once
+    """
+    pending = 10000
+    object_ids = [tuple((i >> shift) & 0x0F for shift in (12, 8, 4, 0)) for i in range(pending)]
+    requests = [ReadValueCommandRequest.build({"id": object_id, "type": OBJECT_TYPE})
+                for object_id in object_ids]
+    responses = [construct.Container(opcode=CBoxOpcodeEnum.encmapping['READ_VALUE'])(id=object_id)
+                 for object_id in object_ids]
+
+    def resolve(timeout):
+        async def bench(number):
+            resolver = IndexedRequestResponseResolver(ControlboxCommandMatcher())
+            start = time.perf_counter()
+            futures = [resolver.queue_request(request, timeout) for request in requests[:number]]
+            for response in reversed(responses[:number]):
+                resolver.match_response(response)
+            # Let the futures clean up after themselves
+            await asyncio.sleep(0)
+            elapsed = time.perf_counter() - start
+
+            assert all(future.done() for future in futures)
+            assert resolver.unmatched_request_count == 0
+            return elapsed
+        return bench
+
+    runner.measure_async("resolver.10k_pending", resolve(None), pending)
+    runner.measure_async("resolver.10k_pending.timeout", resolve(10.0), pending)
+
+
+def bench_controller(runner):
+    """
+    Round trips through a Controller to a VirtualController
+    """
+    objects = [(i, j) for i in range(16) for j in range(16)]
+    requests = [ReadValueCommandRequest.build({"id": object_id, "type": OBJECT_TYPE})
+                for object_id in objects]
+
+    def controller_bench(pipelined, **kwargs):
+        async def bench(number):
+            device = VirtualController()
+            for object_id in objects:
+                if len(object_id) == 2 and object_id[1] == 0:
+                    device.process_command_request(commands.CreateObjectCommandRequest.build(
+                        {"id": object_id[:1], "type": OBJECT_TYPE, "reserved_size": 0, "data": b""}))
+                device.process_command_request(commands.CreateObjectCommandRequest.build(
+                    {"id": object_id, "type": OBJECT_TYPE, "reserved_size": 4, "data": b"\x00\x01\x02\x03"}))
+
+            conduit = VirtualControllerConduit(device)
+            controller = Controller(conduit, timeout=10, **kwargs)
+            controller.connect()
+            task = asyncio.ensure_future(controller.run())
+
+            start = time.perf_counter()
+            if pipelined:
+                for first in range(0, number, len(requests)):
+                    futures = [await controller.send(request)
+                               for request in requests[:min(len(requests), number - first)]]
+                    await asyncio.gather(*futures)
+            else:
+                for i in range(number):
+                    await (await controller.send(requests[i % len(requests)]))
+            elapsed = time.perf_counter() - start
+
+            conduit.close()
+            await task
+            return elapsed
+        return bench
+
+    runner.measure_async("controller.round_trip.sequential", controller_bench(False), 2000)
+    runner.measure_async("controller.round_trip.pipelined", controller_bench(True), 5000)
+    runner.measure_async("controller.round_trip.pipelined.window",
+                         controller_bench(True, max_in_flight=32), 5000)
+
+
+async def _start_devices(controllers, devices):
+    """
+    Add devices reached through sample_conduit() to a ControllerPool or
+    ShardedControllers, and start them
+    """
+    if isinstance(controllers, ShardedControllers):
+        for i in range(devices):
+            controllers.add(i, sample_conduit, timeout=10)
+        await controllers.start()
+    else:
+        for i in range(devices):
+            controllers.add(i, sample_conduit(), timeout=10)
+        controllers.start()
+
+
+async def _read_in_flight(controllers, devices, number):
+    """
+    Read the 8 objects of devices sample devices, all at once, until number
+    reads are done, and return the seconds they took
+    """
+    requests = [ReadValueCommandRequest.build({"id": (1, i), "type": OBJECT_TYPE}) for i in range(8)]
+    reads = [(name, request) for request in requests for name in range(devices)]
+
+    start = time.perf_counter()
+    for first in range(0, number, len(reads)):
+        futures = [await controllers.send(name, request)
+                   for name, request in reads[:min(len(reads), number - first)]]
+        await asyncio.gather(*futures)
+    return time.perf_counter() - start
+
+
+def bench_pool(runner):
+    """
+    Requests to 300 VirtualControllers of a ControllerPool, as fan-outs of
+    a read to every device and with every object of every device read at
+    once. Starting the devices isn't timed.
+    """
+    devices = 300
+    request = ReadValueCommandRequest.build(SAMPLE_REQUESTS['READ_VALUE'])
+
+    async def fan_out_bench(number):
+        pool = ControllerPool()
+        await _start_devices(pool, devices)
+        try:
+            start = time.perf_counter()
+            for first in range(0, number, devices):
+                responses = await pool.fan_out(request, range(min(devices, number - first)))
+                errors = [response for response in responses.values() if isinstance(response, Exception)]
+                if errors:
+                    raise errors[0]
+            return time.perf_counter() - start
+        finally:
+            await pool.stop()
+
+    async def in_flight_bench(number):
+        pool = ControllerPool()
+        await _start_devices(pool, devices)
+        try:
+            return await _read_in_flight(pool, devices, number)
+        finally:
+            await pool.stop()
+
+    runner.measure_async("pool.300_devices.fan_out", fan_out_bench, 3000)
+    runner.measure_async("pool.300_devices.in_flight", in_flight_bench, 4800)
+
+
+def bench_sharding(runner):
+    """
+    Reads from 16 VirtualControllers, 128 in flight, in process and across
+    worker processes. Starting the workers isn't timed.
+    """
+    devices = 16
+
+    def in_flight_bench(shards):
+        async def bench(number):
+            controllers = ControllerPool() if shards is None else ShardedControllers(shards)
+            await _start_devices(controllers, devices)
+            try:
+                return await _read_in_flight(controllers, devices, number)
+            finally:
+                await controllers.stop()
+        return bench
+
+    operations = 6400
+    runner.measure_async("sharding.in_flight.pool", in_flight_bench(None), operations)
+    runner.measure_async("sharding.in_flight.1_shard", in_flight_bench(1), operations)
+    runner.measure_async("sharding.in_flight.2_shards", in_flight_bench(2), operations)
+
+
+def run_benchmarks(repeat=5, scale=1.0, only=None):
+    """
+    Run every benchmark and return the report of their results
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        runner = BenchmarkRunner(repeat, scale, only, loop)
+        messages = sample_messages()
+
+        bench_ids(runner)
+        bench_structs(runner, messages)
+        bench_decoder(runner, messages)
+        bench_framing(runner, messages)
+        bench_resolver(runner)
+        bench_controller(runner)
+        bench_pool(runner)
+        bench_sharding(runner)
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+    return runner.report()
+
+
+def compare(baseline, report):
+    """
+    Return, for every benchmark of both reports, the ratio of its median
+    time in report to the one in baseline
+    """
+    baseline_medians = {result['name']: result['median'] for result in baseline['results']}
+    return {result['name']: result['median'] / baseline_medians[result['name']]
+            for result in report['results'] if result['name'] in baseline_medians}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-o", "--output", help="file to write the JSON results to, standard output by default")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="times every benchmark is repeated")
+    parser.add_argument("-s", "--scale", type=float, default=1.0, help="factor of the operation counts")
+    parser.add_argument("-k", "--only", action="append", help="only run benchmarks whose name contains this")
+    parser.add_argument("-c", "--compare", help="JSON results of a previous run to compare with")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stderr)
+
+    report = run_benchmarks(args.repeat, args.scale, args.only)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        for name, ratio in compare(baseline, report).items():
+            LOGGER.info("{0:<60} {1:>7.2f}x".format(name, ratio))
+
+
+if __name__ == "__main__":
+    main()
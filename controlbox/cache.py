@@ -0,0 +1,217 @@
+"""
+Reuse of responses received from a controller device.
+"""
+import functools
+import time
+from collections import OrderedDict
+
+
+class SingleFlight:
+    """
+    Shares one in-flight request future between every caller sending the
+    same request, and keeps the response for reuse_time seconds once it is
+    received.
+
+    Each caller gets a future of its own following the shared one, so a
+    caller giving up on its future doesn't cancel the request for the
+    others; the shared future is only cancelled once every caller did.
+
+    Only successful responses are reused: a failed or cancelled future is
+    forgotten as soon as it is done.
+    """
+    def __init__(self, reuse_time=0):
+        self.reuse_time = reuse_time
+
+        # request -> (future, expiry time or None while in flight)
+        self._flights = {}
+        self._prune_size = 64
+
+        # shared future -> number of pending futures following it
+        self._followers = {}
+
+    def __len__(self):
+        return len(self._flights)
+
+    def get(self, aRequest):
+        """
+        Return a new future following the one shared for this request, or
+        None if a new request has to be sent
+        """
+        flight = self._flights.get(aRequest)
+        if flight is None:
+            return None
+
+        future, expiry = flight
+        if future.cancelled() or (expiry is not None and future.get_loop().time() >= expiry):
+            del self._flights[aRequest]
+            return None
+
+        return self.follow(future)
+
+    def add(self, aRequest, future):
+        """
+        Share the future of a request just sent, and return a future
+        following it for its sender
+        """
+        self._prune(future.get_loop().time())
+        self._flights[aRequest] = (future, None)
+        future.add_done_callback(functools.partial(self._land, aRequest=aRequest))
+        return self.follow(future)
+
+    def follow(self, future):
+        """
+        Return a new future resolved like a shared future
+        """
+        follower = future.get_loop().create_future()
+        if future.done():
+            _copy_state(future, follower)
+            return follower
+
+        self._followers[future] = self._followers.get(future, 0) + 1
+        future.add_done_callback(functools.partial(self._resolve, follower=follower))
+        follower.add_done_callback(functools.partial(self._unfollow, future=future))
+        return follower
+
+    def _resolve(self, future, follower):
+        self._followers.pop(future, None)
+        if not follower.done():
+            _copy_state(future, follower)
+
+    def _unfollow(self, follower, future):
+        if not follower.cancelled() or future.done():
+            return
+
+        count = self._followers[future] - 1
+        if count:
+            self._followers[future] = count
+        else:
+            # Nobody awaits the response anymore
+            del self._followers[future]
+            future.cancel()
+
+    def _land(self, future, aRequest):
+        if self._flights.get(aRequest, (None,))[0] is not future:
+            return
+
+        if future.cancelled() or future.exception() is not None or self.reuse_time <= 0:
+            del self._flights[aRequest]
+        else:
+            self._flights[aRequest] = (future, future.get_loop().time() + self.reuse_time)
+
+    def _prune(self, now):
+        # Sweeping is linear, only do it once the table doubled in size
+        if len(self._flights) < self._prune_size:
+            return
+
+        expired = [request for request, (future, expiry) in self._flights.items()
+                   if expiry is not None and now >= expiry]
+        for request in expired:
+            del self._flights[request]
+
+        self._prune_size = max(64, 2 * len(self._flights))
+
+    def forget_responses(self):
+        """
+        Forget every received response, keeping in-flight requests shared
+        """
+        landed = [request for request, (future, expiry) in self._flights.items()
+                  if expiry is not None]
+        for request in landed:
+            del self._flights[request]
+
+
+def _copy_state(source, destination):
+    if source.cancelled():
+        destination.cancel()
+    elif source.exception() is not None:
+        destination.set_exception(source.exception())
+    else:
+        destination.set_result(source.result())
+
+
+class ReadValueCache:
+    """
+    A bounded LRU cache of READ_VALUE responses keyed by (object id, type).
+
+    Each entry lives for the TTL of its object type, or default_ttl if the
+    type has none. Entries are invalidated per object or all at once by the
+    commands changing the device state; responses to reads sent before an
+    invalidation are not stored.
+    """
+    def __init__(self, max_size=256, default_ttl=1.0, ttl=None, clock=time.monotonic):
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.ttl = dict(ttl or {})
+        self._clock = clock
+
+        # (object id, type) -> (response, expiry time)
+        self._entries = OrderedDict()
+        self._generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def generation(self):
+        """
+        Incremented on every invalidation
+        """
+        return self._generation
+
+    @property
+    def hit_ratio(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            response, expiry = entry
+            if self._clock() < expiry:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return response
+
+            del self._entries[key]
+
+        self.misses += 1
+        return None
+
+    def put(self, key, response, generation):
+        """
+        Store a response to a read sent when the cache was at the given
+        generation
+        """
+        if generation != self._generation:
+            return
+
+        object_id, object_type = key
+        ttl = self.ttl.get(object_type, self.default_ttl)
+        if ttl <= 0:
+            return
+
+        self._entries[key] = (response, self._clock() + ttl)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate_object(self, object_id):
+        """
+        Drop the entries of an object and of the objects it contains
+        """
+        self._generation += 1
+
+        depth = len(object_id)
+        stale = [key for key in self._entries if key[0][:depth] == object_id]
+        for key in stale:
+            del self._entries[key]
+
+    def clear(self):
+        self._generation += 1
+        self._entries.clear()
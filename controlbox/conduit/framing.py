@@ -0,0 +1,190 @@
+"""
+Framings delimit the commands sent to and received from a controller device
+on a byte stream.
+"""
+import binascii
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+
+class FramingError(ValueError):
+    """
+    Raised when a frame can't be decoded
+    """
+
+
+class Framing:
+    """
+    Abstract framing of payloads terminated by a delimiter.
+
+    Subclasses encode a payload into a frame that doesn't contain the
+    delimiter, and decode it back. Frames to decode are given as
+    bytes-like objects only valid during the call, and decoded payloads are
+    returned as bytes.
+    """
+    delimiter = None
+
+    def encode_frame(self, payload: bytes) -> bytes:
+        raise NotImplementedError
+
+    def decode_frame(self, frame: bytes) -> bytes:
+        raise NotImplementedError
+
+    def encode(self, payload: bytes) -> bytes:
+        """
+        Return the bytes to put on the wire to send a payload
+        """
+        return self.encode_frame(payload) + self.delimiter
+
+    def encode_many(self, payloads) -> bytes:
+        """
+        Return the bytes to put on the wire to send several payloads at once
+        """
+        return self.delimiter.join(map(self.encode_frame, payloads)) + self.delimiter
+
+    def decoder(self):
+        """
+        Return a new FrameDecoder for a byte stream using this framing
+        """
+        return FrameDecoder(self)
+
+
+class FrameDecoder:
+    """
+    Extracts payloads from a byte stream received in chunks.
+
+    Received bytes are accumulated in a bytearray that is only searched for
+    delimiters from the start of the new chunk, as the bytes kept from
+    previous chunks are known not to contain any. Complete frames are handed
+    to the framing as memoryview slices, and only the bytes of the trailing
+    incomplete frame are kept once a chunk is processed.
+    """
+    def __init__(self, aFraming):
+        self.framing = aFraming
+        self._buffer = bytearray()
+
+    def feed(self, data: bytes):
+        """
+        Append received bytes and return the list of payloads they complete.
+        Empty and malformed frames are skipped.
+        """
+        buffer = self._buffer
+        scan_from = len(buffer)
+        buffer += data
+
+        delimiter = self.framing.delimiter
+        end = buffer.find(delimiter, scan_from)
+        if end < 0:
+            return []
+
+        decode_frame = self.framing.decode_frame
+        payloads = []
+        start = 0
+        view = memoryview(buffer)
+        while end >= 0:
+            if end > start:
+                try:
+                    payloads.append(decode_frame(view[start:end]))
+                except FramingError as e:
+                    LOGGER.warning("discarding malformed frame {0!r}: {1}".format(
+                        bytes(view[start:end]), e))
+
+            start = end + len(delimiter)
+            end = buffer.find(delimiter, start)
+
+        view.release()
+        del buffer[:start]
+
+        return payloads
+
+
+class HexLineFraming(Framing):
+    """
+    Payloads written as hexadecimal ASCII lines, the default Controlbox
+    framing. Spaces and carriage returns are ignored on decoding.
+    """
+    delimiter = b"\n"
+
+    def encode_frame(self, payload):
+        return binascii.hexlify(payload)
+
+    def decode_frame(self, frame):
+        try:
+            return binascii.unhexlify(frame)
+        except binascii.Error:
+            pass
+
+        frame = bytes(frame).rstrip(b"\r").replace(b" ", b"")
+        try:
+            return binascii.unhexlify(frame)
+        except binascii.Error as e:
+            raise FramingError(e)
+
+    def encode_many(self, payloads):
+        return b"\n".join(map(binascii.hexlify, payloads)) + b"\n"
+
+
+class SLIPFraming(Framing):
+    """
+    Binary payloads framed as described in RFC 1055
+    """
+    END = b"\xc0"
+    ESC = b"\xdb"
+    ESC_END = b"\xdb\xdc"
+    ESC_ESC = b"\xdb\xdd"
+
+    delimiter = END
+
+    def encode_frame(self, payload):
+        return payload.replace(self.ESC, self.ESC_ESC).replace(self.END, self.ESC_END)
+
+    def decode_frame(self, frame):
+        frame = bytes(frame)
+        escapes = frame.count(self.ESC)
+        if escapes == 0:
+            return frame
+
+        # Escape sequences never overlap, so every ESC must start one of them
+        if escapes != frame.count(self.ESC_END) + frame.count(self.ESC_ESC):
+            raise FramingError("invalid escape sequence")
+
+        return frame.replace(self.ESC_END, self.END).replace(self.ESC_ESC, self.ESC)
+
+
+class COBSFraming(Framing):
+    """
+    Binary payloads framed with Consistent Overhead Byte Stuffing, using a
+    zero byte as delimiter
+    """
+    delimiter = b"\x00"
+
+    def encode_frame(self, payload):
+        encoded = bytearray()
+        for block in payload.split(b"\x00"):
+            while len(block) >= 0xFE:
+                encoded.append(0xFF)
+                encoded += block[:0xFE]
+                block = block[0xFE:]
+
+            encoded.append(len(block) + 1)
+            encoded += block
+
+        return bytes(encoded)
+
+    def decode_frame(self, frame):
+        decoded = bytearray()
+        index = 0
+        length = len(frame)
+        while index < length:
+            code = frame[index]
+            end = index + code
+            if end > length:
+                raise FramingError("truncated block")
+
+            decoded += frame[index + 1:end]
+            index = end
+            if code != 0xFF and index < length:
+                decoded.append(0)
+
+        return bytes(decoded)
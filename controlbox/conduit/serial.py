@@ -18,13 +18,17 @@ from asyncio import Queue
 from serial.aio import create_serial_connection
 from io import TextIOWrapper
 
+from .framing import HexLineFraming
+
 LOGGER = logging.getLogger(__name__)
 
 class SerialProtocol(asyncio.Protocol):
-    def __init__(self):
+    def __init__(self, framing=None):
         super(asyncio.Protocol, self).__init__()
         self._msg_queue = Queue()
-        self._buffer = ""
+        self._decoder = (framing or HexLineFraming()).decoder()
+        self._can_write = asyncio.Event()
+        self._can_write.set()
 
     def connection_made(self, transport):
         self.transport = transport
@@ -32,74 +36,114 @@ class SerialProtocol(asyncio.Protocol):
         LOGGER.debug('port opened {0}'.format(transport))
 
     async def watch_messages(self):
+        """
+        Yield the received messages until the connection is lost
+        """
         LOGGER.debug("watching message queue...")
         while True:
-            yield await self._msg_queue.get()
+            message = await self._msg_queue.get()
+            if message is None:
+                return
+            yield message
 
     def data_received(self, data):
-        self._buffer += data.decode()
+        for message in self._decoder.feed(data):
+            self._msg_queue.put_nowait(message)
 
-        for line in self._coerce_message_from_buffer():
-            LOGGER.debug("new full line: {0}".format(line))
-            line = line.replace(' ', '')
-            self._msg_queue.put_nowait(line.encode()) # FIXME: Make sure it's right
+    def pause_writing(self):
+        LOGGER.debug('transport buffer above high water mark, pausing writes')
+        self._can_write.clear()
 
+    def resume_writing(self):
+        LOGGER.debug('transport buffer below low water mark, resuming writes')
+        self._can_write.set()
 
-    def _coerce_message_from_buffer(self):
+    async def drain(self):
         """
-        Try to make a message out of the buffer and find log messages intertwined
-        into the buffer.
+        Wait until the transport buffer is below its low water mark
         """
-        log_messages = []
-        while '\n' in self._buffer:
-            # stripped_buffer, log_messages = self._filter_out_log_messages(self.buffer)
-            if len(log_messages) > 0:
-                yield from log_messages
-                self._buffer = stripped_buffer
-                continue
-
-            lines = self._buffer.partition('\n')  # returns 3-tuple with line, separator, rest
-            if not lines[1]:
-                # '\n' not found, first element is incomplete line
-                self._buffer = lines[0]
-            else:
-                # complete line received, [0] is complete line [1] is separator [2] is the rest
-                self._buffer = lines[2]
-                yield lines[0].rstrip('\r').rstrip('\n')
-
-
-
+        await self._can_write.wait()
 
     def connection_lost(self, exc):
-        LOGGER.debug('port closed')
-        asyncio.get_event_loop().stop()
+        LOGGER.debug('port closed: {0}'.format(exc))
+        self.transport = None
+        self._can_write.set()
+        self._msg_queue.put_nowait(None)
 
 
 class SerialConduit:
     """
     A Conduit for a Serial Port (using pyserial)
+
+    Messages are delimited on the line by framing, hexadecimal ASCII lines
+    by default.
+
+    Writes are buffered and handed over to the non-blocking transport on the
+    next loop iteration, so small consecutive writes go out together. Once
+    more than high_water bytes wait in the transport, writers are paused
+    until it drains below low_water.
     """
-    def __init__(self, port):
+    def __init__(self, port, high_water=4096, low_water=1024, framing=None):
         self._loop = asyncio.get_event_loop()
         self.port = port
         self.transport = None
         self.serial = serial.Serial(port, baudrate=57600)
-        self.protocol = SerialProtocol()
+        self.framing = framing or HexLineFraming()
+        self.protocol = SerialProtocol(self.framing)
+
+        self.high_water = high_water
+        self.low_water = low_water
+        self._write_buffer = bytearray()
+        self._flush_handle = None
 
     def bind(self):
-        # self.serial = Serial(self.port, baudrate=57600)
+        if not self.serial.is_open:
+            self.serial.open()
+
         self.transport = SerialTransport(self._loop, self.protocol, self.serial)
+        self.transport.set_write_buffer_limits(high=self.high_water, low=self.low_water)
         return self.transport != None
 
     async def write(self, data):
-        self.serial.write(data)
+        self._write_buffer += data
+
+        if len(self._write_buffer) >= self.high_water:
+            self.flush()
+        elif self._flush_handle is None:
+            self._flush_handle = self._loop.call_soon(self.flush)
+
+        await self.drain()
+
+    def flush(self):
+        """
+        Hand the buffered bytes over to the transport
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        if self._write_buffer:
+            self.transport.write(bytes(self._write_buffer))
+            self._write_buffer.clear()
+
+    async def drain(self):
+        """
+        Wait until the transport accepts more data
+        """
+        await self.protocol.drain()
 
     async def watch_messages(self):
-        yield await self.protocol.watch_messages()
+        async for message in self.protocol.watch_messages():
+            yield message
+
+    def close(self):
+        if self.transport is not None:
+            self.flush()
+            self.transport.close()
 
     @property
     def is_bound(self):
-        return self.serial.is_open
+        return self.transport is not None and self.serial.is_open
 
 
 class SerialConduit2():
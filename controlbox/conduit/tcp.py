@@ -0,0 +1,151 @@
+"""
+Implements a conduit over a TCP socket, e.g. to reach a controller behind a
+serial-to-Ethernet bridge.
+"""
+import asyncio
+import logging
+import socket
+from urllib.parse import urlsplit
+
+from .framing import HexLineFraming
+
+LOGGER = logging.getLogger(__name__)
+
+
+class TcpConduit:
+    """
+    A Conduit for a TCP socket (using asyncio streams)
+
+    Messages are delimited on the stream by framing, hexadecimal ASCII lines
+    by default. Nagle's algorithm is disabled, as commands are small and
+    latency bound; writes are instead buffered and handed over to the
+    socket on the next loop iteration, like on a SerialConduit.
+
+    receive_buffer is the most bytes read from the socket at once, and the
+    size requested for the socket receive buffer.
+    """
+    def __init__(self, host, port, high_water=4096, low_water=1024, framing=None,
+                 receive_buffer=65536):
+        self._loop = asyncio.get_event_loop()
+        self.host = host
+        self.port = port
+        self.framing = framing or HexLineFraming()
+        self.receive_buffer = receive_buffer
+
+        self.high_water = high_water
+        self.low_water = low_water
+        self._write_buffer = bytearray()
+        self._flush_handle = None
+
+        self.reader = None
+        self.writer = None
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        """
+        Make a conduit for a socket://host:port URL
+        """
+        parts = urlsplit(url)
+        if parts.scheme != "socket" or not parts.hostname or parts.port is None:
+            raise ValueError("expected a socket://host:port URL, got {0!r}".format(url))
+
+        return cls(parts.hostname, parts.port, **kwargs)
+
+    def bind(self):
+        """
+        Start connecting to the socket, return the task doing so, to be
+        awaited before using the conduit
+        """
+        return asyncio.ensure_future(self.open())
+
+    async def open(self):
+        """
+        Connect to the socket, closing the previous connection if any
+        """
+        self.close()
+
+        sock = await self._connect_socket()
+        self.reader, self.writer = await asyncio.open_connection(sock=sock, limit=self.receive_buffer)
+
+        self.writer.transport.set_write_buffer_limits(high=self.high_water, low=self.low_water)
+        LOGGER.debug('connected to {0}:{1}'.format(self.host, self.port))
+
+    async def _connect_socket(self):
+        """
+        Return a socket connected to the first address of the host that
+        accepts the connection
+        """
+        addresses = await self._loop.getaddrinfo(self.host, self.port, type=socket.SOCK_STREAM)
+        error = OSError("no address found for {0}:{1}".format(self.host, self.port))
+        for family, sock_type, proto, _, address in addresses:
+            sock = socket.socket(family, sock_type, proto)
+            try:
+                sock.setblocking(False)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                # The window scale is agreed on when connecting, so the
+                # receive buffer is only fully used if sized before
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.receive_buffer)
+                await self._loop.sock_connect(sock, address)
+                return sock
+            except OSError as e:
+                sock.close()
+                error = e
+            except BaseException:
+                sock.close()
+                raise
+
+        raise error
+
+    async def write(self, data):
+        self._write_buffer += data
+
+        if len(self._write_buffer) >= self.high_water:
+            self.flush()
+        elif self._flush_handle is None:
+            self._flush_handle = self._loop.call_soon(self.flush)
+
+        await self.drain()
+
+    def flush(self):
+        """
+        Hand the buffered bytes over to the socket
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        if self._write_buffer:
+            self.writer.write(bytes(self._write_buffer))
+            self._write_buffer.clear()
+
+    async def drain(self):
+        """
+        Wait until the socket accepts more data
+        """
+        await self.writer.drain()
+
+    async def watch_messages(self):
+        """
+        Yield the messages received until the connection is closed
+        """
+        decoder = self.framing.decoder()
+        while True:
+            data = await self.reader.read(self.receive_buffer)
+            if not data:
+                LOGGER.debug('connection to {0}:{1} closed'.format(self.host, self.port))
+                self.writer.close()
+                return
+
+            for message in decoder.feed(data):
+                yield message
+
+    def close(self):
+        if self._flush_handle is not None:
+            self.flush()
+
+        if self.writer is not None:
+            self.writer.close()
+
+    @property
+    def is_bound(self):
+        return self.writer is not None and not self.writer.is_closing()
@@ -0,0 +1,73 @@
+import pytest
+
+from controlbox.conduit.framing import (
+    HexLineFraming,
+    SLIPFraming,
+    COBSFraming
+)
+
+PAYLOADS = [
+    b"\x05\x00",
+    b"\x01\x81\x02\x06\x00",
+    b"\x00\x00\x00",
+    b"\xc0\xdb\xdc\xdd",
+    bytes(range(256)) * 2,
+]
+
+
+@pytest.mark.parametrize("framing", [HexLineFraming(), SLIPFraming(), COBSFraming()])
+class TestFraming:
+    def test_roundtrip(self, framing):
+        for payload in PAYLOADS:
+            encoded = framing.encode(payload)
+
+            assert encoded.endswith(framing.delimiter)
+            assert framing.delimiter not in encoded[:-1]
+            assert framing.decoder().feed(encoded) == [payload]
+
+    def test_chunked_stream(self, framing):
+        stream = framing.encode_many(PAYLOADS)
+        decoder = framing.decoder()
+
+        decoded = []
+        for i in range(0, len(stream), 3):
+            decoded += decoder.feed(stream[i:i + 3])
+
+        assert decoded == PAYLOADS
+
+    def test_large_burst(self, framing):
+        decoded = framing.decoder().feed(framing.encode_many(PAYLOADS * 500))
+
+        assert decoded == PAYLOADS * 500
+        assert all(type(payload) is bytes for payload in decoded)
+
+    def test_partial_frame_kept(self, framing):
+        encoded = framing.encode(b"\x05\x00")
+        decoder = framing.decoder()
+
+        assert decoder.feed(encoded[:-1]) == []
+        assert decoder.feed(framing.delimiter) == [b"\x05\x00"]
+
+
+class TestHexLineFraming:
+    def test_encode(self):
+        assert HexLineFraming().encode(b"\x05\x00") == b"0500\n"
+
+    def test_spaces_and_carriage_returns(self):
+        assert HexLineFraming().decoder().feed(b"05 00 01\r\n") == [b"\x05\x00\x01"]
+
+    def test_malformed_line_skipped(self):
+        assert HexLineFraming().decoder().feed(b"not hex\n\n0500\n") == [b"\x05\x00"]
+
+
+class TestSLIPFraming:
+    def test_invalid_escape_skipped(self):
+        assert SLIPFraming().decoder().feed(b"\x05\xdb\x01\xc0\x05\x00\xc0") == [b"\x05\x00"]
+
+
+class TestCOBSFraming:
+    def test_encode(self):
+        assert COBSFraming().encode(b"\x11\x22\x00\x33") == b"\x03\x11\x22\x02\x33\x00"
+
+    def test_truncated_frame_skipped(self):
+        assert COBSFraming().decoder().feed(b"\x05\x11\x00\x02\x05\x00") == [b"\x05"]
@@ -0,0 +1,112 @@
+import asyncio
+import os
+import pty
+import pytest
+
+from controlbox.conduit.serial import (
+    SerialConduit,
+    SerialProtocol
+)
+from controlbox.conduit.framing import COBSFraming
+
+
+@pytest.fixture
+def pty_port():
+    master, slave = pty.openpty()
+    yield master, os.ttyname(slave)
+    os.close(master)
+    os.close(slave)
+
+
+def read_available(fd):
+    os.set_blocking(fd, False)
+    try:
+        return os.read(fd, 4096)
+    except BlockingIOError:
+        return b""
+
+
+class TestSerialConduitWrite:
+    @pytest.mark.asyncio
+    async def test_writes_are_coalesced(self, pty_port):
+        master, port = pty_port
+        conduit = SerialConduit(port)
+        conduit.bind()
+        await asyncio.sleep(0)
+
+        writes = []
+        conduit.transport.write = writes.append
+
+        await conduit.write(b"0100060000")
+        await conduit.write(b"\n")
+        assert writes == []
+
+        await asyncio.sleep(0)
+        assert writes == [b"0100060000\n"]
+
+    @pytest.mark.asyncio
+    async def test_bytes_reach_the_port(self, pty_port):
+        master, port = pty_port
+        conduit = SerialConduit(port)
+        conduit.bind()
+
+        await conduit.write(b"0500\n")
+        await asyncio.sleep(0.05)
+
+        assert read_available(master) == b"0500\n"
+
+    @pytest.mark.asyncio
+    async def test_high_water_flushes_immediately(self, pty_port):
+        master, port = pty_port
+        conduit = SerialConduit(port, high_water=8, low_water=4)
+        conduit.bind()
+        await asyncio.sleep(0)
+
+        writes = []
+        conduit.transport.write = writes.append
+
+        await conduit.write(b"0123456789")
+        assert writes == [b"0123456789"]
+
+    @pytest.mark.asyncio
+    async def test_drain_waits_for_resume(self, pty_port):
+        master, port = pty_port
+        conduit = SerialConduit(port)
+
+        conduit.protocol.pause_writing()
+        drain = asyncio.ensure_future(conduit.drain())
+        await asyncio.sleep(0.01)
+        assert not drain.done()
+
+        conduit.protocol.resume_writing()
+        await asyncio.wait_for(drain, timeout=1)
+
+
+class TestSerialProtocol:
+    @pytest.mark.asyncio
+    async def test_messages_are_decoded(self):
+        protocol = SerialProtocol()
+        protocol.data_received(b"0500\n01")
+        protocol.data_received(b"0203\n")
+
+        messages = protocol.watch_messages()
+        assert await messages.__anext__() == b"\x05\x00"
+        assert await messages.__anext__() == b"\x01\x02\x03"
+
+    @pytest.mark.asyncio
+    async def test_binary_framing(self):
+        protocol = SerialProtocol(COBSFraming())
+        protocol.data_received(b"\x02\x05\x01\x00")
+
+        assert await protocol.watch_messages().__anext__() == b"\x05\x00"
+
+    @pytest.mark.asyncio
+    async def test_connection_lost_ends_messages(self):
+        protocol = SerialProtocol()
+        protocol.data_received(b"0500\n")
+        protocol.connection_lost(None)
+
+        messages = [message async for message in protocol.watch_messages()]
+
+        assert messages == [b"\x05\x00"]
+        assert asyncio.get_event_loop().is_running()
@@ -0,0 +1,153 @@
+import asyncio
+import socket
+from contextlib import asynccontextmanager
+
+import pytest
+
+from controlbox.conduit.tcp import TcpConduit
+from controlbox.conduit.framing import COBSFraming
+from controlbox.controller import Controller
+from controlbox.pool import ControllerPool, RUNNING
+
+
+@asynccontextmanager
+async def stand_in_device():
+    """
+    Yield the port of a stand-in device answering every line it receives
+    with the line reversed, and closing the connection on an empty line
+    """
+    async def handle(reader, writer):
+        while True:
+            line = await reader.readline()
+            if line in (b"", b"\n"):
+                break
+            writer.write(line[-2::-1] + b"\n")
+            await writer.drain()
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    try:
+        yield server.sockets[0].getsockname()[1]
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+@asynccontextmanager
+async def connected_conduit(**kwargs):
+    """
+    Yield a conduit connected to a stand-in device
+    """
+    async with stand_in_device() as port:
+        conduit = TcpConduit("127.0.0.1", port, **kwargs)
+        await conduit.bind()
+        try:
+            yield conduit
+        finally:
+            conduit.close()
+
+
+class TestTcpConduit:
+    @pytest.mark.asyncio
+    async def test_exchange_messages(self):
+        async with connected_conduit() as conduit:
+            assert conduit.is_bound
+
+            await conduit.write(b"0102\n")
+            await conduit.write(b"0304\n")
+
+            messages = conduit.watch_messages()
+            assert await asyncio.wait_for(messages.__anext__(), timeout=1) == b"\x20\x10"
+            assert await asyncio.wait_for(messages.__anext__(), timeout=1) == b"\x40\x30"
+
+    @pytest.mark.asyncio
+    async def test_nodelay(self):
+        async with connected_conduit() as conduit:
+            sock = conduit.writer.get_extra_info('socket')
+            assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+
+    @pytest.mark.asyncio
+    async def test_writes_are_coalesced(self):
+        async with connected_conduit() as conduit:
+            writes = []
+            write = conduit.writer.write
+            conduit.writer.write = writes.append
+
+            await conduit.write(b"0100060000")
+            await conduit.write(b"\n")
+            assert writes == []
+
+            await asyncio.sleep(0)
+            assert writes == [b"0100060000\n"]
+            conduit.writer.write = write
+
+    @pytest.mark.asyncio
+    async def test_messages_end_with_connection(self):
+        async with connected_conduit(framing=COBSFraming()) as conduit:
+            await conduit.write(b"\n")
+
+            messages = [message async for message in conduit.watch_messages()]
+
+            assert messages == []
+            assert not conduit.is_bound
+
+    @pytest.mark.asyncio
+    async def test_receive_buffer(self):
+        async with connected_conduit(receive_buffer=8192) as conduit:
+            sock = conduit.writer.get_extra_info('socket')
+            # Linux doubles the size requested, for its bookkeeping
+            assert 8192 <= sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF) <= 2 * 8192
+
+    @pytest.mark.asyncio
+    async def test_reopen_closes_previous_connection(self):
+        async with connected_conduit() as conduit:
+            previous = conduit.writer
+
+            await conduit.open()
+
+            assert previous.is_closing()
+            assert conduit.is_bound
+
+    @pytest.mark.asyncio
+    async def test_connection_refused(self):
+        async with stand_in_device() as port:
+            pass
+
+        conduit = TcpConduit("127.0.0.1", port)
+        with pytest.raises(OSError):
+            await conduit.bind()
+        assert not conduit.is_bound
+
+    @pytest.mark.asyncio
+    async def test_controller_open(self):
+        async with stand_in_device() as port:
+            controller = Controller(TcpConduit("127.0.0.1", port))
+
+            await controller.open()
+
+            assert controller.is_connected
+            controller.conduit.close()
+
+    @pytest.mark.asyncio
+    async def test_pool_connects(self):
+        async with stand_in_device() as port:
+            pool = ControllerPool()
+            controller = pool.add("tcp", TcpConduit("127.0.0.1", port))
+            pool.start()
+
+            for i in range(100):
+                if controller.is_connected:
+                    break
+                await asyncio.sleep(0.01)
+
+            assert controller.is_connected
+            assert pool.health("tcp").state == RUNNING
+            await pool.stop()
+            controller.conduit.close()
+
+    def test_from_url(self):
+        conduit = TcpConduit.from_url("socket://10.1.1.1:6666")
+        assert (conduit.host, conduit.port) == ("10.1.1.1", 6666)
+
+        with pytest.raises(ValueError):
+            TcpConduit.from_url("/dev/ttyACM0")
@@ -1,23 +1,158 @@
+"""
+Implements a conduit to a VirtualController, simulating the line to the
+device.
+"""
 import asyncio
+import collections
+import logging
+import random
+
+from .framing import HexLineFraming
+
+LOGGER = logging.getLogger(__name__)
+
+# Bits on the line per byte: a start bit, 8 data bits and a stop bit
+BITS_PER_BYTE = 10
+
 
 class VirtualControllerConduit:
     """
-    A Conduit for a testing purpose
+    A Conduit to a VirtualController, for testing and load testing
+    without hardware
+
+    Commands are framed as on a serial line and processed one at a time by
+    the device, each taking its latency. Giving a baud_rate throttles both
+    directions of the line to its speed. Responses are lost with a
+    probability of drop_rate, and have a byte of their frame altered with a
+    probability of corrupt_rate; corrupted frames are usually discarded by
+    the framing, or decode into a response that doesn't match its request.
     """
-    def __init__(self, aVirtualController):
+    def __init__(self, aVirtualController, framing=None, baud_rate=None, drop_rate=0.0,
+                 corrupt_rate=0.0, rng=None):
         self._loop = asyncio.get_event_loop()
         self.controller = aVirtualController
+        self.framing = framing or HexLineFraming()
+        self.baud_rate = baud_rate
+        self.drop_rate = drop_rate
+        self.corrupt_rate = corrupt_rate
+        self.rng = rng or random.Random()
+
+        self.dropped = 0
+        self.corrupted = 0
 
         self._is_bound = False
+        self._messages = None
+        self._device_decoder = None
+        self._decoder = None
+        self._deliveries = collections.deque()
+        self._delivery_handle = None
+
+        # Times at which the lines and the device are done with the bytes
+        # and commands they were given
+        self._outbound_free_at = 0.0
+        self._device_free_at = 0.0
+        self._inbound_free_at = 0.0
 
     def bind(self):
         self._is_bound = True
+        self._messages = asyncio.Queue()
+        self._device_decoder = self.framing.decoder()
+        self._decoder = self.framing.decoder()
+
+    def _transmission_time(self, size):
+        if self.baud_rate is None:
+            return 0.0
+        return size * BITS_PER_BYTE / self.baud_rate
 
     async def write(self, data):
-        self.controller.transmit_bytes(data)
+        if not self._is_bound:
+            raise ConnectionError("virtual controller conduit is closed")
+
+        now = self._loop.time()
+        received_at = max(now, self._outbound_free_at) + self._transmission_time(len(data))
+        self._outbound_free_at = received_at
+
+        controller = self.controller
+        for request in self._device_decoder.feed(data):
+            done_at = max(received_at, self._device_free_at) + controller.latency(request)
+            self._device_free_at = done_at
+
+            response = controller.process_command_request(request)
+            if response is not None:
+                self._respond(response, done_at)
+
+    def _respond(self, response, done_at):
+        if self.drop_rate and self.rng.random() < self.drop_rate:
+            self.dropped += 1
+            return
+
+        frame = self.framing.encode(response)
+        if self.corrupt_rate and self.rng.random() < self.corrupt_rate:
+            frame = self._corrupt(frame)
+
+        delivered_at = max(done_at, self._inbound_free_at) + self._transmission_time(len(frame))
+        self._inbound_free_at = delivered_at
+
+        self._deliveries.append((delivered_at, frame))
+        if self._delivery_handle is None:
+            self._delivery_handle = self._loop.call_at(delivered_at, self._deliver)
+
+    def _corrupt(self, frame):
+        """
+        Flip a bit of a frame, other than its delimiter
+        """
+        self.corrupted += 1
+        frame = bytearray(frame)
+        index = self.rng.randrange(len(frame) - len(self.framing.delimiter))
+        original = frame[index]
+        while True:
+            frame[index] = original ^ (1 << self.rng.randrange(8))
+            if frame[index] not in self.framing.delimiter:
+                return bytes(frame)
+
+    def _deliver(self):
+        """
+        Hand over the responses received by now, in order, and wait for the
+        next one
+        """
+        self._delivery_handle = None
+        deliveries = self._deliveries
+        now = self._loop.time()
+        while deliveries:
+            _, frame = deliveries.popleft()
+            for message in self._decoder.feed(frame):
+                self._messages.put_nowait(message)
+
+            if deliveries and deliveries[0][0] > now:
+                break
+
+        if deliveries:
+            self._delivery_handle = self._loop.call_at(deliveries[0][0], self._deliver)
 
     async def watch_messages(self):
-        yield await self.protocol.watch_messages()
+        """
+        Yield the responses of the device until the conduit is closed
+        """
+        messages = self._messages
+        while True:
+            message = await messages.get()
+            if message is None:
+                return
+            yield message
+
+    def close(self):
+        """
+        Close the conduit, losing the responses not yet received
+        """
+        if not self._is_bound:
+            return
+
+        self._is_bound = False
+        if self._delivery_handle is not None:
+            self._delivery_handle.cancel()
+            self._delivery_handle = None
+        self._deliveries.clear()
+        self._messages.put_nowait(None)
 
     @property
     def is_bound(self):
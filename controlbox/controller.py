@@ -1,80 +1,617 @@
+import asyncio
+import collections
+import functools
+import inspect
 import logging
-from binascii import unhexlify
+from concurrent.futures import ProcessPoolExecutor
 
-from .protocol.decoder import ResponseDecoder
+from construct import ConstructError, MappingError
+
+from .protocol.decoder import ResponseDecoder, decode_frames
 from .protocol.v1 import ProtocolV1
+from .protocol.lazy import LazyResponse
+from .protocol.fast import iter_list_objects, parse_id
+from .protocol.objects import object_types
+
+from .protocol.commands import (
+    CBoxOpcodeEnum,
+    OBJECT_ID_OPCODES,
+    ListObjectsCommandRequest
+)
 
 from .resolver import (
-    RequestResponseResolver,
-    RequestResponseMatcher
+    IndexedRequestResponseResolver,
+    IndexedRequestResponseMatcher
 )
 
 from .conduit.serial import SerialConduit
+from .conduit.framing import HexLineFraming
+from .flow import InFlightWindow
+from .cache import SingleFlight
+from .virtual import VirtualController
+
+# Former name of the virtual device
+SimpleVirtualController = VirtualController
 
-import codecs
 
 LOGGER = logging.getLogger(__name__)
 
-class ControlboxCommandMatcher(RequestResponseMatcher):
+READ_VALUE_OPCODE = CBoxOpcodeEnum.encmapping['READ_VALUE']
+LOG_VALUES_PREFIX = bytes([CBoxOpcodeEnum.encmapping['LOG_VALUES']])
+
+
+class NotConnectedError(Exception):
     """
-    Matches a Response with an awaiting Request
+    Raised when sending commands to a controller whose conduit isn't bound
     """
-    def match(self, obj1, obj2):
-        return (obj1.opcode == obj2.opcode)
 
 
-class SimpleVirtualController:
-    def transmit_bytes(self, data: bytes):
-        command = CBoxCommand.parse(data)
-        return self.process_command_request(command)
+class ConnectionLostError(ConnectionError):
+    """
+    Raised into the futures of requests that can't be replayed when the
+    conduit is lost before their response is received
+    """
 
-    def process_command_request(self, aCommandRequest, data):
-        if command.opcode == CBoxOpcodeEnum.encmapping['LIST_OBJECTS']:
-            command_request = ListObjectsCommandRequest.parse(data)
-            profile_id = command_request.profile_id
-            return ListObjectsCommandResponse.build({'id': profile_id})
 
-        return None
+class ControlboxCommandMatcher(IndexedRequestResponseMatcher):
+    """
+    Matches a Response with an awaiting Request using their opcode and, for
+    commands targeting an object, the object ID.
 
+    Requests are raw command bytes, Responses are decoded commands.
+    """
+    object_opcodes = OBJECT_ID_OPCODES
+
+    def request_key(self, aRequest):
+        opcode = aRequest[0]
+        if opcode in self.object_opcodes:
+            return (opcode, parse_id(aRequest, 1)[0])
+
+        return (opcode, None)
+
+    def response_key(self, aResponse):
+        opcode = aResponse.opcode
+        if opcode in self.object_opcodes:
+            return (opcode, tuple(aResponse.id))
+
+        return (opcode, None)
 
 
 class Controller:
     """
     A Controller represents a physical device that implements a protocol
     and communicates using a Conduit (e.g. TCP/IP, Serial port, ...).
+
+    Setting max_in_flight enables pipelining: at most that many commands
+    await a response at once. The window starts small, grows while commands
+    are answered promptly, and shrinks when they time out or their round
+    trip grows (see InFlightWindow). timeout is the default deadline of sent
+    commands, and is required with max_in_flight: lost responses give
+    their slot back when they time out.
+
+    Identical idempotent commands sent concurrently share a single request
+    on the wire, and their response is reused for reuse_time seconds.
+
+    Giving a ReadValueCache as read_cache serves READ_VALUE commands from it;
+    commands changing objects or profiles invalidate it.
+
+    Giving a FrameTrace as trace records every frame sent and received; it is
+    dumped to the log when a response can't be decoded.
+
+    Giving a LogValuesDecoder as log_decoder feeds it the values of every
+    LOG_VALUES response received, to be read in batches of columns. These
+    responses are then only decoded lazily, their entries being parsed
+    again if accessed.
+
+    Giving an executor as decode_executor moves the decoding of responses off
+    the event loop. Received frames are decoded in batches of up to
+    decode_batch_size, a batch being submitted at the latest decode_latency
+    seconds after its first frame was received, and responses are still
+    resolved in the order they were received. With a ProcessPoolExecutor,
+    workers decode with a default instance of the protocol class.
+
+    run() processes messages until the conduit is lost. Giving a Backoff as
+    reconnect makes it bind the conduit again, waiting for the backoff delays
+    between attempts, and resume. A connection lost again less than
+    reconnect.maximum seconds after reconnecting carries on with the next
+    delay rather than starting over. Idempotent requests awaiting a response
+    when the conduit was lost are sent again once reconnected, the others
+    fail with a ConnectionLostError right away.
     """
-    def __init__(self, aConduit, aProtocol=ProtocolV1()):
+    idempotent_opcodes = frozenset(CBoxOpcodeEnum.encmapping[name] for name in (
+        'READ_VALUE',
+        'LIST_OBJECTS',
+        'LIST_PROFILES',
+        'READ_SYSTEM_VALUE'
+    ))
+
+    # Commands changing the value or the existence of their target object,
+    # and of the objects it contains
+    object_invalidating_opcodes = frozenset(CBoxOpcodeEnum.encmapping[name] for name in (
+        'WRITE_VALUE',
+        'SET_MASK_VALUE',
+        'CREATE_OBJECT',
+        'DELETE_OBJECT'
+    ))
+
+    # Commands changing the whole set of objects
+    invalidating_opcodes = frozenset(CBoxOpcodeEnum.encmapping[name] for name in (
+        'ACTIVATE_PROFILE',
+        'DELETE_PROFILE',
+        'RESET'
+    ))
+
+    def __init__(self, aConduit, aProtocol=ProtocolV1(), max_in_flight=None, timeout=None,
+                 reuse_time=0, read_cache=None, trace=None, decode_executor=None,
+                 decode_batch_size=64, decode_latency=0.002, reconnect=None, log_decoder=None):
         self.conduit = aConduit
-        self.resolver = RequestResponseResolver(ControlboxCommandMatcher)
+        # Conduits predating framings send hexadecimal lines
+        self.framing = getattr(aConduit, 'framing', None) or HexLineFraming()
+        self.resolver = IndexedRequestResponseResolver(ControlboxCommandMatcher())
         self.protocol = aProtocol
+        self.timeout = timeout
+        self.single_flight = SingleFlight(reuse_time)
+        self.read_cache = read_cache
+        self.trace = trace
+        self.log_decoder = log_decoder
+        self.decode_executor = decode_executor
+        self.decode_batch_size = decode_batch_size
+        self.decode_latency = decode_latency
+
+        self.window = None
+        if max_in_flight is not None:
+            # A response that never comes would hold its slot for good
+            if timeout is None:
+                raise ValueError("pipelining needs a timeout, to free the slots of lost responses")
+            self.window = InFlightWindow(max_in_flight)
+
+        self.reconnect = reconnect
+        self._reconnect_delays = None
+        self._connected_at = None
+        self.connection_lost_count = 0
+        # Seconds between the loss of the conduit and the replay of the
+        # pending requests, for the last recoveries
+        self.recovery_times = collections.deque(maxlen=100)
 
     def connect(self):
+        """
+        Bind the conduit unless it is connected, and return what its bind()
+        returned: conduits connecting asynchronously return an awaitable,
+        see open()
+        """
         if not self.is_connected:
-            self.conduit.bind()
+            return self.conduit.bind()
+
+    async def open(self):
+        """
+        Bind the conduit unless it is connected, and wait until it is
+        """
+        bound = self.connect()
+        if inspect.isawaitable(bound):
+            await bound
+
+    async def run(self):
+        """
+        Process messages until the conduit is lost, and reconnect it if
+        enabled. Without reconnection, an OSError of the conduit is raised
+        once the pending requests are failed.
+        """
+        loop = asyncio.get_event_loop()
+        self._connected_at = loop.time()
+        while True:
+            error = None
+            try:
+                await self.process_messages()
+            except OSError as e:
+                LOGGER.warning("conduit failed: {0}".format(e))
+                error = e
+
+            lost_time = loop.time()
+            self.connection_lost_count += 1
+            replayed = self._connection_lost()
+
+            if self.reconnect is None:
+                self._fail_requests(replayed)
+                if error is not None:
+                    raise error
+                return
+
+            if (self._reconnect_delays is None
+                    or lost_time - self._connected_at >= self.reconnect.maximum):
+                self._reconnect_delays = self.reconnect.delays()
+
+            await self._reconnect()
+            self._connected_at = loop.time()
+            try:
+                await self._replay(replayed)
+            except OSError as e:
+                LOGGER.warning("conduit failed replaying requests: {0}".format(e))
+                continue
+
+            self.recovery_times.append(loop.time() - lost_time)
+
+    @property
+    def last_recovery_time(self):
+        return self.recovery_times[-1] if self.recovery_times else None
+
+    def _connection_lost(self):
+        """
+        Fail the pending requests that can't be replayed, and return the
+        others
+        """
+        if self.read_cache is not None:
+            self.read_cache.clear()
+        self.single_flight.forget_responses()
+
+        replayed = []
+        failed = []
+        for request, future in self.resolver.pending_requests():
+            if request[0] in self.idempotent_opcodes:
+                replayed.append((request, future))
+            else:
+                failed.append((request, future))
+
+        self._fail_requests(failed)
+        return replayed
+
+    def _fail_requests(self, requests):
+        for request, future in requests:
+            if not future.done():
+                future.set_exception(ConnectionLostError())
+
+    async def _reconnect(self):
+        """
+        Bind the conduit again until it is connected, waiting for the
+        backoff delays between attempts
+        """
+        for delay in self._reconnect_delays:
+            await asyncio.sleep(delay)
+
+            if await self._rebind():
+                LOGGER.info("reconnected")
+                return
+
+    async def _rebind(self):
+        """
+        Close the conduit and bind it again, return whether that connected it
+        """
+        # The transport of a lost conduit may still look open
+        close = getattr(self.conduit, 'close', None)
+        if close is not None:
+            close()
+
+        try:
+            bound = self.conduit.bind()
+            if inspect.isawaitable(bound):
+                await bound
+        except OSError as e:
+            LOGGER.debug("reconnection failed: {0}".format(e))
+            return False
+
+        return self.is_connected
+
+    async def _replay(self, requests):
+        requests = [(request, future) for request, future in requests if not future.done()]
+        if requests:
+            await self._write_commands([request for request, _ in requests],
+                                       [future for _, future in requests])
 
     async def process_messages(self):
         """
         Processes all message coming from the protocol
         """
+        if self.decode_executor is not None:
+            await self._process_messages_in_executor()
+            return
+
         async for raw_msg in self.conduit.watch_messages():
-            response_command = self.protocol.response_command_from_bytes(unhexlify(raw_msg))
+            if self.trace is not None:
+                self.trace.inbound(raw_msg)
+
+            if self._is_logged(raw_msg):
+                response_command = self._log_values(raw_msg)
+            else:
+                try:
+                    response_command = self.protocol.command_response_from_bytes(raw_msg)
+                except ConstructError as e:
+                    response_command = e
+
+            self._handle_response(raw_msg, response_command)
+
+    async def _process_messages_in_executor(self):
+        """
+        Processes all message coming from the protocol, decoding them in
+        batches in the decode executor
+        """
+        loop = asyncio.get_event_loop()
+        protocol = self.protocol
+        if isinstance(self.decode_executor, ProcessPoolExecutor):
+            protocol = type(protocol)
+
+        batches = asyncio.Queue()
+        batch = []
+        flush_handle = None
+
+        def submit_batch():
+            nonlocal batch, flush_handle
+            if flush_handle is not None:
+                flush_handle.cancel()
+                flush_handle = None
+
+            if batch:
+                decoded = loop.run_in_executor(self.decode_executor, decode_frames, protocol, batch)
+                batches.put_nowait((batch, decoded))
+                batch = []
+
+        resolving = asyncio.ensure_future(self._resolve_batches(batches))
+        try:
+            async for raw_msg in self.conduit.watch_messages():
+                if self.trace is not None:
+                    self.trace.inbound(raw_msg)
+
+                # Only LOG_VALUES responses match LOG_VALUES requests, so
+                # resolving them ahead of the frames being decoded keeps
+                # them in order
+                if self._is_logged(raw_msg):
+                    self._handle_response(raw_msg, self._log_values(raw_msg))
+                    continue
+
+                batch.append(raw_msg)
+                if len(batch) >= self.decode_batch_size:
+                    submit_batch()
+                elif flush_handle is None:
+                    flush_handle = loop.call_later(self.decode_latency, submit_batch)
+
+            submit_batch()
+            batches.put_nowait(None)
+            await resolving
+        finally:
+            if flush_handle is not None:
+                flush_handle.cancel()
+            resolving.cancel()
+
+    async def _resolve_batches(self, batches):
+        """
+        Handle the responses of decoded batches, in the order the batches
+        were submitted
+        """
+        while True:
+            item = await batches.get()
+            if item is None:
+                return
+
+            frames, decoded = item
+            try:
+                responses = await decoded
+            except Exception:
+                LOGGER.exception("failed to decode a batch of {0} responses".format(len(frames)))
+                continue
+
+            for raw_msg, response_command in zip(frames, responses):
+                self._handle_response(raw_msg, response_command)
+
+    def _handle_response(self, raw_msg, response_command):
+        """
+        Resolve the request of a decoded response, or log why it couldn't be
+        decoded
+        """
+        if isinstance(response_command, ConstructError):
+            LOGGER.warning("failed to decode response {0}: {1}".format(raw_msg, response_command))
+            if self.trace is not None:
+                self.trace.dump(LOGGER)
+        elif response_command is not None:
             self.resolver.match_response(response_command)
 
-    async def send(self, aCommand):
+    def _is_logged(self, raw_msg):
+        return self.log_decoder is not None and raw_msg[:1] == LOG_VALUES_PREFIX
+
+    def _log_values(self, raw_msg):
+        """
+        Feed a LOG_VALUES response to the log decoder, and return it decoded
+        lazily, or the error raised if it is malformed
+        """
+        try:
+            self.log_decoder.feed(raw_msg)
+        except ConstructError as e:
+            return e
+
+        return self.protocol.decoder.from_bytes(raw_msg, lazy=True)
+
+    async def send(self, aCommand, timeout=None):
+        """
+        Send a command to the device and return a future resolved with its
+        response. If a timeout (in seconds) is given, the future fails with a
+        RequestTimeoutError once it expires.
+
+        When pipelining, this waits for a free slot in the in-flight window
+        before writing the command.
+        """
+        if not self.is_connected:
+            raise NotConnectedError
+
+        future, request_future = await self._queue_command(aCommand, timeout)
+        if request_future is not None:
+            await self._write_commands([aCommand], [request_future])
+
+        return future
+
+    async def send_many(self, commands, timeout=None):
+        """
+        Send a batch of commands and return the list of futures of their
+        responses, in the same order.
+
+        The commands are framed into a single buffer and written at once.
+        When pipelining, what was framed so far is written whenever the
+        in-flight window is full, before waiting for a free slot.
+        """
         if not self.is_connected:
             raise NotConnectedError
 
-        bytes_to_send = codecs.encode(aCommand, "hex")
+        futures = []
+        to_write = []
+        written_futures = []
+        for command in commands:
+            if (self.window is not None and to_write and
+                    self.window.in_flight >= self.window.size):
+                await self._write_commands(to_write, written_futures)
+                to_write = []
+                written_futures = []
+
+            future, request_future = await self._queue_command(command, timeout)
+            futures.append(future)
+            if request_future is not None:
+                to_write.append(command)
+                written_futures.append(request_future)
+
+        if to_write:
+            await self._write_commands(to_write, written_futures)
+
+        return futures
+
+    async def send_many_as_completed(self, commands, timeout=None):
+        """
+        Send a batch of commands like send_many() and yield their responses
+        in the order they are received.
+        """
+        futures = await self.send_many(commands, timeout)
+
+        done = asyncio.Queue()
+        for future in futures:
+            future.add_done_callback(done.put_nowait)
+
+        for i in range(len(futures)):
+            future = await done.get()
+            yield future.result()
+
+    async def list_objects(self, profile_id, timeout=None):
+        """
+        Yield the definitions of the objects of a profile, one at a time.
+
+        With a lazy protocol, each object is parsed from the response message
+        when it is reached rather than all of them into a list up front.
+        """
+        command = ListObjectsCommandRequest.build({"profile_id": profile_id})
+        response = await (await self.send(command, timeout))
+
+        if isinstance(response, LazyResponse) and not response.is_decoded:
+            objects = iter_list_objects(response.message)
+        else:
+            objects = response.objects or ()
+
+        for obj in objects:
+            yield obj
+
+    async def _queue_command(self, aCommand, timeout):
+        """
+        Queue a command in the resolver and return the future of the caller,
+        and the future of the request to write on the wire, or None when
+        its response is already available or on its way.
+        """
+        opcode = aCommand[0]
+
+        cache_key = None
+        if self.read_cache is not None:
+            if opcode == READ_VALUE_OPCODE:
+                cache_key = self._cache_key(aCommand)
+                response = None if cache_key is None else self.read_cache.get(cache_key)
+                if response is not None:
+                    future = asyncio.get_event_loop().create_future()
+                    future.set_result(response)
+                    return future, None
+            else:
+                self._invalidate_cache(aCommand)
+
+        idempotent = opcode in self.idempotent_opcodes
+        if idempotent:
+            future = self.single_flight.get(aCommand)
+            if future is not None:
+                return future, None
+        else:
+            # This command may change the device state: reused responses
+            # could be stale now
+            self.single_flight.forget_responses()
+
+        if timeout is None:
+            timeout = self.timeout
+
+        sent_at = None
+        if self.window is not None:
+            sent_at = await self.window.acquire()
+
+            # Another sender may have sent the same command while we waited
+            if idempotent:
+                future = self.single_flight.get(aCommand)
+                if future is not None:
+                    self.window.release_unused()
+                    return future, None
 
         # Add this command to resolver to make sure we catch reply if the
         # controller is quick to respond
-        future = self.resolver.queue_request(aCommand)
+        future = self.resolver.queue_request(aCommand, timeout)
 
-        # Send the bytes on wire
-        await self.conduit.write(bytes_to_send)
-        await self.conduit.write(b"\n")
+        # Callers of idempotent commands get their own future, so that one of
+        # them cancelling it doesn't cancel the request for the others
+        caller_future = future
+        if idempotent:
+            caller_future = self.single_flight.add(aCommand, future)
 
-        return future
+        if cache_key is not None:
+            future.add_done_callback(functools.partial(self._cache_response,
+                                                       key=cache_key,
+                                                       generation=self.read_cache.generation))
+
+        if self.window is not None:
+            future.add_done_callback(functools.partial(self.window.release_future, sent_at=sent_at))
+
+        return caller_future, future
+
+    async def _write_commands(self, commands, futures):
+        """
+        Frame commands into a single buffer and send it on wire
+        """
+        bytes_to_send = self.framing.encode_many(commands)
+
+        trace = self.trace
+        if trace is not None:
+            for command in commands:
+                trace.outbound(command)
+
+        try:
+            await self.conduit.write(bytes_to_send)
+        except BaseException:
+            # The device will never answer commands that weren't sent
+            for future in futures:
+                future.cancel()
+            raise
+
+    def _invalidate_cache(self, aCommand):
+        opcode = aCommand[0]
+        if opcode in self.object_invalidating_opcodes:
+            object_id = parse_id(aCommand, 1)[0]
+            self.read_cache.invalidate_object(object_id)
+        elif opcode in self.invalidating_opcodes:
+            self.read_cache.clear()
+
+    @staticmethod
+    def _cache_key(aCommand):
+        """
+        Return the (object id, type) key of a READ_VALUE command in the read
+        cache, or None if it can't be cached
+        """
+        object_id, index = parse_id(aCommand, 1)
+        try:
+            return (object_id, object_types.name(aCommand[index]))
+        except (IndexError, MappingError):
+            return None
+
+    def _cache_response(self, future, key, generation):
+        if future.cancelled() or future.exception() is not None:
+            return
+
+        # Failed reads, e.g. of missing objects, are not cached
+        response = future.result()
+        if response.expectedsize >= 0:
+            self.read_cache.put(key, response, generation)
 
     @property
     def is_connected(self):
@@ -0,0 +1,147 @@
+"""
+Flow control of the commands sent to a controller device.
+"""
+import asyncio
+from collections import deque
+
+from .resolver import RequestTimeoutError
+
+
+class InFlightWindow:
+    """
+    Limits the number of requests awaiting a response from a device.
+
+    Senders acquire a slot before writing a request and release it once the
+    request is resolved; when every slot is taken, acquire() waits for one to
+    be freed.
+
+    When adaptive, the window starts at min_size and behaves like a
+    congestion window. It grows by one slot per answered request (slow
+    start) until the first congestion signal, then by one slot per full
+    window of answered requests, up to max_size. It is halved, down to
+    min_size, when a request times out, or when a request takes more than
+    rtt_tolerance times the shortest round trip seen: requests then queue
+    up in the device rather than on the host. The window is reduced at most
+    once per window of answered requests.
+    """
+    def __init__(self, max_size, min_size=1, adaptive=True, rtt_tolerance=2.0):
+        if not 1 <= min_size <= max_size:
+            raise ValueError("window sizes must verify 1 <= min_size <= max_size")
+
+        self.max_size = max_size
+        self.min_size = min_size
+        self.adaptive = adaptive
+        self.rtt_tolerance = rtt_tolerance
+
+        self._size = float(min_size if adaptive else max_size)
+        self._slow_start = True
+        self._hold = 0
+        self._in_flight = 0
+        self._waiters = deque()
+
+        # Shortest round trip time seen, in seconds
+        self.min_rtt = None
+
+    @property
+    def size(self):
+        """
+        Current number of slots in the window
+        """
+        return int(self._size)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    async def acquire(self):
+        """
+        Wait for a free slot and take it. Return the loop time at which it
+        was taken, to measure the round trip of the request.
+        """
+        loop = asyncio.get_event_loop()
+        while self._in_flight >= self.size:
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # Hand our wake-up over to the next sender
+                if waiter.done() and not waiter.cancelled():
+                    self._wake_up_waiters()
+                raise
+
+        self._in_flight += 1
+        return loop.time()
+
+    def release(self, timed_out=False, rtt=None):
+        """
+        Release the slot of an answered request, or of one that timed out,
+        given its round trip time when known
+        """
+        self._in_flight -= 1
+
+        if self.adaptive:
+            if timed_out or self._rtt_too_long(rtt):
+                self._congested()
+            else:
+                self._answered()
+
+        self._wake_up_waiters()
+
+    def release_unused(self):
+        """
+        Release a slot whose request wasn't answered nor timed out, e.g.
+        cancelled or never sent
+        """
+        self._in_flight -= 1
+        self._wake_up_waiters()
+
+    def release_future(self, future, sent_at=None):
+        """
+        Release the slot held by a request once its future is done, sent
+        at the loop time given by acquire()
+        """
+        if future.cancelled():
+            self.release_unused()
+            return
+
+        rtt = None
+        if sent_at is not None:
+            rtt = future.get_loop().time() - sent_at
+        self.release(isinstance(future.exception(), RequestTimeoutError), rtt)
+
+    def _rtt_too_long(self, rtt):
+        if rtt is None:
+            return False
+
+        if self.min_rtt is None or rtt < self.min_rtt:
+            self.min_rtt = rtt
+            return False
+
+        return rtt > self.rtt_tolerance * self.min_rtt
+
+    def _answered(self):
+        if self._hold > 0:
+            self._hold -= 1
+
+        if self._slow_start:
+            self._size = min(float(self.max_size), self._size + 1)
+        else:
+            self._size = min(float(self.max_size), self._size + 1 / self._size)
+
+    def _congested(self):
+        if self._hold > 0:
+            self._hold -= 1
+            return
+
+        self._slow_start = False
+        self._size = max(float(self.min_size), self._size / 2)
+        self._hold = self.size
+
+    def _wake_up_waiters(self):
+        free_slots = self.size - self._in_flight
+        while free_slots > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free_slots -= 1
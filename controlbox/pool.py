@@ -0,0 +1,227 @@
+"""
+Running many controller devices on one event loop.
+"""
+import asyncio
+import inspect
+import logging
+
+from .controller import Controller
+
+LOGGER = logging.getLogger(__name__)
+
+STOPPED = "stopped"
+RUNNING = "running"
+DISCONNECTED = "disconnected"
+FAILED = "failed"
+
+
+class DeviceHealth:
+    """
+    Health of a device of a ControllerPool.
+
+    state is STOPPED until the pool starts processing its messages, then
+    RUNNING until its conduit stops delivering them (DISCONNECTED) or
+    processing them raised an error (FAILED, with the error kept).
+    """
+    def __init__(self):
+        self.state = STOPPED
+        self.error = None
+        self.responses = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_response_time = None
+
+    @property
+    def is_healthy(self):
+        return self.state == RUNNING and self.consecutive_failures == 0
+
+    def request_succeeded(self, time):
+        self.responses += 1
+        self.consecutive_failures = 0
+        self.last_response_time = time
+
+    def request_failed(self):
+        self.failures += 1
+        self.consecutive_failures += 1
+
+    def request_done(self, future):
+        if future.cancelled():
+            return
+
+        if future.exception() is None:
+            self.request_succeeded(future.get_loop().time())
+        else:
+            self.request_failed()
+
+    def __repr__(self):
+        return "<DeviceHealth {0} responses={1} failures={2}>".format(
+            self.state, self.responses, self.failures)
+
+
+class ControllerPool:
+    """
+    Owns the controllers of many devices sharing an event loop.
+
+    The messages of each device are processed by a task of their own, so a
+    device failing or being unplugged doesn't affect the others; its health
+    tells what happened to it. Commands are sent to one device with send(),
+    or to many at once with fan_out().
+
+    Controllers are made by controller_factory from a conduit and the
+    keyword arguments given to add().
+    """
+    def __init__(self, controller_factory=Controller):
+        self.controller_factory = controller_factory
+        self.running = False
+
+        self._controllers = {}
+        self._health = {}
+        self._tasks = {}
+
+    def add(self, name, aConduit, **kwargs):
+        """
+        Add a device reached through aConduit, and return its controller. The
+        device is started right away if the pool is running.
+        """
+        if name in self._controllers:
+            raise KeyError("device {0!r} is already in the pool".format(name))
+
+        controller = self.controller_factory(aConduit, **kwargs)
+        self._controllers[name] = controller
+        self._health[name] = DeviceHealth()
+
+        if self.running:
+            self._start_device(name)
+
+        return controller
+
+    async def remove(self, name):
+        """
+        Stop processing the messages of a device and remove it
+        """
+        await self._stop_device(name)
+        del self._controllers[name]
+        del self._health[name]
+
+    def controller(self, name):
+        return self._controllers[name]
+
+    def health(self, name):
+        return self._health[name]
+
+    def healthy(self):
+        """
+        Return the names of the devices currently healthy
+        """
+        return [name for name, health in self._health.items() if health.is_healthy]
+
+    def __len__(self):
+        return len(self._controllers)
+
+    def __iter__(self):
+        return iter(self._controllers)
+
+    def __contains__(self, name):
+        return name in self._controllers
+
+    def start(self):
+        """
+        Connect every device and start processing their messages
+        """
+        self.running = True
+        for name in self._controllers:
+            self._start_device(name)
+
+    async def stop(self):
+        """
+        Stop processing the messages of every device
+        """
+        self.running = False
+        await asyncio.gather(*[self._stop_device(name) for name in list(self._tasks)])
+
+    def _start_device(self, name):
+        controller = self._controllers[name]
+        health = self._health[name]
+        health.state = RUNNING
+        health.error = None
+
+        # Conduits binding synchronously are connected right away, the
+        # others by the task of the device
+        try:
+            bound = controller.connect()
+        except Exception as e:
+            LOGGER.warning("can't connect device {0}: {1}".format(name, e))
+            health.state = FAILED
+            health.error = e
+            return
+
+        task = asyncio.ensure_future(self._run_device(controller, bound))
+        task.add_done_callback(lambda task: self._device_stopped(name, task))
+        self._tasks[name] = task
+
+    @staticmethod
+    async def _run_device(controller, bound):
+        if inspect.isawaitable(bound):
+            await bound
+        await controller.run()
+
+    def _device_stopped(self, name, task):
+        if self._tasks.get(name) is task:
+            del self._tasks[name]
+
+        health = self._health.get(name)
+        if health is None or task.cancelled():
+            return
+
+        error = task.exception()
+        if error is None:
+            LOGGER.info("device {0} disconnected".format(name))
+            health.state = DISCONNECTED
+        else:
+            LOGGER.warning("device {0} failed: {1!r}".format(name, error))
+            health.state = FAILED
+            health.error = error
+
+    async def _stop_device(self, name):
+        task = self._tasks.pop(name, None)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        self._health[name].state = STOPPED
+
+    async def send(self, name, aCommand, timeout=None):
+        """
+        Send a command to a device and return the future of its response
+        """
+        health = self._health[name]
+        try:
+            future = await self._controllers[name].send(aCommand, timeout)
+        except Exception:
+            health.request_failed()
+            raise
+
+        future.add_done_callback(health.request_done)
+        return future
+
+    async def fan_out(self, aCommand, names=None, timeout=None):
+        """
+        Send a command to many devices, every device of the pool by default,
+        and return a dict mapping their names to their response, or to the
+        exception raised getting it.
+
+        aCommand may also be a dict mapping device names to the command to
+        send to each of them.
+        """
+        if isinstance(aCommand, dict):
+            commands = aCommand
+        else:
+            commands = {name: aCommand for name in (self._controllers if names is None else names)}
+
+        async def request(name, command):
+            return await (await self.send(name, command, timeout))
+
+        results = await asyncio.gather(*[request(name, command) for name, command in commands.items()],
+                                       return_exceptions=True)
+
+        return dict(zip(commands, results))
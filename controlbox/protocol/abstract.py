@@ -1,7 +1,40 @@
+from .compiled import compiled_command_mapping
+
+
 class ControlboxProtocol:
     """
     A Protocol maps low-level opcodes with higher level objects and allow
     encoding/decoding of messages.
+
+    command_mapping maps each opcode to its (request, response) structs.
+    Third-party protocols extend it in a subclass, or register commands on a
+    protocol instance with register_command().
+
+    When compiled is set, responses are decoded with compiled variants of
+    the structs where construct supports it. When lazy is set, responses are
+    only decoded when their fields are accessed, see LazyResponse.
     """
+    decoder_class = None
     decoder = None
     command_mapping = {}
+
+    def __init__(self, compiled=False, lazy=False):
+        self.compiled = compiled
+        if compiled:
+            self.command_mapping = compiled_command_mapping(self.command_mapping)
+        else:
+            self.command_mapping = dict(self.command_mapping)
+
+        self.decoder = self.decoder_class(self.command_mapping, lazy=lazy)
+
+    def register_command(self, opcode: int, aRequestStruct, aResponseStruct):
+        """
+        Register the request and response structs of an opcode, replacing
+        those already registered
+        """
+        if self.compiled:
+            aRequestStruct, aResponseStruct = compiled_command_mapping(
+                {opcode: (aRequestStruct, aResponseStruct)})[opcode]
+
+        self.command_mapping[opcode] = (aRequestStruct, aResponseStruct)
+        self.decoder.register(opcode, aResponseStruct)
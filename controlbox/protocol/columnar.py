@@ -0,0 +1,164 @@
+"""
+Columnar decoding of LOG_VALUES responses into NumPy structured arrays.
+
+Logging many objects every second makes a Container per logged value far
+too heavy. LogValuesDecoder parses the entries of many responses straight
+into preallocated columns, and converts their fixed-point values to floats
+in one vectorized operation per batch.
+
+NumPy is an optional dependency, only needed to use this module.
+"""
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from construct import ConstError, FormatFieldError
+
+from .commands import CBoxOpcodeEnum
+from .fast import parse_id, parse_varint
+
+LOG_VALUES = CBoxOpcodeEnum.encmapping['LOG_VALUES']
+
+# Longest ID kept in the id column, longer IDs are truncated
+MAX_ID_SIZE = 8
+
+# Sets the high bit of every byte of a wire ID, so it has no null byte
+_ID_KEYS = bytes(b | 0x80 for b in range(256))
+
+# Largest value, in bytes, converted to a number
+MAX_VALUE_SIZE = 8
+
+LOG_VALUE_DTYPE = [
+    ('timestamp', 'f8'),
+    ('id', 'S{0}'.format(MAX_ID_SIZE)),
+    ('value', 'f8')
+]
+
+
+def id_key(object_id) -> bytes:
+    """
+    Return the value of the id column for an object ID. IDs are decoded back
+    from the column with decode_id().
+    """
+    return bytes([b | 0x80 for b in object_id])
+
+
+class LogValuesDecoder:
+    """
+    Accumulates the values of LOG_VALUES responses and returns them in
+    batches, as structured arrays with timestamp, id and value columns.
+
+    ids are kept as the keys given by id_key(). Values are read as signed
+    little-endian fixed-point numbers and divided by scale; values empty or
+    longer than MAX_VALUE_SIZE bytes are NaN.
+    """
+    def __init__(self, capacity=4096, scale=256.0, clock=time.monotonic):
+        if numpy is None:
+            raise ImportError("numpy is required for columnar LOG_VALUES decoding")
+
+        self.scale = scale
+        self.clock = clock
+        self._count = 0
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self._timestamps = numpy.empty(capacity, dtype='f8')
+        self._ids = numpy.empty(capacity, dtype='S{0}'.format(MAX_ID_SIZE))
+        self._raw_values = numpy.empty(capacity, dtype='i8')
+        self._sizes = numpy.empty(capacity, dtype='u4')
+
+    def _grow(self):
+        count = self._count
+        timestamps, ids = self._timestamps, self._ids
+        raw_values, sizes = self._raw_values, self._sizes
+
+        self._allocate(2 * len(timestamps))
+        self._timestamps[:count] = timestamps[:count]
+        self._ids[:count] = ids[:count]
+        self._raw_values[:count] = raw_values[:count]
+        self._sizes[:count] = sizes[:count]
+
+    def __len__(self):
+        return self._count
+
+    def feed(self, msg: bytes, timestamp=None):
+        """
+        Add the values of a LOG_VALUES response, logged at timestamp or now.
+        Raises a ConstructError if the message is malformed, in which case
+        none of its values is added.
+        """
+        if timestamp is None:
+            timestamp = self.clock()
+
+        ids, values, sizes = self._parse_entries(msg)
+
+        start = self._count
+        end = start + len(ids)
+        while end > len(self._timestamps):
+            self._grow()
+
+        self._timestamps[start:end] = timestamp
+        self._ids[start:end] = ids
+        self._raw_values[start:end] = values
+        self._sizes[start:end] = sizes
+        self._count = end
+
+    @staticmethod
+    def _parse_entries(msg):
+        """
+        Return the id keys, raw values and sizes of the entries of a message,
+        as lists
+        """
+        msg = bytes(msg)
+        if not msg or msg[0] != LOG_VALUES:
+            raise ConstError("expected LOG_VALUES")
+
+        if len(msg) < 2:
+            raise FormatFieldError("truncated message")
+
+        index = 2
+        if msg[1] & 0x01:
+            _, index = parse_id(msg, index)
+
+        ids = []
+        values = []
+        sizes = []
+        end = len(msg)
+        while index < end:
+            start = index
+            _, index = parse_id(msg, index)
+            ids.append(msg[start:index].translate(_ID_KEYS))
+
+            size, index = parse_varint(msg, index)
+            if index + size > end:
+                raise FormatFieldError("truncated value")
+
+            if 0 < size <= MAX_VALUE_SIZE:
+                values.append(int.from_bytes(msg[index:index + size], 'little', signed=True))
+            else:
+                values.append(0)
+
+            sizes.append(size)
+            index += size
+
+        return ids, values, sizes
+
+    def batch(self):
+        """
+        Return the values added since the last batch as a structured array,
+        and start a new batch
+        """
+        count = self._count
+        values = numpy.empty(count, dtype=LOG_VALUE_DTYPE)
+        values['timestamp'] = self._timestamps[:count]
+        values['id'] = self._ids[:count]
+
+        sizes = self._sizes[:count]
+        numpy.divide(self._raw_values[:count], self.scale, out=values['value'])
+        values['value'][(sizes == 0) | (sizes > MAX_VALUE_SIZE)] = numpy.nan
+
+        self._count = 0
+        return values
@@ -7,6 +7,7 @@ import logging
 from construct import *
 
 from controlbox.protocol.utils import VariableLengthIDAdapter
+from controlbox.protocol.objects import ObjectTypeAdapter, object_types
 
 LOGGER = logging.getLogger(__name__)
 
@@ -31,11 +32,21 @@ CBoxOpcodeEnum = Enum(Byte,
                       SET_MASK_VALUE = 17
 )
 
-# FIXME
-BrewBloxObjectTypeEnum = Enum(Byte,
-                              TEMPERATURE_SENSOR = 6,
-                              SETPOINT_SIMPLE = 7
-)
+# Opcodes whose command is immediately followed by an object ID, in both the
+# request and the response
+OBJECT_ID_OPCODES = frozenset(CBoxOpcodeEnum.encmapping[name] for name in (
+    'READ_VALUE',
+    'WRITE_VALUE',
+    'CREATE_OBJECT',
+    'DELETE_OBJECT',
+    'FREE_SLOT',
+    'READ_SYSTEM_VALUE',
+    'SET_SYSTEM_VALUE',
+    'SET_MASK_VALUE'
+))
+
+# Object types are registered in controlbox.protocol.objects.object_types
+ObjectType = ObjectTypeAdapter(object_types)
 
 CBoxCommand = Struct(
     "opcode" / CBoxOpcodeEnum,
@@ -48,13 +59,18 @@ CreateObjectCommandHeader = Struct(
 )
 
 CreateObjectCommandRequest = CreateObjectCommandHeader + Struct(
-    "type" / BrewBloxObjectTypeEnum,
+    "type" / ObjectType,
     "reserved_size" / Byte,
     "data" / PrefixedArray(VarInt, Byte)
 )
 
+# An object as listed in LIST_OBJECTS responses, with its decoded payload
+ObjectDefinition = CreateObjectCommandRequest + Struct(
+    "value" / Computed(lambda ctx: object_types.decode(ctx.type, ctx.data))
+)
+
 CreateObjectCommandResponse = CreateObjectCommandHeader + Struct(
-    "type" / Optional(BrewBloxObjectTypeEnum),
+    "type" / Optional(ObjectType),
     "reserved_size" / Byte,
     "data" / Optional(PrefixedArray(VarInt, Byte)),
     "status" / Int8sb,
@@ -102,7 +118,7 @@ ListObjectsCommandRequest = Struct(
 ListObjectsCommandResponse = ListObjectsCommandRequest + Struct(
     "status" / Int8sb,
     Padding(1), # FIXME Protocol error?
-    "objects" / Optional(Sequence(CreateObjectCommandRequest)),
+    "objects" / GreedyRange(ObjectDefinition),
     "terminator" / Const(0x00, Byte),
     Terminated
 )
@@ -111,7 +127,7 @@ ListObjectsCommandResponse = ListObjectsCommandRequest + Struct(
 ReadValueCommandHeader = Struct(
     "opcode" / Const(CBoxOpcodeEnum.encmapping['READ_VALUE'], Byte),
     "id" / VariableLengthIDAdapter(),
-    "type" / BrewBloxObjectTypeEnum
+    "type" / ObjectType
 )
 
 ReadValueCommandRequest = ReadValueCommandHeader + Struct(
@@ -120,9 +136,10 @@ ReadValueCommandRequest = ReadValueCommandHeader + Struct(
 
 ReadValueCommandResponse = ReadValueCommandHeader + Struct(
     "expectedsize" / Int8sb,
-    "real-type" / BrewBloxObjectTypeEnum,
+    "real-type" / ObjectType,
     Padding(1),
     "data" / Optional(PascalString(VarInt)),
+    "value" / Computed(lambda ctx: object_types.decode(ctx["real-type"], ctx.data)),
     Terminated
 )
 
@@ -149,6 +166,126 @@ ResetCommandRequest = Struct(
 
 
 
+ResetCommandResponse = ResetCommandRequest + Struct(
+    "status" / Int8sb,
+    Terminated
+)
+
+# WRITE VALUE
+WriteValueCommandHeader = Struct(
+    "opcode" / Const(CBoxOpcodeEnum.encmapping['WRITE_VALUE'], Byte),
+    "id" / VariableLengthIDAdapter(),
+    "type" / ObjectType
+)
+
+WriteValueCommandRequest = WriteValueCommandHeader + Struct(
+    "data" / PascalString(VarInt)
+)
+
+WriteValueCommandResponse = WriteValueCommandRequest + Struct(
+    "status" / Int8sb,
+    Terminated
+)
+
+# SET MASK VALUE
+SetMaskValueCommandRequest = Struct(
+    "opcode" / Const(CBoxOpcodeEnum.encmapping['SET_MASK_VALUE'], Byte),
+    "id" / VariableLengthIDAdapter(),
+    "type" / ObjectType,
+    "data" / PascalString(VarInt),
+    "mask" / PascalString(VarInt)
+)
+
+SetMaskValueCommandResponse = SetMaskValueCommandRequest + Struct(
+    "status" / Int8sb,
+    Terminated
+)
+
+# FREE SLOT
+FreeSlotCommandRequest = Struct(
+    "opcode" / Const(CBoxOpcodeEnum.encmapping['FREE_SLOT'], Byte),
+    "id" / VariableLengthIDAdapter()
+)
+
+FreeSlotCommandResponse = FreeSlotCommandRequest + Struct(
+    "slot" / Int8sb,
+    Terminated
+)
+
+# FREE SLOT ROOT
+FreeSlotRootCommandRequest = Struct(
+    "opcode" / Const(CBoxOpcodeEnum.encmapping['FREE_SLOT_ROOT'], Byte),
+)
+
+FreeSlotRootCommandResponse = FreeSlotRootCommandRequest + Struct(
+    "slot" / Int8sb,
+    Terminated
+)
+
+# DELETE PROFILE
+DeleteProfileCommandRequest = Struct(
+    "opcode" / Const(CBoxOpcodeEnum.encmapping['DELETE_PROFILE'], Byte),
+    "profile_id" / Int8sb
+)
+
+DeleteProfileCommandResponse = DeleteProfileCommandRequest + Struct(
+    "status" / Int8sb,
+    Terminated
+)
+
+# LOG VALUES
+LogValuesCommandRequest = Struct(
+    "opcode" / Const(CBoxOpcodeEnum.encmapping['LOG_VALUES'], Byte),
+    "flags" / FlagsEnum(Byte,
+                        id_chain=1,
+                        default=0),
+    "id" / If(this.flags.id_chain, VariableLengthIDAdapter())
+)
+
+LogValueEntry = Struct(
+    "id" / VariableLengthIDAdapter(),
+    "data" / PascalString(VarInt)
+)
+
+# See controlbox.protocol.columnar to decode many responses at once
+LogValuesCommandResponse = LogValuesCommandRequest + Struct(
+    "entries" / GreedyRange(LogValueEntry),
+    Terminated
+)
+
+# READ SYSTEM VALUE
+ReadSystemValueCommandHeader = Struct(
+    "opcode" / Const(CBoxOpcodeEnum.encmapping['READ_SYSTEM_VALUE'], Byte),
+    "id" / VariableLengthIDAdapter(),
+    "type" / Byte
+)
+
+ReadSystemValueCommandRequest = ReadSystemValueCommandHeader + Struct(
+    "size" / Default(Int8ub, 0)
+)
+
+ReadSystemValueCommandResponse = ReadSystemValueCommandHeader + Struct(
+    "expectedsize" / Int8sb,
+    "real-type" / Byte,
+    Padding(1),
+    "data" / Optional(PascalString(VarInt)),
+    Terminated
+)
+
+# SET SYSTEM VALUE
+SetSystemValueCommandRequest = Struct(
+    "opcode" / Const(CBoxOpcodeEnum.encmapping['SET_SYSTEM_VALUE'], Byte),
+    "id" / VariableLengthIDAdapter(),
+    "type" / Byte,
+    "data" / PascalString(VarInt)
+)
+
+SetSystemValueCommandResponse = SetSystemValueCommandRequest + Struct(
+    "status" / Int8sb,
+    Terminated
+)
+
+
 from construct.lib import hexlify
 
 if __name__ == "__main__":
@@ -156,9 +293,9 @@ if __name__ == "__main__":
     from construct import *
     from construct.lib import *
 
-    from controlbox.protocol.decoder import ResponseDecoder
+    from controlbox.protocol.v1 import ProtocolV1
 
-    decoder = ResponseDecoder()
+    decoder = ProtocolV1().decoder
 
     from controlbox.protocol.protobuf.OneWireTempSensor_pb2 import OneWireTempSensor
 
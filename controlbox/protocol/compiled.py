@@ -0,0 +1,52 @@
+"""
+Compiled variants of the command structs.
+
+Construct 2.9 and later can compile a struct into generated Python code that
+parses and builds much faster than the interpreted combinators. Compiled
+variants are built once, on first use, and the interpreted struct is used
+as a fallback when compiling isn't supported, either by the installed
+construct or by one of the struct fields.
+"""
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+_compiled_structs = {}
+
+
+def compiled(aStruct):
+    """
+    Return the compiled variant of aStruct, or aStruct itself if it can't be
+    compiled
+    """
+    try:
+        return _compiled_structs[id(aStruct)][1]
+    except KeyError:
+        pass
+
+    compiled_struct = aStruct
+    compile_struct = getattr(aStruct, "compile", None)
+    if compile_struct is not None:
+        try:
+            compiled_struct = compile_struct()
+        except Exception as e:
+            LOGGER.debug("can't compile {0}, using it interpreted: {1}".format(aStruct, e))
+
+    # Keep a reference to the struct so its id isn't reused
+    _compiled_structs[id(aStruct)] = (aStruct, compiled_struct)
+
+    return compiled_struct
+
+
+def is_compiled(aStruct):
+    return compiled(aStruct) is not aStruct
+
+
+def compiled_command_mapping(command_mapping):
+    """
+    Return a copy of a protocol command mapping using compiled structs
+    """
+    return {
+        opcode: tuple(compiled(struct) if struct is not None else None for struct in structs)
+        for opcode, structs in command_mapping.items()
+    }
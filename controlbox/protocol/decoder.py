@@ -1,55 +1,79 @@
 import logging
 
-LOGGER = logging.getLogger(__name__)
+from construct import ConstructError
+
+from .fast import FAST_PARSERS
+from .lazy import LazyResponse
 
-from .commands import (
-    CBoxCommand,
-    ReadValueCommandResponse,
-    CreateObjectCommandResponse,
-    ListProfilesCommandResponse,
-    ListObjectsCommandResponse,
-    DeleteObjectCommandResponse
-)
+LOGGER = logging.getLogger(__name__)
 
 
 class ResponseDecoder:
     """
-    Try to decode a sequence of bytes and make matching python objects
+    Try to decode a sequence of bytes and make matching python objects.
+
+    Responses are decoded with the struct registered for their opcode, found
+    by indexing a table with the first byte of the message. Structs having a
+    hand-written fast parser are decoded with it.
+
+    When lazy, from_bytes returns LazyResponses only decoding their header
+    until their fields are accessed.
     """
-    def from_bytes(self, msg : bytes):
-        from binascii import hexlify
-        LOGGER.debug("<-- {0} / {1}".format(msg, hexlify(msg)))
-
-        res = CBoxCommand.parse(msg)
-
-        if res.opcode == "READ_VALUE":
-            print("<-- READ VALUE")
-            decoded = ReadValueCommandResponse.parse(msg)
-            print(decoded)
-            from controlbox.protocol.protobuf.OneWireTempSensor_pb2 import OneWireTempSensor
-            sens = OneWireTempSensor()
-            sens.ParseFromString(decoded.data)
-            LOGGER.debug("Address: 0x{0}".format(hexlify(sens.settings.address).decode()))
-            LOGGER.debug("Is Connected? {0}".format(sens.state.connected))
-            LOGGER.debug("Temperature: {0}".format(sens.state.value/256.0))
-
-        elif res.opcode == "CREATE_OBJECT":
-            LOGGER.debug("<-- CREATE OBJECT")
-            return CreateObjectCommandResponse.parse(msg)
-        elif res.opcode == "CREATE_PROFILE":
-            LOGGER.debug("<-- CREATE PROFILE")
-            return CreateProfileCommandResponse.parse(msg)
-        elif res.opcode == "ACTIVATE_PROFILE":
-            LOGGER.debug("<-- ACTIVATE PROFILE")
-            return ActivateProfileCommandResponse.parse(msg)
-        elif res.opcode == "LIST_OBJECTS":
-            LOGGER.debug("<-- LIST OBJECTS")
-            return ListObjectsCommandResponse.parse(msg)
-        elif res.opcode == "DELETE_OBJECT":
-            LOGGER.debug("<-- DELETE OBJECT")
-            return DeleteObjectCommandResponse.parse(msg)
-        elif res.opcode == "LIST_PROFILES":
-            LOGGER.debug("<-- LIST PROFILES")
-            return ListProfilesCommandResponse.parse(msg)
-
-        return None
+    def __init__(self, command_mapping=None, lazy=False):
+        self.lazy = lazy
+        self._parsers = {}
+
+        for opcode, (request, response) in (command_mapping or {}).items():
+            self.register(opcode, response)
+
+    def register(self, opcode: int, aResponseStruct):
+        """
+        Decode responses starting with opcode using aResponseStruct
+        """
+        self._parsers[opcode] = FAST_PARSERS.get(aResponseStruct, aResponseStruct.parse)
+
+    def from_bytes(self, msg : bytes, lazy=None):
+        """
+        Return the response decoded from msg, or None if its opcode is
+        unknown. lazy overrides the laziness of the decoder.
+        """
+        try:
+            parse = self._parsers[msg[0]]
+        except (KeyError, IndexError):
+            LOGGER.debug("<-- unknown response {0}".format(msg))
+            return None
+
+        if self.lazy if lazy is None else lazy:
+            return LazyResponse(msg, parse)
+
+        return parse(msg)
+
+
+# Protocol instances of worker processes, by protocol class
+_worker_protocols = {}
+
+
+def decode_frames(aProtocol, frames):
+    """
+    Decode a batch of frames with aProtocol, for use in an executor. Return
+    for each frame its response, None when its opcode is unknown, or the
+    ConstructError raised decoding it.
+
+    aProtocol may be given as a class, as protocol instances can't be sent to
+    worker processes; a default instance is then created once per process.
+    """
+    if isinstance(aProtocol, type):
+        try:
+            aProtocol = _worker_protocols[aProtocol]
+        except KeyError:
+            aProtocol = _worker_protocols[aProtocol] = aProtocol()
+
+    decode = aProtocol.command_response_from_bytes
+    results = []
+    for frame in frames:
+        try:
+            results.append(decode(frame))
+        except ConstructError as e:
+            results.append(e)
+
+    return results
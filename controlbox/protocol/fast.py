@@ -0,0 +1,254 @@
+"""
+Hand-written decoders for the most frequent responses.
+
+READ_VALUE and LIST_OBJECTS responses make most of the traffic of a
+controller, with LOG_VALUES responses when values are logged. They are
+parsed here with plain byte indexing and the struct module rather than
+through construct, into the same containers as their construct
+definitions, raising the same kind of ConstructError on malformed
+messages.
+"""
+from struct import Struct
+
+from construct import (
+    Container,
+    FlagsContainer,
+    ListContainer,
+    ConstError,
+    FormatFieldError,
+    TerminatedError
+)
+
+from .commands import (
+    CBoxOpcodeEnum,
+    ReadValueCommandResponse,
+    ListObjectsCommandResponse,
+    LogValuesCommandResponse
+)
+from .objects import object_types
+from .utils import decode_id
+
+READ_VALUE = CBoxOpcodeEnum.encmapping['READ_VALUE']
+CREATE_OBJECT = CBoxOpcodeEnum.encmapping['CREATE_OBJECT']
+LIST_OBJECTS = CBoxOpcodeEnum.encmapping['LIST_OBJECTS']
+LOG_VALUES = CBoxOpcodeEnum.encmapping['LOG_VALUES']
+
+_signed_pair = Struct("bb")
+_signed_unsigned = Struct("bB")
+
+
+def parse_id(msg, index):
+    """
+    Return the variable length ID starting at index, and the index of the
+    byte following it
+    """
+    start = index
+    try:
+        while msg[index] & 0xF0:
+            index += 1
+    except IndexError:
+        raise FormatFieldError("truncated id")
+
+    index += 1
+    return decode_id(bytes(msg[start:index])), index
+
+
+def parse_varint(msg, index):
+    """
+    Return the VarInt starting at index, and the index of the byte following
+    it
+    """
+    num = 0
+    shift = 0
+    try:
+        while True:
+            b = msg[index]
+            index += 1
+            num |= (b & 0x7F) << shift
+            if not b & 0x80:
+                return num, index
+            shift += 7
+    except IndexError:
+        raise FormatFieldError("truncated varint")
+
+
+def _read_byte(msg, index):
+    try:
+        return msg[index]
+    except IndexError:
+        raise FormatFieldError("truncated message")
+
+
+def _parse_object(msg, index):
+    """
+    Parse a CreateObjectCommandRequest starting at index, return it with the
+    index of the byte following it
+    """
+    if _read_byte(msg, index) != CREATE_OBJECT:
+        raise ConstError("expected CREATE_OBJECT")
+
+    object_id, index = parse_id(msg, index + 1)
+    object_type = object_types.name(_read_byte(msg, index))
+    reserved_size = _read_byte(msg, index + 1)
+    size, index = parse_varint(msg, index + 2)
+
+    end = index + size
+    if end > len(msg):
+        raise FormatFieldError("truncated object data")
+
+    data = msg[index:end]
+    obj = Container({
+        'opcode': CREATE_OBJECT,
+        'id': object_id,
+        'type': object_type,
+        'reserved_size': reserved_size,
+        'data': ListContainer(data),
+        'value': object_types.decode(object_type, data)
+    })
+
+    return obj, end
+
+
+def parse_read_value_response(msg):
+    """
+    Parse a message like ReadValueCommandResponse.parse()
+    """
+    msg = memoryview(msg)
+
+    if _read_byte(msg, 0) != READ_VALUE:
+        raise ConstError("expected READ_VALUE")
+
+    object_id, index = parse_id(msg, 1)
+    object_type = object_types.name(_read_byte(msg, index))
+
+    try:
+        expected_size, real_type = _signed_unsigned.unpack_from(msg, index + 1)
+    except Exception:
+        raise FormatFieldError("truncated message")
+
+    real_type = object_types.name(real_type)
+
+    # Padding
+    index += 4
+    if index > len(msg):
+        raise FormatFieldError("truncated padding")
+
+    data = None
+    if index < len(msg):
+        size, data_index = parse_varint(msg, index)
+        if data_index + size == len(msg):
+            data = msg[data_index:].tobytes()
+            index = len(msg)
+
+    if index != len(msg):
+        raise TerminatedError("expected end of message")
+
+    return Container({
+        'opcode': READ_VALUE,
+        'id': object_id,
+        'type': object_type,
+        'expectedsize': expected_size,
+        'real-type': real_type,
+        'data': data,
+        'value': object_types.decode(real_type, data)
+    })
+
+
+def parse_list_objects_response(msg):
+    """
+    Parse a message like ListObjectsCommandResponse.parse()
+    """
+    if _read_byte(msg, 0) != LIST_OBJECTS:
+        raise ConstError("expected LIST_OBJECTS")
+
+    try:
+        profile_id, status = _signed_pair.unpack_from(msg, 1)
+    except Exception:
+        raise FormatFieldError("truncated message")
+
+    # Padding
+    index = 4
+    if index > len(msg):
+        raise FormatFieldError("truncated padding")
+
+    objects = ListContainer()
+    while _read_byte(msg, index) != 0x00:
+        obj, index = _parse_object(msg, index)
+        objects.append(obj)
+
+    if index + 1 != len(msg):
+        raise TerminatedError("expected end of message")
+
+    return Container({
+        'opcode': LIST_OBJECTS,
+        'profile_id': profile_id,
+        'status': status,
+        'objects': objects,
+        'terminator': 0
+    })
+
+
+def iter_list_objects(msg):
+    """
+    Yield the objects of a LIST_OBJECTS response one at a time, parsed like
+    those of ListObjectsCommandResponse, up to its terminator. A
+    ConstructError is raised on reaching a malformed part of the message.
+    """
+    msg = memoryview(msg)
+
+    if _read_byte(msg, 0) != LIST_OBJECTS:
+        raise ConstError("expected LIST_OBJECTS")
+
+    # Profile ID, status and padding
+    index = 4
+    if index > len(msg):
+        raise FormatFieldError("truncated message")
+
+    while _read_byte(msg, index) != 0x00:
+        obj, index = _parse_object(msg, index)
+        yield obj
+
+    if index + 1 != len(msg):
+        raise TerminatedError("expected end of message")
+
+
+def parse_log_values_response(msg):
+    """
+    Parse a message like LogValuesCommandResponse.parse()
+    """
+    msg = memoryview(msg)
+
+    if _read_byte(msg, 0) != LOG_VALUES:
+        raise ConstError("expected LOG_VALUES")
+
+    id_chain = bool(_read_byte(msg, 1) & 0x01)
+    object_id = None
+    index = 2
+    if id_chain:
+        object_id, index = parse_id(msg, index)
+
+    entries = ListContainer()
+    end = len(msg)
+    while index < end:
+        entry_id, index = parse_id(msg, index)
+        size, index = parse_varint(msg, index)
+        if index + size > end:
+            raise FormatFieldError("truncated value")
+
+        entries.append(Container(id=entry_id)(data=msg[index:index + size].tobytes()))
+        index += size
+
+    return Container({
+        'opcode': LOG_VALUES,
+        'flags': FlagsContainer(id_chain=id_chain, default=False),
+        'id': object_id,
+        'entries': entries
+    })
+
+
+# Fast parsers of construct structs, used in place of their parse() method
+FAST_PARSERS = {
+    ReadValueCommandResponse: parse_read_value_response,
+    ListObjectsCommandResponse: parse_list_objects_response,
+    LogValuesCommandResponse: parse_log_values_response,
+}
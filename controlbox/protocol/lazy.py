@@ -0,0 +1,90 @@
+"""
+Responses decoded on demand.
+"""
+from .commands import OBJECT_ID_OPCODES
+from .fast import parse_id
+
+
+class LazyResponse:
+    """
+    A response of which only the opcode and, for commands targeting an
+    object, the object ID are decoded up front. This is enough to match it
+    with its request.
+
+    The rest of the message is decoded on first access to any other field,
+    and kept. Decoding errors are raised at that point.
+    """
+    __slots__ = ('opcode', 'id', '_msg', '_parse', '_decoded')
+
+    def __init__(self, msg: bytes, parse):
+        self._msg = msg
+        self._parse = parse
+        self._decoded = None
+
+        self.opcode = msg[0]
+        if self.opcode in OBJECT_ID_OPCODES:
+            self.id, _ = parse_id(msg, 1)
+
+    @property
+    def is_decoded(self):
+        return self._decoded is not None
+
+    @property
+    def message(self):
+        """
+        The raw message, until the response is decoded
+        """
+        return self._msg
+
+    def decode(self):
+        """
+        Return the fully decoded response
+        """
+        if self._decoded is None:
+            self._decoded = self._parse(self._msg)
+            self._msg = None
+
+        return self._decoded
+
+    def __getattr__(self, name):
+        # Private and special names, e.g. looked up by copy and pickle on a
+        # response whose slots aren't set yet, aren't fields
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.decode(), name)
+
+    def __getstate__(self):
+        # Parsers of construct structs can't be pickled: copies and pickles
+        # carry the decoded response instead
+        return (self.opcode, getattr(self, 'id', None), self.decode())
+
+    def __setstate__(self, state):
+        self.opcode, object_id, self._decoded = state
+        self._msg = None
+        self._parse = None
+        if object_id is not None:
+            self.id = object_id
+
+    def __getitem__(self, key):
+        return self.decode()[key]
+
+    def __contains__(self, key):
+        return key in self.decode()
+
+    def __iter__(self):
+        return iter(self.decode())
+
+    def __len__(self):
+        return len(self.decode())
+
+    def __eq__(self, other):
+        if isinstance(other, LazyResponse):
+            other = other.decode()
+        return self.decode() == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        if self._decoded is None:
+            return "<LazyResponse opcode={0} (not decoded)>".format(self.opcode)
+        return repr(self._decoded)
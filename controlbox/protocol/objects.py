@@ -0,0 +1,182 @@
+"""
+Object types of a controller and the codecs of their payloads.
+
+Protocol integrators register the object types of their domain, and
+optionally a codec for each of them, so the payloads of READ_VALUE and
+LIST_OBJECTS responses are returned decoded.
+"""
+import importlib
+import logging
+
+from construct import (
+    Adapter,
+    Byte,
+    MappingError
+)
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ObjectCodec:
+    """
+    Abstract codec of an object payload
+    """
+    def decode(self, data: bytes):
+        raise NotImplementedError
+
+    def encode(self, value) -> bytes:
+        raise NotImplementedError
+
+    def resolve(self):
+        """
+        Called once before the codec is first used, to load what it needs
+        """
+
+
+class ProtobufCodec(ObjectCodec):
+    """
+    Codec of payloads serialized as a protobuf message.
+
+    The message class may be given as a "module:ClassName" string so
+    protobuf is only imported when a payload of this type is decoded.
+    """
+    def __init__(self, message_class):
+        self.message_class = message_class
+        self._from_string = None
+
+    def resolve(self):
+        if isinstance(self.message_class, str):
+            module_name, class_name = self.message_class.split(":")
+            self.message_class = getattr(importlib.import_module(module_name), class_name)
+
+        self._from_string = self.message_class.FromString
+
+    def decode(self, data):
+        return self._from_string(data)
+
+    def encode(self, value):
+        return value.SerializeToString()
+
+
+class ObjectTypeRegistry:
+    """
+    Maps object type IDs to their names and payload codecs.
+
+    Codecs are resolved once per type, on first use; types without a codec,
+    or whose codec can't be resolved, keep their raw payload.
+    """
+    def __init__(self):
+        self._names = {}
+        self._ids = {}
+        self._codecs = {}
+        self._resolved_codecs = {}
+
+    def register(self, type_id: int, name: str, codec: ObjectCodec = None):
+        self._names[type_id] = name
+        self._ids[name] = type_id
+        self._codecs[name] = codec
+        self._resolved_codecs.pop(name, None)
+
+    def register_enum(self, anEnum, codecs=None):
+        """
+        Register every object type of a construct Enum, with codecs given as
+        a mapping of type names to codecs
+        """
+        codecs = codecs or {}
+        for type_id, name in anEnum.decmapping.items():
+            if isinstance(type_id, int):
+                self.register(type_id, name, codecs.get(name))
+
+    def register_codec(self, name: str, codec: ObjectCodec):
+        self.register(self._ids[name], name, codec)
+
+    def name(self, type_id: int) -> str:
+        try:
+            return self._names[type_id]
+        except KeyError:
+            raise MappingError("unknown object type {0!r}".format(type_id))
+
+    def id(self, object_type) -> int:
+        if isinstance(object_type, int):
+            if object_type not in self._names:
+                raise MappingError("unknown object type {0!r}".format(object_type))
+            return object_type
+
+        try:
+            return self._ids[object_type]
+        except KeyError:
+            raise MappingError("unknown object type {0!r}".format(object_type))
+
+    def codec(self, name: str):
+        """
+        Return the resolved codec of an object type, or None
+        """
+        try:
+            return self._resolved_codecs[name]
+        except KeyError:
+            pass
+
+        codec = self._codecs.get(name)
+        if codec is not None:
+            try:
+                codec.resolve()
+            except ImportError as e:
+                LOGGER.warning("can't load codec of {0}, payloads stay raw: {1}".format(name, e))
+                codec = None
+
+        self._resolved_codecs[name] = codec
+        return codec
+
+    def decode(self, name: str, data):
+        """
+        Return the decoded payload of an object, or None if it has no codec
+        or can't be decoded
+        """
+        if data is None:
+            return None
+
+        codec = self.codec(name)
+        if codec is None:
+            return None
+
+        try:
+            return codec.decode(bytes(data))
+        except Exception as e:
+            LOGGER.warning("can't decode {0} payload {1!r}: {2}".format(name, data, e))
+            return None
+
+
+class ObjectTypeAdapter(Adapter):
+    """
+    An object type byte, decoded to the name registered for it
+    """
+    def __init__(self, aRegistry):
+        super(ObjectTypeAdapter, self).__init__(Byte)
+        self.registry = aRegistry
+
+    def _encode(self, obj, context):
+        return self.registry.id(obj)
+
+    def _decode(self, obj, context):
+        return self.registry.name(obj)
+
+
+object_types = ObjectTypeRegistry()
+
+object_types.register(6, "TEMPERATURE_SENSOR",
+                      ProtobufCodec("controlbox.protocol.protobuf.OneWireTempSensor_pb2:OneWireTempSensor"))
+object_types.register(7, "SETPOINT_SIMPLE")
+
+
+def register_object_types(anEnum, codecs=None):
+    """
+    Register the object types of a construct Enum in the default registry
+    """
+    object_types.register_enum(anEnum, codecs)
+
+
+def register_object_codec(name, codec):
+    """
+    Register the payload codec of an object type in the default registry
+    """
+    object_types.register_codec(name, codec)
@@ -0,0 +1,57 @@
+import pytest
+from construct import ConstructError
+
+from controlbox.protocol.commands import LogValuesCommandResponse
+from controlbox.protocol.utils import decode_id
+
+numpy = pytest.importorskip("numpy")
+
+from controlbox.protocol.columnar import LogValuesDecoder, id_key
+
+
+class TestLogValuesDecoder:
+    msg = b"\x0a\x01\x81\x02" + b"\x00\x02\x80\x14" + b"\x81\x03\x02\x00\xff" + b"\x03\x00"
+
+    def test_decodes_columns(self):
+        decoder = LogValuesDecoder()
+        decoder.feed(self.msg, timestamp=1.5)
+
+        values = decoder.batch()
+
+        assert [decode_id(key) for key in values['id']] == [(0,), (1, 3), (3,)]
+        assert list(values['timestamp']) == [1.5, 1.5, 1.5]
+        assert values['value'][0] == 0x1480 / 256.0
+        assert values['value'][1] == -256 / 256.0
+        assert numpy.isnan(values['value'][2])
+
+    def test_matches_construct(self):
+        decoder = LogValuesDecoder(scale=1.0)
+        decoder.feed(self.msg)
+
+        values = decoder.batch()
+        entries = LogValuesCommandResponse.parse(self.msg).entries
+
+        assert list(values['id']) == [id_key(entry.id) for entry in entries]
+        assert list(values['value'][:2]) == [int.from_bytes(entry.data, 'little', signed=True)
+                                            for entry in entries[:2]]
+
+    def test_batches_across_frames(self):
+        decoder = LogValuesDecoder(capacity=2)
+        for i in range(5):
+            decoder.feed(b"\x0a\x00\x01\x01" + bytes([i]), timestamp=i)
+
+        values = decoder.batch()
+
+        assert list(values['timestamp']) == [0, 1, 2, 3, 4]
+        assert list(values['value'] * 256) == [0, 1, 2, 3, 4]
+        assert len(decoder) == 0
+        assert len(decoder.batch()) == 0
+
+    def test_malformed_frame_ignored(self):
+        decoder = LogValuesDecoder()
+        decoder.feed(b"\x0a\x00\x01\x01\x01")
+
+        with pytest.raises(ConstructError):
+            decoder.feed(b"\x0a\x00\x01\x02\x01")
+
+        assert len(decoder) == 1
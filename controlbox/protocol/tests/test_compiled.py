@@ -0,0 +1,104 @@
+import pytest
+
+from controlbox.protocol import commands
+from controlbox.protocol.compiled import (
+    compiled,
+    compiled_command_mapping,
+    is_compiled
+)
+from controlbox.protocol.v1 import ProtocolV1
+
+# A valid message for every command struct
+MESSAGES = {
+    "ReadValueCommandRequest": b"\x01\x81\x02\x06\x00",
+    "ReadValueCommandResponse": b"\x01\x81\x02\x06\x04\x06\x00\x02\xaa\xbb",
+    "WriteValueCommandRequest": b"\x02\x01\x07\x02\x01\x02",
+    "WriteValueCommandResponse": b"\x02\x01\x07\x02\x01\x02\x00",
+    "CreateObjectCommandRequest": b"\x03\x01\x06\x13\x02\x01\x03",
+    "CreateObjectCommandResponse": b"\x03\x01\x06\x13\x02\x01\x03\x00",
+    "DeleteObjectCommandRequest": b"\x04\x81\x02",
+    "DeleteObjectCommandResponse": b"\x04\x81\x02\x00",
+    "ListObjectsCommandRequest": b"\x05\x00",
+    "ListObjectsCommandResponse": b"\x05\x00\x00\x00\x03\x01\x06\x13\x02\x01\x03\x00",
+    "FreeSlotCommandRequest": b"\x06\x01",
+    "FreeSlotCommandResponse": b"\x06\x01\x02",
+    "CreateProfileCommandRequest": b"\x07",
+    "CreateProfileCommandResponse": b"\x07\x01",
+    "DeleteProfileCommandRequest": b"\x08\x01",
+    "DeleteProfileCommandResponse": b"\x08\x01\x00",
+    "ActivateProfileCommandRequest": b"\x09\x01",
+    "ActivateProfileCommandResponse": b"\x09\x01\x00",
+    "LogValuesCommandRequest": b"\x0a\x01\x81\x02",
+    "LogValuesCommandResponse": b"\x0a\x00\x01\x02\x00\x03",
+    "ResetCommandRequest": b"\x0b\x03",
+    "ResetCommandResponse": b"\x0b\x03\x00",
+    "FreeSlotRootCommandRequest": b"\x0c",
+    "FreeSlotRootCommandResponse": b"\x0c\x04",
+    "ListProfilesCommandRequest": b"\x0e",
+    "ListProfilesCommandResponse": b"\x0e\x01",
+    "ReadSystemValueCommandRequest": b"\x0f\x01\x02\x00",
+    "ReadSystemValueCommandResponse": b"\x0f\x01\x02\x04\x02\x00\x01\xaa",
+    "SetSystemValueCommandRequest": b"\x10\x01\x02\x01\xaa",
+    "SetSystemValueCommandResponse": b"\x10\x01\x02\x01\xaa\x00",
+    "SetMaskValueCommandRequest": b"\x11\x01\x06\x01\xaa\x01\xff",
+    "SetMaskValueCommandResponse": b"\x11\x01\x06\x01\xaa\x01\xff\x00",
+}
+
+
+def test_every_struct_has_a_message():
+    structs = set()
+    for request, response in ProtocolV1.command_mapping.values():
+        structs.add(request)
+        structs.add(response)
+
+    assert structs == set(getattr(commands, name) for name in MESSAGES)
+
+
+def compiled_or_skip(struct):
+    """
+    Return the compiled variant of a struct, skipping the test when the
+    installed construct can't compile it: comparing a struct to itself
+    proves nothing
+    """
+    if not is_compiled(struct):
+        pytest.skip("{0} isn't compiled".format(struct))
+    return compiled(struct)
+
+
+@pytest.mark.parametrize("name", sorted(MESSAGES))
+def test_compiled_parse_equivalence(name):
+    struct = getattr(commands, name)
+    msg = MESSAGES[name]
+
+    assert compiled_or_skip(struct).parse(msg) == struct.parse(msg)
+
+
+@pytest.mark.parametrize("name", sorted(MESSAGES))
+def test_compiled_build_equivalence(name):
+    struct = getattr(commands, name)
+    compiled_struct = compiled_or_skip(struct)
+    parsed = struct.parse(MESSAGES[name])
+
+    assert compiled_struct.build(parsed) == struct.build(parsed)
+
+
+def test_falls_back_to_interpreted():
+    struct = commands.ReadValueCommandResponse
+    if is_compiled(struct):
+        pytest.skip("{0} is compiled".format(struct))
+
+    assert compiled(struct) is struct
+
+
+def test_compiled_once():
+    struct = commands.ReadValueCommandResponse
+
+    assert compiled(struct) is compiled(struct)
+
+
+def test_compiled_protocol():
+    protocol = ProtocolV1(compiled=True)
+    msg = MESSAGES["ReadValueCommandResponse"]
+
+    assert protocol.command_mapping == compiled_command_mapping(ProtocolV1.command_mapping)
+    assert protocol.command_response_from_bytes(msg) == commands.ReadValueCommandResponse.parse(msg)
@@ -0,0 +1,47 @@
+from unittest import TestCase
+
+from construct import Byte, Const, Struct
+
+from controlbox.protocol.commands import (
+    CBoxOpcodeEnum,
+    CreateProfileCommandResponse,
+    ReadValueCommandResponse
+)
+from controlbox.protocol.decoder import ResponseDecoder
+from controlbox.protocol.v1 import ProtocolV1
+
+
+class TestResponseDecoder(TestCase):
+    def test_read_value(self):
+        decoder = ProtocolV1().decoder
+        msg = b"\x01\x81\x02\x06\x04\x06\x00\x02\xaa\xbb"
+
+        assert decoder.from_bytes(msg) == ReadValueCommandResponse.parse(msg)
+
+    def test_create_profile(self):
+        decoder = ProtocolV1().decoder
+
+        assert decoder.from_bytes(b"\x07\x02") == CreateProfileCommandResponse.parse(b"\x07\x02")
+
+    def test_unknown_opcode(self):
+        assert ResponseDecoder().from_bytes(b"\x05\x00") is None
+        assert ResponseDecoder().from_bytes(b"") is None
+
+
+class TestProtocolV1(TestCase):
+    def test_every_opcode_mapped(self):
+        opcodes = set(CBoxOpcodeEnum.encmapping.values()) - {CBoxOpcodeEnum.encmapping['UNUSED']}
+
+        assert set(ProtocolV1.command_mapping) == opcodes
+
+    def test_register_command(self):
+        CustomCommandResponse = Struct(
+            "opcode" / Const(0x42, Byte),
+            "value" / Byte
+        )
+
+        protocol = ProtocolV1()
+        protocol.register_command(0x42, None, CustomCommandResponse)
+
+        assert protocol.command_response_from_bytes(b"\x42\x07").value == 7
+        assert ProtocolV1().command_response_from_bytes(b"\x42\x07") is None
@@ -0,0 +1,148 @@
+import random
+
+import pytest
+from construct import ConstructError
+
+from controlbox.protocol.commands import (
+    ReadValueCommandResponse,
+    ListObjectsCommandResponse,
+    LogValuesCommandResponse
+)
+from controlbox.protocol.fast import (
+    parse_read_value_response,
+    parse_list_objects_response,
+    parse_log_values_response,
+    iter_list_objects
+)
+
+
+def random_id(rng):
+    length = rng.randint(1, 4)
+    return bytes([0x80 | rng.randint(0, 15) for i in range(length - 1)] + [rng.randint(0, 15)])
+
+
+def random_varint_bytes(rng, size):
+    encoded = bytearray()
+    while size > 0x7F:
+        encoded.append(0x80 | (size & 0x7F))
+        size >>= 7
+    encoded.append(size)
+    return bytes(encoded)
+
+
+def random_type(rng):
+    return bytes([rng.choice([6, 7, 6, 7, rng.randint(0, 255)])])
+
+
+def random_read_value_response(rng):
+    msg = b"\x01" + random_id(rng) + random_type(rng)
+    msg += bytes([rng.randint(0, 255)]) + random_type(rng) + bytes([rng.randint(0, 255)])
+    if rng.random() < 0.8:
+        data = bytes(rng.randint(0, 255) for i in range(rng.choice([0, 1, 5, 200])))
+        msg += random_varint_bytes(rng, len(data)) + data
+    return msg
+
+
+def random_list_objects_response(rng):
+    msg = b"\x05" + bytes(rng.randint(0, 255) for i in range(3))
+    if rng.random() < 0.7:
+        data = bytes(rng.randint(0, 255) for i in range(rng.choice([0, 3, 150])))
+        msg += b"\x03" + random_id(rng) + random_type(rng) + bytes([rng.randint(0, 255)])
+        msg += random_varint_bytes(rng, len(data)) + data
+    return msg + b"\x00"
+
+
+def random_log_values_response(rng):
+    id_chain = rng.random() < 0.5
+    msg = b"\x0a" + bytes([int(id_chain)])
+    if id_chain:
+        msg += random_id(rng)
+    for i in range(rng.choice([0, 1, 3])):
+        data = bytes(rng.randint(0, 255) for i in range(rng.choice([0, 2, 4, 130])))
+        msg += random_id(rng) + random_varint_bytes(rng, len(data)) + data
+    return msg
+
+
+def mutate(rng, msg):
+    """
+    Randomly damage a message to also cover malformed inputs
+    """
+    choice = rng.random()
+    if choice < 0.4 or not msg:
+        return msg
+    elif choice < 0.6:
+        return msg[:rng.randrange(len(msg))]
+    elif choice < 0.8:
+        index = rng.randrange(len(msg))
+        return msg[:index] + bytes([rng.randint(0, 255)]) + msg[index + 1:]
+    else:
+        return msg + bytes(rng.randint(0, 255) for i in range(rng.randint(1, 3)))
+
+
+def parse_outcome(parse, msg):
+    try:
+        return parse(msg)
+    except ConstructError:
+        return ConstructError
+
+
+@pytest.mark.parametrize("struct, fast_parse, generate", [
+    (ReadValueCommandResponse, parse_read_value_response, random_read_value_response),
+    (ListObjectsCommandResponse, parse_list_objects_response, random_list_objects_response),
+    (LogValuesCommandResponse, parse_log_values_response, random_log_values_response),
+])
+def test_matches_construct(struct, fast_parse, generate):
+    rng = random.Random(1234)
+
+    for i in range(3000):
+        msg = mutate(rng, generate(rng))
+
+        assert parse_outcome(fast_parse, msg) == parse_outcome(struct.parse, msg), msg
+
+
+def test_read_value():
+    msg = b"\x01\x81\x02\x06\x04\x06\x00\x02\xaa\xbb"
+
+    decoded = parse_read_value_response(msg)
+
+    assert decoded == ReadValueCommandResponse.parse(msg)
+    assert decoded.data == b"\xaa\xbb"
+    assert list(decoded.keys()) == list(ReadValueCommandResponse.parse(msg).keys())
+
+
+def test_list_objects():
+    msg = b"\x05\x00\x00\x00\x03\x01\x06\x13\x02\x01\x03\x00"
+
+    decoded = parse_list_objects_response(msg)
+
+    assert decoded == ListObjectsCommandResponse.parse(msg)
+    assert decoded.objects[0].data == [1, 3]
+
+
+def test_log_values():
+    msg = b"\x0a\x01\x81\x02" + b"\x00\x02\x80\x14" + b"\x03\x00"
+
+    decoded = parse_log_values_response(msg)
+
+    assert decoded == LogValuesCommandResponse.parse(msg)
+    assert decoded.flags.id_chain
+    assert [(entry.id, entry.data) for entry in decoded.entries] == [((0,), b"\x80\x14"), ((3,), b"")]
+
+
+def test_iter_list_objects():
+    msg = b"\x05\x00\x00\x00\x03\x01\x06\x13\x02\x01\x03\x03\x82\x04\x07\x00\x00\x00"
+
+    objects = list(iter_list_objects(msg))
+
+    assert [obj.id for obj in objects] == [(1,), (2, 4)]
+    assert [obj.type for obj in objects] == ["TEMPERATURE_SENSOR", "SETPOINT_SIMPLE"]
+    assert objects[0] == parse_list_objects_response(msg[:11] + b"\x00").objects[0]
+
+
+def test_iter_list_objects_malformed():
+    msg = b"\x05\x00\x00\x00\x03\x01\x06\x13\x02\x01\x03\x03\x82"
+    objects = iter_list_objects(msg)
+
+    assert next(objects).id == (1,)
+    with pytest.raises(ConstructError):
+        next(objects)
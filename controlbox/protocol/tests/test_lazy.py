@@ -0,0 +1,97 @@
+import copy
+import pickle
+from unittest import TestCase
+
+import pytest
+from construct import ConstructError
+
+from controlbox.protocol.commands import (
+    ReadValueCommandResponse,
+    ListObjectsCommandResponse,
+    FreeSlotCommandResponse
+)
+from controlbox.protocol.lazy import LazyResponse
+from controlbox.protocol.v1 import ProtocolV1
+
+READ_VALUE_RESPONSE = b"\x01\x81\x02\x06\x04\x06\x00\x02\xaa\xbb"
+LIST_OBJECTS_RESPONSE = b"\x05\x00\x00\x00\x03\x01\x06\x13\x02\x01\x03\x00"
+
+
+class CountingParser:
+    def __init__(self, struct):
+        self.struct = struct
+        self.calls = 0
+
+    def __call__(self, msg):
+        self.calls += 1
+        return self.struct.parse(msg)
+
+
+class TestLazyResponse(TestCase):
+    def test_header_only(self):
+        parse = CountingParser(ReadValueCommandResponse)
+        response = LazyResponse(READ_VALUE_RESPONSE, parse)
+
+        assert response.opcode == 1
+        assert response.id == (1, 2)
+        assert parse.calls == 0
+        assert not response.is_decoded
+
+    def test_decoded_once(self):
+        parse = CountingParser(ReadValueCommandResponse)
+        response = LazyResponse(READ_VALUE_RESPONSE, parse)
+
+        assert response.data == b"\xaa\xbb"
+        assert response['real-type'] == "TEMPERATURE_SENSOR"
+        assert parse.calls == 1
+        assert response == ReadValueCommandResponse.parse(READ_VALUE_RESPONSE)
+
+    def test_no_id(self):
+        response = LazyResponse(LIST_OBJECTS_RESPONSE, ListObjectsCommandResponse.parse)
+
+        assert not response.is_decoded
+        assert response.objects[0].id == (1,)
+
+    def test_error_on_access(self):
+        response = LazyResponse(b"\x01\x01\x06", ReadValueCommandResponse.parse)
+
+        assert response.id == (1,)
+        with pytest.raises(ConstructError):
+            response.data
+
+    def test_free_slot_id(self):
+        response = LazyResponse(b"\x06\x01\x02", FreeSlotCommandResponse.parse)
+
+        assert response.id == (1,)
+        assert not response.is_decoded
+
+    def test_private_names_not_fields(self):
+        response = LazyResponse(READ_VALUE_RESPONSE, ReadValueCommandResponse.parse)
+
+        with pytest.raises(AttributeError):
+            response.__deepcopy__
+        assert not response.is_decoded
+
+    def test_copy(self):
+        response = LazyResponse(READ_VALUE_RESPONSE, ReadValueCommandResponse.parse)
+
+        for duplicate in (copy.copy(response), copy.deepcopy(response)):
+            assert duplicate.id == (1, 2)
+            assert duplicate.data == b"\xaa\xbb"
+
+    def test_pickle(self):
+        response = LazyResponse(READ_VALUE_RESPONSE, ReadValueCommandResponse.parse)
+
+        unpickled = pickle.loads(pickle.dumps(response))
+
+        assert unpickled.is_decoded
+        assert unpickled.id == (1, 2)
+        assert unpickled == ReadValueCommandResponse.parse(READ_VALUE_RESPONSE)
+
+
+class TestLazyProtocol(TestCase):
+    def test_lazy_decoder(self):
+        response = ProtocolV1(lazy=True).command_response_from_bytes(READ_VALUE_RESPONSE)
+
+        assert isinstance(response, LazyResponse)
+        assert response == ReadValueCommandResponse.parse(READ_VALUE_RESPONSE)
@@ -1,6 +1,7 @@
 from unittest import TestCase
 
-from construct import Container
+import pytest
+from construct import Container, ConstructError
 
 from controlbox.protocol.commands import (
     VariableLengthIDAdapter,
@@ -11,16 +12,27 @@ from controlbox.protocol.commands import (
 class TestReadValue(TestCase):
     def test_variable_length_id_one_byte(self):
         adapter = VariableLengthIDAdapter()
-        assert adapter.parse(b"\x01") == [1]
+        assert adapter.parse(b"\x01") == (1,)
 
         assert adapter.build([1]) == b"\x01"
 
     def test_variable_length_id_multiple_bytes(self):
         adapter = VariableLengthIDAdapter()
-        assert adapter.parse(b"\x81\x02") == [1, 2]
+        assert adapter.parse(b"\x81\x02") == (1, 2)
 
         assert adapter.build([1, 2]) == b"\x81\x02"
-        assert adapter.parse(b"\x01\x02") == [1]
+        assert adapter.parse(b"\x01\x02") == (1,)
+
+    def test_variable_length_id_interned(self):
+        adapter = VariableLengthIDAdapter()
+        ids = {adapter.parse(b"\x81\x02"): "object"}
+
+        assert adapter.parse(b"\x81\x02") is next(iter(ids))
+        assert ids[adapter.parse(b"\x81\x02")] == "object"
+
+    def test_variable_length_id_truncated(self):
+        with pytest.raises(ConstructError):
+            VariableLengthIDAdapter().parse(b"\x81")
 
 
 class TestCreateObject(TestCase):
@@ -28,4 +40,4 @@ class TestCreateObject(TestCase):
         obj_data = b"\x01\x03"
         assert CreateObjectCommandRequest.build(dict(id=[1], type="TEMPERATURE_SENSOR", data=obj_data)) == b"\x03\x01\x06\x02\x01\x03"
 
-        assert CreateObjectCommandRequest.parse(b"\x03\x01\x06\x02\x01\x02") == Container(opcode=3)(id=[1])(type='TEMPERATURE_SENSOR')(data=[1, 2])
+        assert CreateObjectCommandRequest.parse(b"\x03\x01\x06\x02\x01\x02") == Container(opcode=3)(id=(1,))(type='TEMPERATURE_SENSOR')(data=[1, 2])
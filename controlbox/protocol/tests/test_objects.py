@@ -0,0 +1,115 @@
+import pytest
+from construct import Byte, Enum, MappingError
+
+from controlbox.protocol.commands import (
+    ReadValueCommandResponse,
+    ListObjectsCommandResponse
+)
+from controlbox.protocol.fast import (
+    parse_read_value_response,
+    parse_list_objects_response
+)
+from controlbox.protocol.objects import (
+    ObjectCodec,
+    ObjectTypeRegistry,
+    ObjectTypeAdapter,
+    ProtobufCodec,
+    object_types
+)
+
+
+class ReversedCodec(ObjectCodec):
+    def __init__(self):
+        self.resolved = 0
+
+    def resolve(self):
+        self.resolved += 1
+
+    def decode(self, data):
+        if not data:
+            raise ValueError("empty payload")
+        return data[::-1]
+
+    def encode(self, value):
+        return value[::-1]
+
+
+object_types.register(0x7F, "REVERSED_OBJECT", ReversedCodec())
+
+
+class TestObjectTypeRegistry:
+    def test_names_and_ids(self):
+        registry = ObjectTypeRegistry()
+        registry.register(3, "THREE")
+
+        assert registry.name(3) == "THREE"
+        assert registry.id("THREE") == 3
+        assert registry.id(3) == 3
+
+        with pytest.raises(MappingError):
+            registry.name(4)
+        with pytest.raises(MappingError):
+            registry.id("FOUR")
+
+    def test_register_enum(self):
+        registry = ObjectTypeRegistry()
+        codec = ReversedCodec()
+        registry.register_enum(Enum(Byte, ONE=1, TWO=2), {"TWO": codec})
+
+        assert registry.name(1) == "ONE"
+        assert registry.codec("ONE") is None
+        assert registry.codec("TWO") is codec
+
+    def test_codec_resolved_once(self):
+        registry = ObjectTypeRegistry()
+        codec = ReversedCodec()
+        registry.register(1, "ONE", codec)
+
+        assert registry.decode("ONE", b"\x01\x02") == b"\x02\x01"
+        assert registry.decode("ONE", [3, 4]) == b"\x04\x03"
+        assert codec.resolved == 1
+
+    def test_undecodable_payload(self):
+        registry = ObjectTypeRegistry()
+        registry.register(1, "ONE", ReversedCodec())
+
+        assert registry.decode("ONE", b"") is None
+        assert registry.decode("ONE", None) is None
+
+    def test_missing_protobuf_module(self):
+        registry = ObjectTypeRegistry()
+        registry.register(1, "ONE", ProtobufCodec("controlbox.no_such_module:Message"))
+
+        assert registry.codec("ONE") is None
+        assert registry.decode("ONE", b"\x01") is None
+
+    def test_adapter(self):
+        registry = ObjectTypeRegistry()
+        registry.register(1, "ONE")
+        adapter = ObjectTypeAdapter(registry)
+
+        assert adapter.parse(b"\x01") == "ONE"
+        assert adapter.build("ONE") == b"\x01"
+        with pytest.raises(MappingError):
+            adapter.parse(b"\x02")
+
+
+class TestDecodedPayloads:
+    read_value = bytes([0x01, 0x01, 0x7F, 0x02, 0x7F, 0x00, 0x02, 0x01, 0x02])
+    list_objects = bytes([0x05, 0x00, 0x00, 0x00, 0x03, 0x01, 0x7F, 0x02, 0x02, 0x01, 0x02, 0x00])
+
+    def test_read_value(self):
+        assert ReadValueCommandResponse.parse(self.read_value).value == b"\x02\x01"
+        assert parse_read_value_response(self.read_value).value == b"\x02\x01"
+
+    def test_list_objects(self):
+        assert ListObjectsCommandResponse.parse(self.list_objects).objects[0].value == b"\x02\x01"
+        assert parse_list_objects_response(self.list_objects).objects[0].value == b"\x02\x01"
+
+    def test_without_codec(self):
+        msg = bytes([0x01, 0x01, 0x07, 0x02, 0x07, 0x00, 0x02, 0x01, 0x02])
+
+        response = ReadValueCommandResponse.parse(msg)
+
+        assert response.data == b"\x01\x02"
+        assert response.value is None
@@ -1,26 +1,61 @@
+import functools
+
 from construct import (
-    Adapter,
-    Byte,
-    RepeatUntil
+    Construct,
+    FormatFieldError,
+    RangeError,
+    SizeofError
 )
 
+# Number of recently used IDs of which the decoded and encoded forms are kept
+ID_CACHE_SIZE = 1024
+
+
+@functools.lru_cache(maxsize=ID_CACHE_SIZE)
+def decode_id(raw: bytes) -> tuple:
+    """
+    Return the ID encoded in raw. The same tuple is returned for recently
+    decoded IDs, so they are cheap to use as keys.
+    """
+    return tuple([b & 0x0F for b in raw])
+
+
+@functools.lru_cache(maxsize=ID_CACHE_SIZE)
+def _encode_id(object_id: tuple) -> bytes:
+    if not object_id:
+        raise RangeError("empty id")
+
+    try:
+        return bytes([b | 0x80 for b in object_id[:-1]] + [object_id[-1]])
+    except (TypeError, ValueError) as e:
+        raise FormatFieldError("invalid id {0!r}: {1}".format(object_id, e))
+
+
+def encode_id(object_id) -> bytes:
+    """
+    Return the bytes encoding an ID given as a sequence of integers
+    """
+    return _encode_id(tuple(object_id))
+
 
-class VariableLengthIDAdapter(Adapter):
+class VariableLengthIDAdapter(Construct):
     """
-    Controlbox Variable Length ID
+    Controlbox Variable Length ID, decoded as a tuple. Every byte but the
+    last one has one of its 4 upper bits set.
     """
-    def __init__(self):
-        super(VariableLengthIDAdapter, self).__init__(RepeatUntil(lambda obj, lst, ctx: obj & 0xF0 == 0x00, Byte))
+    def _parse(self, stream, context, path):
+        raw = b""
+        while True:
+            b = stream.read(1)
+            if not b:
+                raise FormatFieldError("truncated id")
 
-    def _encode(self, obj, context):
-        rewritten_list = []
-        for idx, i in enumerate(obj):
-            if idx != len(obj)-1:
-                rewritten_list.append(i | 0x80)
-            else:
-                rewritten_list.append(i)
+            raw += b
+            if not b[0] & 0xF0:
+                return decode_id(raw)
 
-        return rewritten_list
+    def _build(self, obj, stream, context, path):
+        stream.write(encode_id(obj))
 
-    def _decode(self, obj, context):
-        return list(map(lambda x: x & 0x0F, obj))
+    def _sizeof(self, context, path):
+        raise SizeofError("cannot calculate size, amount depends on actual data")
@@ -5,7 +5,37 @@ from .decoder import ResponseDecoder
 from .commands import (
     CBoxOpcodeEnum,
     ReadValueCommandRequest,
-    ReadValueCommandResponse
+    ReadValueCommandResponse,
+    WriteValueCommandRequest,
+    WriteValueCommandResponse,
+    CreateObjectCommandRequest,
+    CreateObjectCommandResponse,
+    DeleteObjectCommandRequest,
+    DeleteObjectCommandResponse,
+    ListObjectsCommandRequest,
+    ListObjectsCommandResponse,
+    FreeSlotCommandRequest,
+    FreeSlotCommandResponse,
+    CreateProfileCommandRequest,
+    CreateProfileCommandResponse,
+    DeleteProfileCommandRequest,
+    DeleteProfileCommandResponse,
+    ActivateProfileCommandRequest,
+    ActivateProfileCommandResponse,
+    LogValuesCommandRequest,
+    LogValuesCommandResponse,
+    ResetCommandRequest,
+    ResetCommandResponse,
+    FreeSlotRootCommandRequest,
+    FreeSlotRootCommandResponse,
+    ListProfilesCommandRequest,
+    ListProfilesCommandResponse,
+    ReadSystemValueCommandRequest,
+    ReadSystemValueCommandResponse,
+    SetSystemValueCommandRequest,
+    SetSystemValueCommandResponse,
+    SetMaskValueCommandRequest,
+    SetMaskValueCommandResponse
 )
 
 class ProtocolV1(ControlboxProtocol):
@@ -13,10 +43,26 @@ class ProtocolV1(ControlboxProtocol):
     First protocol version, mostly as described by Matt in:
     https://github.com/ctlbox/controlbox-cpp/blob/develop/docs/controlbox.rst
     """
-    decoder = ResponseDecoder()
+    decoder_class = ResponseDecoder
 
     command_mapping = {
-        CBoxOpcodeEnum.encmapping['READ_VALUE']: (ReadValueCommandRequest, ReadValueCommandResponse)
+        CBoxOpcodeEnum.encmapping['READ_VALUE']: (ReadValueCommandRequest, ReadValueCommandResponse),
+        CBoxOpcodeEnum.encmapping['WRITE_VALUE']: (WriteValueCommandRequest, WriteValueCommandResponse),
+        CBoxOpcodeEnum.encmapping['CREATE_OBJECT']: (CreateObjectCommandRequest, CreateObjectCommandResponse),
+        CBoxOpcodeEnum.encmapping['DELETE_OBJECT']: (DeleteObjectCommandRequest, DeleteObjectCommandResponse),
+        CBoxOpcodeEnum.encmapping['LIST_OBJECTS']: (ListObjectsCommandRequest, ListObjectsCommandResponse),
+        CBoxOpcodeEnum.encmapping['FREE_SLOT']: (FreeSlotCommandRequest, FreeSlotCommandResponse),
+        CBoxOpcodeEnum.encmapping['CREATE_PROFILE']: (CreateProfileCommandRequest, CreateProfileCommandResponse),
+        CBoxOpcodeEnum.encmapping['DELETE_PROFILE']: (DeleteProfileCommandRequest, DeleteProfileCommandResponse),
+        CBoxOpcodeEnum.encmapping['ACTIVATE_PROFILE']: (ActivateProfileCommandRequest, ActivateProfileCommandResponse),
+        CBoxOpcodeEnum.encmapping['LOG_VALUES']: (LogValuesCommandRequest, LogValuesCommandResponse),
+        CBoxOpcodeEnum.encmapping['RESET']: (ResetCommandRequest, ResetCommandResponse),
+        CBoxOpcodeEnum.encmapping['FREE_SLOT_ROOT']: (FreeSlotRootCommandRequest, FreeSlotRootCommandResponse),
+        CBoxOpcodeEnum.encmapping['LIST_PROFILES']: (ListProfilesCommandRequest, ListProfilesCommandResponse),
+        CBoxOpcodeEnum.encmapping['READ_SYSTEM_VALUE']: (ReadSystemValueCommandRequest, ReadSystemValueCommandResponse),
+        CBoxOpcodeEnum.encmapping['SET_SYSTEM_VALUE']: (SetSystemValueCommandRequest, SetSystemValueCommandResponse),
+        CBoxOpcodeEnum.encmapping['SET_MASK_VALUE']: (SetMaskValueCommandRequest, SetMaskValueCommandResponse),
+        # UNUSED has no command
     }
 
     def command_response_from_bytes(self, data : bytes):
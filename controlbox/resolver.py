@@ -1,5 +1,16 @@
+import asyncio
 import functools
+import heapq
+import itertools
 from asyncio import Future
+from collections import deque
+
+
+class RequestTimeoutError(asyncio.TimeoutError):
+    """
+    Raised into a pending Request future when its deadline expires before a
+    matching Response is received
+    """
 
 
 class RequestResponseMatcher:
@@ -7,7 +18,23 @@ class RequestResponseMatcher:
     Abstract class that matches a Request with a Response
     """
     def match(self, obj1, obj2):
-        raise NotImplementError
+        raise NotImplementedError
+
+
+class IndexedRequestResponseMatcher(RequestResponseMatcher):
+    """
+    Abstract class that matches a Request with a Response by computing a
+    hashable key for each of them: a Request and a Response match if their
+    keys are equal.
+    """
+    def request_key(self, aRequest):
+        raise NotImplementedError
+
+    def response_key(self, aResponse):
+        raise NotImplementedError
+
+    def match(self, obj1, obj2):
+        return self.request_key(obj1) == self.response_key(obj2)
 
 
 class RequestResponseResolver:
@@ -20,25 +47,134 @@ class RequestResponseResolver:
         self._request_queue = {}
         self._matcher = aRequestResponseMatcher
 
+        # Deadlines of Requests queued with a timeout, as a heap of
+        # (deadline, sequence, future) expired by a single timer
+        self._deadlines = []
+        self._deadline_sequence = itertools.count()
+        self._deadline_timer = None
+        self._expired_request_count = 0
+
     @property
     def unmatched_request_count(self):
         return len(self._request_queue)
 
+    @property
+    def expired_request_count(self):
+        """
+        Number of Requests that failed because their deadline expired
+        """
+        return self._expired_request_count
+
+    def pending_requests(self):
+        """
+        Return the (Request, future) pairs awaiting a Response
+        """
+        return [(request, future) for request, future in self._request_queue.items()
+                if not future.done()]
+
     def cleanup_future(self, future, aRequest):
         del self._request_queue[aRequest]
 
-    def queue_request(self, aRequest):
+    def queue_request(self, aRequest, timeout=None):
         if aRequest not in self._request_queue:
             future = Future()
 
             future.add_done_callback(functools.partial(self.cleanup_future, aRequest=aRequest))
             self._request_queue[aRequest] = future
 
+            if timeout is not None:
+                self._add_deadline(future, timeout)
+
         return self._request_queue[aRequest]
 
     def match_response(self, aResponse):
         for request, future in self._request_queue.items():
-            if self._matcher.match(request, aResponse):
+            if not future.done() and self._matcher.match(request, aResponse):
+                future.set_result(aResponse)
+                return future
+
+        return None
+
+    def _add_deadline(self, future, timeout):
+        loop = future.get_loop()
+        deadline = loop.time() + timeout
+
+        # Drop entries of already resolved futures once they outnumber the
+        # pending ones, so the heap stays proportional to what is in flight
+        if len(self._deadlines) > 2 * len(self._request_queue) + 16:
+            self._deadlines = [entry for entry in self._deadlines if not entry[2].done()]
+            heapq.heapify(self._deadlines)
+
+        heapq.heappush(self._deadlines, (deadline, next(self._deadline_sequence), future))
+
+        if self._deadlines[0][2] is future:
+            self._schedule_deadline_timer(loop)
+
+    def _schedule_deadline_timer(self, loop):
+        if self._deadline_timer is not None:
+            self._deadline_timer.cancel()
+            self._deadline_timer = None
+
+        if self._deadlines:
+            self._deadline_timer = loop.call_at(self._deadlines[0][0], self._expire_deadlines, loop)
+
+    def _expire_deadlines(self, loop):
+        self._deadline_timer = None
+        now = loop.time()
+
+        while self._deadlines and self._deadlines[0][0] <= now:
+            _, _, future = heapq.heappop(self._deadlines)
+            if not future.done():
+                future.set_exception(RequestTimeoutError())
+                self._expired_request_count += 1
+
+        self._schedule_deadline_timer(loop)
+
+
+class IndexedRequestResponseResolver(RequestResponseResolver):
+    """
+    A Resolver that indexes pending Requests by the key computed by an
+    IndexedRequestResponseMatcher.
+
+    Each key holds a FIFO of waiting futures, so matching a Response is a
+    single dict lookup and Requests sharing a key are resolved in the order
+    they were queued.
+    """
+    def __init__(self, aRequestResponseMatcher):
+        super().__init__(aRequestResponseMatcher)
+        self._index = {}
+
+    def cleanup_future(self, future, aRequest):
+        super().cleanup_future(future, aRequest)
+
+        key = self._matcher.request_key(aRequest)
+        waiters = self._index.get(key)
+        if waiters is not None:
+            try:
+                waiters.remove(future)
+            except ValueError:
+                # Already popped by match_response
+                pass
+
+            if not waiters:
+                del self._index[key]
+
+    def queue_request(self, aRequest, timeout=None):
+        if aRequest not in self._request_queue:
+            future = super().queue_request(aRequest, timeout)
+
+            key = self._matcher.request_key(aRequest)
+            self._index.setdefault(key, deque()).append(future)
+
+        return self._request_queue[aRequest]
+
+    def match_response(self, aResponse):
+        key = self._matcher.response_key(aResponse)
+        waiters = self._index.get(key)
+
+        while waiters:
+            future = waiters.popleft()
+            if not future.done():
                 future.set_result(aResponse)
                 return future
 
@@ -0,0 +1,322 @@
+"""
+Spreading controller devices across worker processes.
+"""
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import os
+import pickle
+import socket
+import struct
+
+from .pool import ControllerPool
+
+LOGGER = logging.getLogger(__name__)
+
+_length = struct.Struct("!I")
+
+# First message of a worker, once its devices are started
+_READY = "ready"
+
+
+class Channel:
+    """
+    Exchanges batches of python objects with another process over a stream
+    socket, each pickled and prefixed with its length. Sending never blocks
+    the event loop: batches are buffered by the stream writer.
+    """
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def open(cls, sock):
+        reader, writer = await asyncio.open_connection(sock=sock)
+        return cls(reader, writer)
+
+    def send(self, obj):
+        data = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+        self.writer.write(_length.pack(len(data)) + data)
+
+    async def receive(self):
+        """
+        Return the next object received, or None once the other end closed
+        the channel
+        """
+        try:
+            header = await self.reader.readexactly(_length.size)
+            return pickle.loads(await self.reader.readexactly(_length.unpack(header)[0]))
+        except asyncio.IncompleteReadError:
+            return None
+
+    def close(self):
+        self.writer.close()
+
+
+class _Batcher:
+    """
+    Sends the items queued during a loop iteration as a single batch.
+
+    Items that can't be pickled are given to unpicklable with the error
+    raised, which returns the item to send instead, or None to drop it.
+    """
+    def __init__(self, aChannel, unpicklable):
+        self.channel = aChannel
+        self.unpicklable = unpicklable
+        self._items = []
+
+    def put(self, item):
+        if not self._items:
+            asyncio.get_event_loop().call_soon(self._flush)
+        self._items.append(item)
+
+    def _flush(self):
+        items, self._items = self._items, []
+        try:
+            self.channel.send(items)
+        except Exception:
+            # Pickling fails with various errors, only pickle the items one
+            # by one to find the culprits once it did
+            self.channel.send([item for item in map(self._picklable, items) if item is not None])
+
+    def _picklable(self, item):
+        try:
+            pickle.dumps(item, pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            return self.unpicklable(item, e)
+        return item
+
+
+async def _serve_shard(sock, devices):
+    def unpicklable(result, error):
+        LOGGER.warning("can't send back the result of request {0}: {1}".format(result[0], error))
+        return (result[0], False, pickle.PicklingError(
+            "can't send back the result of the request: {0}".format(error)))
+
+    channel = await Channel.open(sock)
+    results = _Batcher(channel, unpicklable)
+
+    pool = ControllerPool()
+    for name, conduit_factory, protocol_factory, kwargs in devices:
+        if protocol_factory is not None:
+            kwargs = dict(kwargs, aProtocol=protocol_factory())
+        pool.add(name, conduit_factory(), **kwargs)
+    pool.start()
+    channel.send(_READY)
+
+    def request_done(request_id, task):
+        if task.cancelled():
+            results.put((request_id, False, asyncio.CancelledError()))
+        elif task.exception() is not None:
+            results.put((request_id, False, task.exception()))
+        else:
+            results.put((request_id, True, task.result()))
+
+    async def request(name, command, timeout):
+        return await (await pool.send(name, command, timeout))
+
+    while True:
+        batch = await channel.receive()
+        if batch is None:
+            break
+
+        for request_id, name, command, timeout in batch:
+            task = asyncio.ensure_future(request(name, command, timeout))
+            task.add_done_callback(lambda task, request_id=request_id: request_done(request_id, task))
+
+    await pool.stop()
+    channel.close()
+
+
+def run_shard(sock, devices):
+    """
+    Entry point of a worker process: run a ControllerPool of devices, given
+    as (name, conduit factory, protocol factory, controller keyword
+    arguments), and serve the requests received on sock until it is closed
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(_serve_shard(sock, devices))
+    finally:
+        loop.close()
+
+
+class ShardedControllers:
+    """
+    Runs controller devices in worker processes, each with its own event
+    loop and ControllerPool, behind a single interface.
+
+    Conduits can't be handed over to other processes, so devices are added
+    with a conduit factory, called in the worker, that must be picklable:
+    a class or function of a module, or a functools.partial of one.
+    Protocols can't be pickled either, and are likewise given as a
+    protocol factory, ProtocolV1 by default. The other keyword arguments of
+    the controllers must be picklable.
+    Devices are spread across shards worker processes in the order they
+    are added.
+
+    Commands are routed to the worker of their device, and responses come
+    back decoded. Both are exchanged in batches, one per loop iteration,
+    over a socket pair.
+    """
+    def __init__(self, shards=None, context="spawn"):
+        self.shard_count = shards or os.cpu_count() or 1
+        self.context = multiprocessing.get_context(context)
+
+        self._devices = [[] for i in range(self.shard_count)]
+        self._shard_of = {}
+        self._processes = []
+        self._channels = []
+        self._requests = []
+        self._receivers = []
+
+        self._futures = {}
+        self._request_ids = itertools.count()
+
+    def add(self, name, conduit_factory, protocol_factory=None, **kwargs):
+        """
+        Add a device, reached through the conduit made by conduit_factory,
+        using the protocol made by protocol_factory, with the keyword
+        arguments of its Controller
+        """
+        if self._processes:
+            raise RuntimeError("devices can't be added once started")
+        if name in self._shard_of:
+            raise KeyError("device {0!r} is already added".format(name))
+
+        device = (name, conduit_factory, protocol_factory, kwargs)
+        try:
+            pickle.dumps(device, pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            raise TypeError("device {0!r} can't be sent to a worker: {1}".format(name, e))
+
+        shard = len(self._shard_of) % self.shard_count
+        self._shard_of[name] = shard
+        self._devices[shard].append(device)
+
+    def __len__(self):
+        return len(self._shard_of)
+
+    def __iter__(self):
+        return iter(self._shard_of)
+
+    def shard(self, name):
+        """
+        Return the index of the worker running a device
+        """
+        return self._shard_of[name]
+
+    async def start(self):
+        """
+        Start the worker processes, and wait until they started their
+        devices
+        """
+        for shard, devices in enumerate(self._devices):
+            sock, worker_sock = socket.socketpair()
+            process = self.context.Process(target=run_shard, args=(worker_sock, devices), daemon=True)
+            process.start()
+            worker_sock.close()
+
+            channel = await Channel.open(sock)
+            self._processes.append(process)
+            self._channels.append(channel)
+            self._requests.append(_Batcher(channel, self._unsendable))
+
+        # Workers boot concurrently
+        ready = await asyncio.gather(*[channel.receive() for channel in self._channels])
+        failed = [shard for shard, message in enumerate(ready) if message != _READY]
+        if failed:
+            await self.stop()
+            raise RuntimeError("shards {0} failed to start".format(failed))
+
+        for shard, channel in enumerate(self._channels):
+            self._receivers.append(asyncio.ensure_future(self._receive(shard, channel)))
+
+    async def stop(self):
+        """
+        Stop the worker processes, failing the requests awaiting a response
+        """
+        for channel in self._channels:
+            channel.send(None)
+
+        await asyncio.gather(*self._receivers)
+
+        loop = asyncio.get_event_loop()
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join)
+
+        for channel in self._channels:
+            channel.close()
+
+        self._processes = []
+        self._channels = []
+        self._requests = []
+        self._receivers = []
+
+    async def _receive(self, shard, aChannel):
+        while True:
+            batch = await aChannel.receive()
+            if batch is None:
+                self._fail_requests(shard, ConnectionError("shard {0} stopped".format(shard)))
+                return
+
+            for request_id, succeeded, result in batch:
+                future, _ = self._futures.pop(request_id, (None, None))
+                if future is None or future.done():
+                    continue
+
+                if succeeded:
+                    future.set_result(result)
+                else:
+                    future.set_exception(result)
+
+    def _unsendable(self, request, error):
+        """
+        Fail a request that can't be sent to its worker, and drop it
+        """
+        future, _ = self._futures.pop(request[0])
+        if not future.done():
+            future.set_exception(pickle.PicklingError(
+                "can't send the request to its worker: {0}".format(error)))
+
+    def _fail_requests(self, shard, error):
+        failed = [request_id for request_id, (_, request_shard) in self._futures.items()
+                  if request_shard == shard]
+        for request_id in failed:
+            future, _ = self._futures.pop(request_id)
+            if not future.done():
+                future.set_exception(error)
+
+    async def send(self, name, aCommand, timeout=None):
+        """
+        Send a command to a device and return the future of its response
+        """
+        shard = self._shard_of[name]
+        request_id = next(self._request_ids)
+        future = asyncio.get_event_loop().create_future()
+        self._futures[request_id] = (future, shard)
+
+        self._requests[shard].put((request_id, name, aCommand, timeout))
+        return future
+
+    async def fan_out(self, aCommand, names=None, timeout=None):
+        """
+        Send a command to many devices, every device by default, and return a
+        dict mapping their names to their response, or to the exception
+        raised getting it. aCommand may also be a dict mapping device names
+        to the command to send to each of them.
+        """
+        if isinstance(aCommand, dict):
+            commands = aCommand
+        else:
+            commands = {name: aCommand for name in (self._shard_of if names is None else names)}
+
+        async def request(name, command):
+            return await (await self.send(name, command, timeout))
+
+        results = await asyncio.gather(*[request(name, command) for name, command in commands.items()],
+                                       return_exceptions=True)
+
+        return dict(zip(commands, results))
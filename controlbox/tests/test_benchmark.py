@@ -0,0 +1,41 @@
+import json
+
+from controlbox.benchmark import run_benchmarks, compare, main, sample_messages, SAMPLE_REQUESTS
+from controlbox.protocol.commands import CBoxOpcodeEnum
+
+
+class TestBenchmarks:
+    def test_sample_of_every_opcode_is_answered(self):
+        opcodes = set(name for name in CBoxOpcodeEnum.encmapping if isinstance(name, str))
+
+        assert set(SAMPLE_REQUESTS) == opcodes - {'UNUSED'}
+        assert all(response is not None for request, response in sample_messages().values())
+
+    def test_run_every_group(self):
+        report = run_benchmarks(repeat=1, scale=0.001)
+
+        groups = set(result['name'].split('.')[0] for result in report['results'])
+        assert groups == {'id', 'commands', 'decoder', 'framing', 'resolver', 'controller', 'pool', 'sharding'}
+        assert all(result['median'] > 0 for result in report['results'])
+        json.dumps(report)
+
+    def test_only(self):
+        report = run_benchmarks(repeat=2, scale=0.001, only=["resolver"])
+
+        assert [result['name'] for result in report['results']] == [
+            'resolver.10k_pending', 'resolver.10k_pending.timeout']
+        assert all(len(result['times']) == 2 for result in report['results'])
+
+    def test_compare(self):
+        baseline = {'results': [{'name': 'a', 'median': 2.0}, {'name': 'b', 'median': 1.0}]}
+        report = {'results': [{'name': 'a', 'median': 1.0}, {'name': 'c', 'median': 1.0}]}
+
+        assert compare(baseline, report) == {'a': 0.5}
+
+    def test_main_writes_json(self, tmp_path):
+        output = tmp_path / "results.json"
+        main(["-r", "1", "-s", "0.001", "-k", "id.", "-o", str(output)])
+
+        report = json.loads(output.read_text())
+        assert report['scale'] == 0.001
+        assert all(result['name'].startswith('id.') for result in report['results'])
@@ -0,0 +1,152 @@
+import asyncio
+import pytest
+
+from controlbox.cache import (
+    SingleFlight,
+    ReadValueCache
+)
+
+
+class TestSingleFlight:
+    @pytest.mark.asyncio
+    async def test_share_in_flight(self):
+        flights = SingleFlight()
+        future = asyncio.get_event_loop().create_future()
+
+        assert flights.get(b"\x05\x00") is None
+        sender = flights.add(b"\x05\x00", future)
+        follower = flights.get(b"\x05\x00")
+        assert follower is not None and follower is not sender
+
+        future.set_result(1)
+        await asyncio.sleep(0)
+
+        assert sender.result() == 1
+        assert follower.result() == 1
+        assert flights.get(b"\x05\x00") is None
+        assert len(flights) == 0
+
+    @pytest.mark.asyncio
+    async def test_cancelled_follower_doesnt_cancel_others(self):
+        flights = SingleFlight()
+        future = asyncio.get_event_loop().create_future()
+        sender = flights.add(b"\x05\x00", future)
+        follower = flights.get(b"\x05\x00")
+
+        sender.cancel()
+        await asyncio.sleep(0)
+        assert not future.cancelled()
+
+        future.set_result(1)
+        await asyncio.sleep(0)
+        assert follower.result() == 1
+
+    @pytest.mark.asyncio
+    async def test_cancelled_by_every_follower(self):
+        flights = SingleFlight()
+        future = asyncio.get_event_loop().create_future()
+        sender = flights.add(b"\x05\x00", future)
+        follower = flights.get(b"\x05\x00")
+
+        sender.cancel()
+        follower.cancel()
+        await asyncio.sleep(0)
+
+        assert future.cancelled()
+        assert flights.get(b"\x05\x00") is None
+
+    @pytest.mark.asyncio
+    async def test_reuse_response(self):
+        flights = SingleFlight(reuse_time=0.05)
+        future = asyncio.get_event_loop().create_future()
+
+        flights.add(b"\x05\x00", future)
+        future.set_result(1)
+        await asyncio.sleep(0)
+
+        assert flights.get(b"\x05\x00").result() == 1
+
+        await asyncio.sleep(0.06)
+        assert flights.get(b"\x05\x00") is None
+
+    @pytest.mark.asyncio
+    async def test_failure_not_reused(self):
+        flights = SingleFlight(reuse_time=10)
+        future = asyncio.get_event_loop().create_future()
+
+        flights.add(b"\x05\x00", future)
+        future.set_exception(asyncio.TimeoutError())
+        await asyncio.sleep(0)
+
+        assert flights.get(b"\x05\x00") is None
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestReadValueCache:
+    def test_hit_and_miss(self):
+        cache = ReadValueCache()
+
+        assert cache.get(((1,), "TEMPERATURE_SENSOR")) is None
+        cache.put(((1,), "TEMPERATURE_SENSOR"), "response", cache.generation)
+        assert cache.get(((1,), "TEMPERATURE_SENSOR")) == "response"
+
+        assert cache.hits == 1
+        assert cache.misses == 1
+        assert cache.hit_ratio == 0.5
+
+    def test_ttl_per_type(self):
+        clock = FakeClock()
+        cache = ReadValueCache(default_ttl=1, ttl={"SETPOINT_SIMPLE": 10}, clock=clock)
+
+        cache.put(((1,), "TEMPERATURE_SENSOR"), "sensor", cache.generation)
+        cache.put(((2,), "SETPOINT_SIMPLE"), "setpoint", cache.generation)
+
+        clock.now = 5
+        assert cache.get(((1,), "TEMPERATURE_SENSOR")) is None
+        assert cache.get(((2,), "SETPOINT_SIMPLE")) == "setpoint"
+
+    def test_lru_eviction(self):
+        cache = ReadValueCache(max_size=2)
+
+        cache.put(((1,), "TEMPERATURE_SENSOR"), 1, cache.generation)
+        cache.put(((2,), "TEMPERATURE_SENSOR"), 2, cache.generation)
+        cache.get(((1,), "TEMPERATURE_SENSOR"))
+        cache.put(((3,), "TEMPERATURE_SENSOR"), 3, cache.generation)
+
+        assert cache.get(((2,), "TEMPERATURE_SENSOR")) is None
+        assert cache.get(((1,), "TEMPERATURE_SENSOR")) == 1
+        assert cache.evictions == 1
+
+    def test_invalidate_object(self):
+        cache = ReadValueCache()
+        generation = cache.generation
+
+        cache.put(((1,), "TEMPERATURE_SENSOR"), 1, generation)
+        cache.put(((2,), "TEMPERATURE_SENSOR"), 2, generation)
+        cache.invalidate_object((1,))
+
+        assert cache.get(((1,), "TEMPERATURE_SENSOR")) is None
+        assert cache.get(((2,), "TEMPERATURE_SENSOR")) == 2
+
+        # Response to a read sent before the invalidation
+        cache.put(((1,), "TEMPERATURE_SENSOR"), 1, generation)
+        assert cache.get(((1,), "TEMPERATURE_SENSOR")) is None
+
+    def test_invalidate_container(self):
+        cache = ReadValueCache()
+
+        cache.put(((1,), "TEMPERATURE_SENSOR"), 1, cache.generation)
+        cache.put(((1, 2), "TEMPERATURE_SENSOR"), 2, cache.generation)
+        cache.put(((12,), "TEMPERATURE_SENSOR"), 3, cache.generation)
+        cache.invalidate_object((1,))
+
+        assert cache.get(((1,), "TEMPERATURE_SENSOR")) is None
+        assert cache.get(((1, 2), "TEMPERATURE_SENSOR")) is None
+        assert cache.get(((12,), "TEMPERATURE_SENSOR")) == 3
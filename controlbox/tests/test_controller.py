@@ -0,0 +1,540 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+from binascii import hexlify
+
+from construct import Container
+
+from controlbox.backoff import Backoff
+from controlbox.controller import (
+    Controller,
+    ControlboxCommandMatcher,
+    ConnectionLostError
+)
+from controlbox.resolver import RequestTimeoutError
+from controlbox.cache import ReadValueCache
+from controlbox.conduit.framing import HexLineFraming
+from controlbox.protocol.v1 import ProtocolV1
+from controlbox.protocol.commands import (
+    ReadValueCommandRequest,
+    ListObjectsCommandRequest,
+    DeleteObjectCommandRequest,
+    FreeSlotCommandRequest
+)
+
+
+class TestControlboxCommandMatcher:
+    def test_read_value_keys(self):
+        matcher = ControlboxCommandMatcher()
+
+        request = ReadValueCommandRequest.build({"id": [1, 2], "type": "TEMPERATURE_SENSOR"})
+        response = Container(opcode=1)(id=[1, 2])
+
+        assert matcher.request_key(request) == (1, (1, 2))
+        assert matcher.match(request, response)
+
+    def test_read_value_different_objects(self):
+        matcher = ControlboxCommandMatcher()
+
+        request = ReadValueCommandRequest.build({"id": [1], "type": "TEMPERATURE_SENSOR"})
+        response = Container(opcode=1)(id=[2])
+
+        assert not matcher.match(request, response)
+
+    def test_free_slot_keyed_by_container(self):
+        matcher = ControlboxCommandMatcher()
+
+        request = FreeSlotCommandRequest.build({"id": [1]})
+
+        assert matcher.request_key(request) == (6, (1,))
+        assert not matcher.match(request, Container(opcode=6)(id=[2])(slot=0))
+
+    def test_opcode_without_object(self):
+        matcher = ControlboxCommandMatcher()
+
+        request = ListObjectsCommandRequest.build({"profile_id": 0})
+        response = Container(opcode=5)(profile_id=0)(status=0)
+
+        assert matcher.request_key(request) == (5, None)
+        assert matcher.match(request, response)
+
+
+class FakeConduit:
+    def __init__(self):
+        self.written = []
+        self.framing = HexLineFraming()
+
+    @property
+    def is_bound(self):
+        return True
+
+    async def write(self, data):
+        self.written.append(data)
+
+
+class MessageConduit(FakeConduit):
+    def __init__(self, messages):
+        super(MessageConduit, self).__init__()
+        self.messages = messages
+
+    async def watch_messages(self):
+        for message in self.messages:
+            yield message
+
+
+class TestControllerPipelining:
+    @pytest.mark.asyncio
+    async def test_send_waits_for_window(self):
+        controller = Controller(FakeConduit(), max_in_flight=1, timeout=10)
+
+        first = await controller.send(ReadValueCommandRequest.build({"id": [1], "type": "TEMPERATURE_SENSOR"}))
+
+        second_send = asyncio.ensure_future(
+            controller.send(ReadValueCommandRequest.build({"id": [2], "type": "TEMPERATURE_SENSOR"})))
+        await asyncio.sleep(0.01)
+        assert not second_send.done()
+
+        controller.resolver.match_response(Container(opcode=1)(id=[1]))
+        second = await asyncio.wait_for(second_send, timeout=1)
+
+        assert first.done()
+        assert not second.done()
+        assert controller.window.in_flight == 1
+
+    @pytest.mark.asyncio
+    async def test_timeout_frees_slot(self):
+        controller = Controller(FakeConduit(), max_in_flight=2, timeout=0.01)
+
+        future = await controller.send(ListObjectsCommandRequest.build({"profile_id": 0}))
+
+        with pytest.raises(RequestTimeoutError):
+            await future
+
+        await asyncio.sleep(0)
+        assert controller.window.in_flight == 0
+        assert controller.window.size == 1
+
+
+    def test_needs_timeout(self):
+        with pytest.raises(ValueError):
+            Controller(FakeConduit(), max_in_flight=2)
+
+    @pytest.mark.asyncio
+    async def test_first_burst_is_not_the_whole_window(self):
+        conduit = FakeConduit()
+        controller = Controller(conduit, max_in_flight=8, timeout=10)
+
+        sends = [asyncio.ensure_future(controller.send(
+            ReadValueCommandRequest.build({"id": [i], "type": "TEMPERATURE_SENSOR"}))) for i in range(8)]
+        await asyncio.sleep(0.01)
+
+        assert len(conduit.written) == 1
+        for send in sends:
+            send.cancel()
+
+
+class TestControllerSingleFlight:
+    @pytest.mark.asyncio
+    async def test_identical_reads_share_request(self):
+        conduit = FakeConduit()
+        controller = Controller(conduit)
+        command = ReadValueCommandRequest.build({"id": [1], "type": "TEMPERATURE_SENSOR"})
+
+        first = await controller.send(command)
+        second = await controller.send(command)
+        assert len(conduit.written) == 1
+
+        controller.resolver.match_response(Container(opcode=1)(id=(1,)))
+        assert (await first) is (await second)
+
+    @pytest.mark.asyncio
+    async def test_caller_timing_out_doesnt_cancel_others(self):
+        conduit = FakeConduit()
+        controller = Controller(conduit)
+        command = ReadValueCommandRequest.build({"id": [1], "type": "TEMPERATURE_SENSOR"})
+
+        first = await controller.send(command)
+        second = await controller.send(command)
+
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(first, 0.01)
+
+        assert not second.cancelled()
+        response = Container(opcode=1)(id=(1,))
+        controller.resolver.match_response(response)
+        assert (await second) is response
+
+    @pytest.mark.asyncio
+    async def test_request_cancelled_once_every_caller_gave_up(self):
+        conduit = FakeConduit()
+        controller = Controller(conduit, max_in_flight=4, timeout=10)
+        command = ReadValueCommandRequest.build({"id": [1], "type": "TEMPERATURE_SENSOR"})
+
+        first = await controller.send(command)
+        second = await controller.send(command)
+        first.cancel()
+        await asyncio.sleep(0)
+        assert controller.window.in_flight == 1
+
+        second.cancel()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert controller.window.in_flight == 0
+        assert controller.resolver.unmatched_request_count == 0
+
+    @pytest.mark.asyncio
+    async def test_response_reused(self):
+        conduit = FakeConduit()
+        controller = Controller(conduit, reuse_time=10)
+        command = ListObjectsCommandRequest.build({"profile_id": 0})
+
+        first = await controller.send(command)
+        controller.resolver.match_response(Container(opcode=5)(profile_id=0))
+        await asyncio.sleep(0)
+
+        second = await controller.send(command)
+
+        assert (await second) is (await first)
+        assert len(conduit.written) == 1
+
+    @pytest.mark.asyncio
+    async def test_non_idempotent_not_shared(self):
+        conduit = FakeConduit()
+        controller = Controller(conduit, reuse_time=10)
+        command = DeleteObjectCommandRequest.build({"id": [1]})
+
+        await controller.send(command)
+        await controller.send(command)
+
+        assert len(conduit.written) == 2
+
+
+class TestControllerReadCache:
+    @pytest.mark.asyncio
+    async def test_read_served_from_cache(self):
+        conduit = FakeConduit()
+        controller = Controller(conduit, read_cache=ReadValueCache())
+        command = ReadValueCommandRequest.build({"id": [1], "type": "TEMPERATURE_SENSOR"})
+
+        future = await controller.send(command)
+        controller.resolver.match_response(Container(opcode=1)(id=[1])(expectedsize=0)(data=b"\x01"))
+        await asyncio.sleep(0)
+
+        cached = await controller.send(command)
+
+        assert cached.result() is future.result()
+        assert len(conduit.written) == 1
+        assert controller.read_cache.hits == 1
+
+    @pytest.mark.asyncio
+    async def test_delete_invalidates(self):
+        conduit = FakeConduit()
+        controller = Controller(conduit, read_cache=ReadValueCache())
+        command = ReadValueCommandRequest.build({"id": [1], "type": "TEMPERATURE_SENSOR"})
+
+        await controller.send(command)
+        controller.resolver.match_response(Container(opcode=1)(id=[1])(expectedsize=0)(data=b"\x01"))
+        await asyncio.sleep(0)
+
+        await controller.send(DeleteObjectCommandRequest.build({"id": [1]}))
+        await controller.send(command)
+
+        assert len(conduit.written) == 3
+        assert controller.read_cache.hits == 0
+
+    @pytest.mark.asyncio
+    async def test_failed_read_not_cached(self):
+        conduit = FakeConduit()
+        controller = Controller(conduit, read_cache=ReadValueCache())
+        command = ReadValueCommandRequest.build({"id": [1], "type": "TEMPERATURE_SENSOR"})
+
+        await controller.send(command)
+        controller.resolver.match_response(Container(opcode=1)(id=[1])(expectedsize=-1)(data=None))
+        await asyncio.sleep(0)
+        await controller.send(command)
+
+        assert len(conduit.written) == 2
+        assert controller.read_cache.hits == 0
+
+    @pytest.mark.asyncio
+    async def test_unknown_type_not_cached(self):
+        conduit = FakeConduit()
+        controller = Controller(conduit, read_cache=ReadValueCache())
+        command = ReadValueCommandRequest.build({"id": [1], "type": "TEMPERATURE_SENSOR"})[:-2] + b"\xf0\x00"
+
+        await controller.send(command)
+        assert controller.read_cache.misses == 0
+
+
+class TestControllerFraming:
+    @pytest.mark.asyncio
+    async def test_conduit_without_framing(self):
+        conduit = FakeConduit()
+        del conduit.framing
+        controller = Controller(conduit)
+        command = ListObjectsCommandRequest.build({"profile_id": 0})
+
+        await controller.send(command)
+
+        assert conduit.written == [hexlify(command) + b"\n"]
+
+
+class TestControllerSendMany:
+    @pytest.mark.asyncio
+    async def test_single_write(self):
+        conduit = FakeConduit()
+        controller = Controller(conduit)
+        commands = [ReadValueCommandRequest.build({"id": [i], "type": "TEMPERATURE_SENSOR"})
+                    for i in range(3)]
+
+        futures = await controller.send_many(commands)
+
+        assert len(futures) == 3
+        assert conduit.written == [b"".join(hexlify(command) + b"\n" for command in commands)]
+
+    @pytest.mark.asyncio
+    async def test_window_splits_writes(self):
+        conduit = FakeConduit()
+        controller = Controller(conduit, max_in_flight=2, timeout=10)
+        commands = [ReadValueCommandRequest.build({"id": [i], "type": "TEMPERATURE_SENSOR"})
+                    for i in range(3)]
+
+        send = asyncio.ensure_future(controller.send_many(commands))
+        await asyncio.sleep(0.01)
+        assert len(conduit.written) == 1
+
+        controller.resolver.match_response(Container(opcode=1)(id=[0]))
+        await asyncio.wait_for(send, timeout=1)
+        assert len(conduit.written) == 2
+
+    @pytest.mark.asyncio
+    async def test_as_completed(self):
+        controller = Controller(FakeConduit())
+        commands = [ReadValueCommandRequest.build({"id": [i], "type": "TEMPERATURE_SENSOR"})
+                    for i in range(3)]
+
+        async def respond():
+            await asyncio.sleep(0.01)
+            for i in (2, 0, 1):
+                controller.resolver.match_response(Container(opcode=1)(id=[i]))
+
+        asyncio.ensure_future(respond())
+
+        responses = [response async for response in controller.send_many_as_completed(commands)]
+
+        assert [response.id for response in responses] == [[2], [0], [1]]
+
+
+class TestControllerListObjects:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("lazy", [False, True])
+    async def test_yields_objects(self, lazy):
+        protocol = ProtocolV1(lazy=lazy)
+        controller = Controller(FakeConduit(), protocol)
+        msg = b"\x05\x00\x00\x00\x03\x01\x06\x13\x02\x01\x03\x00"
+
+        async def respond():
+            await asyncio.sleep(0.01)
+            controller.resolver.match_response(protocol.command_response_from_bytes(msg))
+
+        asyncio.ensure_future(respond())
+
+        objects = [obj async for obj in controller.list_objects(0)]
+
+        assert [obj.id for obj in objects] == [(1,)]
+        assert objects[0].data == [1, 3]
+
+
+class TestControllerDecodeExecutor:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("executor_class", [ThreadPoolExecutor, ProcessPoolExecutor])
+    async def test_responses_resolved_in_order(self, executor_class):
+        responses = [bytes([0x01, i, 0x06, 0x00, 0x06, 0x00]) for i in range(5)]
+        conduit = MessageConduit(responses[:2] + [b"\x01\x09"] + responses[2:])
+
+        with executor_class(max_workers=1) as executor:
+            controller = Controller(conduit, decode_executor=executor, decode_batch_size=2)
+            futures = await controller.send_many(
+                [ReadValueCommandRequest.build({"id": [i], "type": "TEMPERATURE_SENSOR"}) for i in range(5)])
+
+            resolved = []
+            for future in futures:
+                future.add_done_callback(lambda future: resolved.append(future.result().id))
+
+            await asyncio.wait_for(controller.process_messages(), timeout=5)
+            await asyncio.sleep(0)
+
+        assert resolved == [(0,), (1,), (2,), (3,), (4,)]
+
+    @pytest.mark.asyncio
+    async def test_latency_cap(self):
+        received = asyncio.Event()
+
+        class SlowConduit(FakeConduit):
+            async def watch_messages(self):
+                yield b"\x01\x01\x06\x00\x06\x00"
+                await received.wait()
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            controller = Controller(SlowConduit(), decode_executor=executor, decode_latency=0.01)
+            future = await controller.send(ReadValueCommandRequest.build({"id": [1], "type": "TEMPERATURE_SENSOR"}))
+            processing = asyncio.ensure_future(controller.process_messages())
+
+            response = await asyncio.wait_for(future, timeout=1)
+            received.set()
+            await processing
+
+        assert response.id == (1,)
+
+
+class FlakyConduit(FakeConduit):
+    """
+    A device that can be unplugged, answers READ_VALUE commands with an
+    empty value when answering, and fails to bind failed_binds times
+    """
+    def __init__(self, failed_binds=0):
+        super(FlakyConduit, self).__init__()
+        self.bound = True
+        self.answering = True
+        self.failed_binds = failed_binds
+        self.bind_count = 0
+        self.messages = asyncio.Queue()
+        self.decoder = self.framing.decoder()
+
+    def bind(self):
+        self.bind_count += 1
+        if self.bind_count <= self.failed_binds:
+            raise OSError("no such device")
+        self.bound = True
+
+    @property
+    def is_bound(self):
+        return self.bound
+
+    async def write(self, data):
+        await super(FlakyConduit, self).write(data)
+        for command in self.decoder.feed(data):
+            if self.answering and command[0] == 0x01:
+                self.messages.put_nowait(command + b"\x06\x00")
+
+    async def watch_messages(self):
+        while True:
+            message = await self.messages.get()
+            if message is None:
+                return
+            yield message
+
+    def close(self):
+        self.bound = False
+
+    def unplug(self):
+        self.bound = False
+        self.messages.put_nowait(None)
+
+
+class StaleConduit(FlakyConduit):
+    """
+    A FlakyConduit whose transport still looks open once unplugged, until
+    closed
+    """
+    def unplug(self):
+        self.messages.put_nowait(None)
+
+
+class DroppingConduit(FlakyConduit):
+    """
+    A FlakyConduit losing the connection as soon as it is bound
+    """
+    def bind(self):
+        super(DroppingConduit, self).bind()
+        self.messages.put_nowait(None)
+
+
+class TestControllerReconnect:
+    @pytest.mark.asyncio
+    async def test_replays_idempotent_requests(self):
+        conduit = FlakyConduit(failed_binds=2)
+        controller = Controller(conduit, reconnect=Backoff(initial=0.001, rng=lambda: 0.5))
+        running = asyncio.ensure_future(controller.run())
+
+        conduit.answering = False
+        read = await controller.send(ReadValueCommandRequest.build({"id": [1], "type": "TEMPERATURE_SENSOR"}))
+        delete = await controller.send(DeleteObjectCommandRequest.build({"id": [2]}))
+
+        conduit.answering = True
+        conduit.unplug()
+
+        with pytest.raises(ConnectionLostError):
+            await asyncio.wait_for(delete, timeout=1)
+
+        response = await asyncio.wait_for(read, timeout=1)
+
+        assert response.id == (1,)
+        assert conduit.bind_count == 3
+        assert controller.connection_lost_count == 1
+        assert 0 < controller.last_recovery_time < 1
+        assert len(conduit.written) == 3
+        running.cancel()
+
+    @pytest.mark.asyncio
+    async def test_failed_rebind_of_stale_conduit(self):
+        conduit = StaleConduit(failed_binds=2)
+        controller = Controller(conduit, reconnect=Backoff(initial=0.01, rng=lambda: 0.0))
+        running = asyncio.ensure_future(controller.run())
+
+        conduit.answering = False
+        read = await controller.send(ReadValueCommandRequest.build({"id": [1], "type": "TEMPERATURE_SENSOR"}))
+        conduit.answering = True
+        conduit.unplug()
+
+        await asyncio.sleep(0.005)
+        assert conduit.bind_count == 1
+        assert not controller.is_connected
+        assert controller.last_recovery_time is None
+
+        response = await asyncio.wait_for(read, timeout=1)
+
+        assert response.id == (1,)
+        assert conduit.bind_count == 3
+        assert controller.connection_lost_count == 1
+        assert len(controller.recovery_times) == 1
+        running.cancel()
+
+    @pytest.mark.asyncio
+    async def test_backoff_kept_across_quick_losses(self):
+        conduit = DroppingConduit()
+        controller = Controller(conduit, reconnect=Backoff(initial=0.01, maximum=1, rng=lambda: 0.0))
+        running = asyncio.ensure_future(controller.run())
+
+        conduit.unplug()
+        await asyncio.sleep(0.2)
+
+        # The first loss and those after binding again 0, 0.01, 0.03, 0.07
+        # and 0.15 seconds later
+        assert 1 < controller.connection_lost_count <= 6
+        running.cancel()
+
+    @pytest.mark.asyncio
+    async def test_without_reconnect_requests_fail(self):
+        conduit = FlakyConduit()
+        controller = Controller(conduit)
+        running = asyncio.ensure_future(controller.run())
+
+        conduit.answering = False
+        read = await controller.send(ReadValueCommandRequest.build({"id": [1], "type": "TEMPERATURE_SENSOR"}))
+        conduit.unplug()
+
+        with pytest.raises(ConnectionLostError):
+            await asyncio.wait_for(read, timeout=1)
+
+        await asyncio.wait_for(running, timeout=1)
+        assert controller.last_recovery_time is None
+
+
+class TestBackoff:
+    def test_delays(self):
+        backoff = Backoff(initial=1, maximum=5, factor=2, jitter=0.5, rng=lambda: 1.0)
+        delays = backoff.delays()
+
+        assert [next(delays) for i in range(6)] == [0.0, 0.5, 1.0, 2.0, 2.5, 2.5]
@@ -0,0 +1,115 @@
+import asyncio
+import pytest
+
+from controlbox.flow import InFlightWindow
+from controlbox.resolver import RequestTimeoutError
+
+
+class TestInFlightWindow:
+    @pytest.mark.asyncio
+    async def test_acquire_until_full(self):
+        window = InFlightWindow(2, adaptive=False)
+
+        await window.acquire()
+        await window.acquire()
+        assert window.in_flight == 2
+
+        blocked = asyncio.ensure_future(window.acquire())
+        await asyncio.sleep(0.01)
+        assert not blocked.done()
+
+        window.release()
+        await asyncio.wait_for(blocked, timeout=1)
+        assert window.in_flight == 2
+
+    @pytest.mark.asyncio
+    async def test_slow_start(self):
+        window = InFlightWindow(8, min_size=2)
+        assert window.size == 2
+
+        for i in range(3):
+            await window.acquire()
+            window.release()
+
+        assert window.size == 5
+
+    @pytest.mark.asyncio
+    async def test_timeout_shrinks_window(self):
+        window = InFlightWindow(8, min_size=2)
+        for i in range(6):
+            await window.acquire()
+            window.release()
+        assert window.size == 8
+
+        await window.acquire()
+        window.release(timed_out=True)
+        assert window.size == 4
+
+        # Reduced once per window of requests
+        for i in range(4):
+            await window.acquire()
+            window.release(timed_out=True)
+        assert window.size == 4
+
+        await window.acquire()
+        window.release(timed_out=True)
+        assert window.size == 2
+
+    @pytest.mark.asyncio
+    async def test_responses_grow_window(self):
+        window = InFlightWindow(4, min_size=1)
+
+        await window.acquire()
+        window.release(timed_out=True)
+        assert window.size == 1
+
+        for i in range(10):
+            await window.acquire()
+            window.release()
+
+        assert window.size == 4
+
+    @pytest.mark.asyncio
+    async def test_long_round_trips_shrink_window(self):
+        window = InFlightWindow(8)
+        for rtt in [0.01, 0.012, 0.01, 0.015, 0.011, 0.01, 0.013]:
+            await window.acquire()
+            window.release(rtt=rtt)
+        assert window.size == 8
+        assert window.min_rtt == 0.01
+
+        await window.acquire()
+        window.release(rtt=0.05)
+        assert window.size == 4
+
+    @pytest.mark.asyncio
+    async def test_release_future(self):
+        window = InFlightWindow(4)
+
+        sent_at = await window.acquire()
+        answered = asyncio.get_event_loop().create_future()
+        answered.set_result(None)
+        window.release_future(answered, sent_at)
+        assert window.size == 2
+        assert window.min_rtt is not None
+
+        await window.acquire()
+        expired = asyncio.get_event_loop().create_future()
+        expired.set_exception(RequestTimeoutError())
+        window.release_future(expired)
+        assert window.size == 1
+
+        await window.acquire()
+        cancelled = asyncio.get_event_loop().create_future()
+        cancelled.cancel()
+        window.release_future(cancelled)
+
+        assert window.in_flight == 0
+        assert window.size == 1
+
+    def test_not_adaptive_starts_full(self):
+        assert InFlightWindow(4, adaptive=False).size == 4
+
+    def test_invalid_sizes(self):
+        with pytest.raises(ValueError):
+            InFlightWindow(2, min_size=3)
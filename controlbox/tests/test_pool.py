@@ -0,0 +1,154 @@
+import asyncio
+
+import pytest
+
+from controlbox.controller import NotConnectedError
+from controlbox.pool import ControllerPool, RUNNING, DISCONNECTED, FAILED, STOPPED
+from controlbox.protocol.commands import ReadValueCommandRequest
+from test_controller import FakeConduit
+
+
+class EchoConduit(FakeConduit):
+    """
+    A device answering READ_VALUE commands with an empty value
+    """
+    def __init__(self):
+        super(EchoConduit, self).__init__()
+        self.bound = False
+        self.messages = asyncio.Queue()
+        self.decoder = self.framing.decoder()
+
+    def bind(self):
+        self.bound = True
+
+    @property
+    def is_bound(self):
+        return self.bound
+
+    async def write(self, data):
+        for command in self.decoder.feed(data):
+            self.messages.put_nowait(command + b"\x06\x00")
+
+    async def watch_messages(self):
+        while True:
+            message = await self.messages.get()
+            if message is None:
+                return
+            yield message
+
+    def unplug(self):
+        self.bound = False
+        self.messages.put_nowait(None)
+
+
+class BrokenConduit(EchoConduit):
+    async def watch_messages(self):
+        raise OSError("device failure")
+        yield
+
+
+class AsyncEchoConduit(EchoConduit):
+    """
+    An EchoConduit connecting asynchronously, or failing to with error
+    """
+    def __init__(self, error=None):
+        super(AsyncEchoConduit, self).__init__()
+        self.error = error
+
+    def bind(self):
+        return asyncio.ensure_future(self.open())
+
+    async def open(self):
+        await asyncio.sleep(0.01)
+        if self.error is not None:
+            raise self.error
+        self.bound = True
+
+
+read_value = ReadValueCommandRequest.build({"id": [1], "type": "TEMPERATURE_SENSOR"})
+
+
+class TestControllerPool:
+    @pytest.mark.asyncio
+    async def test_fan_out(self):
+        pool = ControllerPool()
+        for i in range(200):
+            pool.add(i, EchoConduit(), timeout=1)
+        pool.start()
+
+        responses = await pool.fan_out(read_value)
+
+        assert len(responses) == 200
+        assert all(response.id == (1,) for response in responses.values())
+        assert len(pool.healthy()) == 200
+        await pool.stop()
+
+    @pytest.mark.asyncio
+    async def test_unplugged_device_is_isolated(self):
+        pool = ControllerPool()
+        unplugged = EchoConduit()
+        pool.add("unplugged", unplugged, timeout=1)
+        pool.add("broken", BrokenConduit(), timeout=1)
+        pool.add("working", EchoConduit(), timeout=1)
+        pool.start()
+
+        unplugged.unplug()
+        await asyncio.sleep(0)
+
+        responses = await pool.fan_out(read_value)
+
+        assert isinstance(responses["unplugged"], NotConnectedError)
+        assert responses["working"].id == (1,)
+        assert pool.health("unplugged").state == DISCONNECTED
+        assert pool.health("unplugged").failures == 1
+        assert pool.health("broken").state == FAILED
+        assert isinstance(pool.health("broken").error, OSError)
+        assert pool.health("working").state == RUNNING
+        assert pool.healthy() == ["working"]
+        await pool.stop()
+
+    @pytest.mark.asyncio
+    async def test_add_while_running_and_remove(self):
+        pool = ControllerPool()
+        pool.start()
+
+        pool.add("late", EchoConduit(), timeout=1)
+        response = await (await pool.send("late", read_value))
+        assert response.id == (1,)
+
+        health = pool.health("late")
+        await pool.remove("late")
+
+        assert health.state == STOPPED
+        assert "late" not in pool
+
+    @pytest.mark.asyncio
+    async def test_commands_per_device(self):
+        pool = ControllerPool()
+        pool.add("a", EchoConduit())
+        pool.add("b", EchoConduit())
+        pool.start()
+
+        responses = await pool.fan_out({
+            "a": ReadValueCommandRequest.build({"id": [1], "type": "TEMPERATURE_SENSOR"}),
+            "b": ReadValueCommandRequest.build({"id": [2], "type": "TEMPERATURE_SENSOR"})
+        })
+
+        assert responses["a"].id == (1,)
+        assert responses["b"].id == (2,)
+        await pool.stop()
+
+    @pytest.mark.asyncio
+    async def test_asynchronous_connection(self):
+        pool = ControllerPool()
+        pool.add("connecting", AsyncEchoConduit(), timeout=1)
+        pool.add("refused", AsyncEchoConduit(ConnectionRefusedError()), timeout=1)
+        pool.start()
+
+        await asyncio.sleep(0.05)
+        response = await (await pool.send("connecting", read_value))
+
+        assert response.id == (1,)
+        assert pool.health("refused").state == FAILED
+        assert isinstance(pool.health("refused").error, ConnectionRefusedError)
+        await pool.stop()
@@ -6,7 +6,10 @@ import time
 
 from controlbox.resolver import (
     RequestResponseMatcher,
-    RequestResponseResolver
+    RequestResponseResolver,
+    RequestTimeoutError,
+    IndexedRequestResponseMatcher,
+    IndexedRequestResponseResolver
 )
 
 class TwoTimesMatcher(RequestResponseMatcher):
@@ -49,6 +52,40 @@ class TestResolver:
 
         assert resolver.unmatched_request_count == 0
 
+    @pytest.mark.asyncio
+    async def test_request_deadline(self):
+        resolver = RequestResponseResolver(TwoTimesMatcher())
+
+        future = resolver.queue_request(4, timeout=0.05)
+
+        with pytest.raises(RequestTimeoutError):
+            await asyncio.wait_for(future, timeout=1)
+
+        await asyncio.sleep(0)
+
+        assert resolver.unmatched_request_count == 0
+        assert resolver.expired_request_count == 1
+
+    @pytest.mark.asyncio
+    async def test_request_deadline_order(self):
+        resolver = RequestResponseResolver(TwoTimesMatcher())
+
+        late = resolver.queue_request(4, timeout=0.2)
+        early = resolver.queue_request(2, timeout=0.05)
+        answered = resolver.queue_request(1, timeout=0.01)
+        resolver.match_response(2)
+
+        with pytest.raises(RequestTimeoutError):
+            await early
+
+        assert not late.done()
+        assert answered.result() == 2
+
+        with pytest.raises(RequestTimeoutError):
+            await late
+
+        assert resolver.expired_request_count == 2
+
     @pytest.mark.asyncio
     async def test_add_many_requests(self):
         resolver = RequestResponseResolver(TwoTimesMatcher())
@@ -86,3 +123,79 @@ class TestResolver:
         assert future.result() == 8
 
         assert resolver.unmatched_request_count == 0
+
+
+class ParityMatcher(IndexedRequestResponseMatcher):
+    def request_key(self, aRequest):
+        return aRequest[0] % 2
+
+    def response_key(self, aResponse):
+        return aResponse % 2
+
+
+class TestIndexedResolver:
+    @pytest.mark.asyncio
+    async def test_match_ok(self):
+        resolver = IndexedRequestResponseResolver(ParityMatcher())
+
+        future = resolver.queue_request((4,))
+        resolver.match_response(8)
+
+        assert await asyncio.wait_for(future, timeout=3) == 8
+
+        await asyncio.sleep(0)
+        assert resolver.unmatched_request_count == 0
+
+    @pytest.mark.asyncio
+    async def test_match_by_key(self):
+        resolver = IndexedRequestResponseResolver(ParityMatcher())
+
+        even = resolver.queue_request((4,))
+        odd = resolver.queue_request((3,))
+
+        assert resolver.match_response(7) is odd
+        assert not even.done()
+        assert odd.result() == 7
+
+    @pytest.mark.asyncio
+    async def test_match_fifo(self):
+        resolver = IndexedRequestResponseResolver(ParityMatcher())
+
+        first = resolver.queue_request((2,))
+        second = resolver.queue_request((4,))
+
+        assert resolver.match_response(10) is first
+        assert resolver.match_response(12) is second
+        assert resolver.match_response(14) is None
+
+    @pytest.mark.asyncio
+    async def test_no_match(self):
+        resolver = IndexedRequestResponseResolver(ParityMatcher())
+
+        future = resolver.queue_request((2,))
+
+        assert resolver.match_response(1) is None
+        assert not future.done()
+
+    @pytest.mark.asyncio
+    async def test_cancelled_request_is_skipped(self):
+        resolver = IndexedRequestResponseResolver(ParityMatcher())
+
+        first = resolver.queue_request((2,))
+        second = resolver.queue_request((4,))
+        first.cancel()
+
+        await asyncio.sleep(0)
+        assert resolver.unmatched_request_count == 1
+
+        assert resolver.match_response(6) is second
+
+    @pytest.mark.asyncio
+    async def test_add_same_requests(self):
+        resolver = IndexedRequestResponseResolver(ParityMatcher())
+
+        future1 = resolver.queue_request((4,))
+        future2 = resolver.queue_request((4,))
+
+        assert future1 is future2
+        assert resolver.unmatched_request_count == 1
@@ -0,0 +1,135 @@
+import asyncio
+import functools
+import pickle
+import threading
+
+import pytest
+
+from controlbox.conduit.framing import HexLineFraming
+from controlbox.protocol.commands import ReadValueCommandRequest
+from controlbox.protocol.v1 import ProtocolV1
+from controlbox.sharding import ShardedControllers
+
+
+class EchoConduit:
+    """
+    A device answering READ_VALUE commands with its number as value
+    """
+    def __init__(self, number):
+        self.number = number
+        self.framing = HexLineFraming()
+        self.decoder = self.framing.decoder()
+        self.messages = asyncio.Queue()
+        self.is_bound = False
+
+    def bind(self):
+        self.is_bound = True
+
+    async def write(self, data):
+        for command in self.decoder.feed(data):
+            self.messages.put_nowait(command + b"\x06\x00\x01" + bytes([self.number]))
+
+    async def watch_messages(self):
+        while True:
+            yield await self.messages.get()
+
+
+def broken_conduit():
+    raise OSError("no such device")
+
+
+class LockedResponseProtocol(ProtocolV1):
+    """
+    A protocol decoding responses holding a lock, which can't be pickled
+    """
+    def command_response_from_bytes(self, msg):
+        response = super(LockedResponseProtocol, self).command_response_from_bytes(msg)
+        response.lock = threading.Lock()
+        return response
+
+
+read_value = ReadValueCommandRequest.build({"id": [1], "type": "TEMPERATURE_SENSOR"})
+
+
+class TestShardedControllers:
+    @pytest.mark.asyncio
+    async def test_routes_to_devices(self):
+        controllers = ShardedControllers(shards=2)
+        for i in range(6):
+            controllers.add(i, functools.partial(EchoConduit, i), timeout=5)
+
+        assert [controllers.shard(i) for i in range(6)] == [0, 1, 0, 1, 0, 1]
+
+        await controllers.start()
+        try:
+            responses = await asyncio.wait_for(controllers.fan_out(read_value), timeout=30)
+            single = await asyncio.wait_for(await controllers.send(3, read_value), timeout=5)
+        finally:
+            await controllers.stop()
+
+        assert {name: response.data for name, response in responses.items()} == \
+            {i: bytes([i]) for i in range(6)}
+        assert single.data == b"\x03"
+
+    @pytest.mark.asyncio
+    async def test_errors_come_back(self):
+        controllers = ShardedControllers(shards=1)
+        controllers.add("device", functools.partial(EchoConduit, 0), timeout=5)
+
+        await controllers.start()
+        try:
+            responses = await asyncio.wait_for(controllers.fan_out(read_value, names=["device", "unknown"]),
+                                               timeout=30)
+        finally:
+            await controllers.stop()
+
+        assert responses["device"].id == (1,)
+        assert isinstance(responses["unknown"], KeyError)
+
+    @pytest.mark.asyncio
+    async def test_unpicklable_result_fails_alone(self):
+        controllers = ShardedControllers(shards=1)
+        controllers.add("plain", functools.partial(EchoConduit, 0), timeout=5)
+        controllers.add("locked", functools.partial(EchoConduit, 1), protocol_factory=LockedResponseProtocol,
+                        timeout=5)
+
+        await controllers.start()
+        try:
+            responses = await asyncio.wait_for(controllers.fan_out(read_value), timeout=30)
+        finally:
+            await controllers.stop()
+
+        assert responses["plain"].data == b"\x00"
+        assert isinstance(responses["locked"], pickle.PicklingError)
+
+    @pytest.mark.asyncio
+    async def test_unpicklable_request_fails_alone(self):
+        controllers = ShardedControllers(shards=1)
+        controllers.add("a", functools.partial(EchoConduit, 0), timeout=5)
+        controllers.add("b", functools.partial(EchoConduit, 1), timeout=5)
+
+        await controllers.start()
+        try:
+            responses = await asyncio.wait_for(
+                controllers.fan_out({"a": read_value, "b": threading.Lock()}), timeout=30)
+        finally:
+            await controllers.stop()
+
+        assert responses["a"].data == b"\x00"
+        assert isinstance(responses["b"], pickle.PicklingError)
+
+    def test_protocol_instances_rejected(self):
+        controllers = ShardedControllers(shards=1)
+
+        with pytest.raises(TypeError):
+            controllers.add("device", functools.partial(EchoConduit, 0), aProtocol=ProtocolV1())
+        assert len(controllers) == 0
+
+    @pytest.mark.asyncio
+    async def test_worker_failing_to_start(self):
+        controllers = ShardedControllers(shards=2)
+        controllers.add("working", functools.partial(EchoConduit, 0))
+        controllers.add("broken", broken_conduit)
+
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(controllers.start(), timeout=30)
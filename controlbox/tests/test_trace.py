@@ -0,0 +1,65 @@
+import logging
+
+import pytest
+
+from controlbox.controller import Controller
+from controlbox.protocol.commands import ReadValueCommandRequest
+from controlbox.trace import FrameTrace, INBOUND, OUTBOUND
+from test_controller import MessageConduit
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 1.0
+        return self.now
+
+
+class TestFrameTrace:
+    def test_keeps_last_frames(self):
+        trace = FrameTrace(size=3, clock=FakeClock())
+
+        for i in range(5):
+            trace.outbound(bytes([i]))
+
+        assert len(trace) == 3
+        assert trace.frames() == [(3.0, OUTBOUND, b"\x02"), (4.0, OUTBOUND, b"\x03"), (5.0, OUTBOUND, b"\x04")]
+
+    def test_dump(self, caplog):
+        trace = FrameTrace(clock=FakeClock())
+        trace.outbound(b"\x01\x02")
+        trace.inbound(b"\xff")
+
+        with caplog.at_level(logging.WARNING):
+            trace.dump()
+
+        assert [record.getMessage() for record in caplog.records] == [
+            "1.000000 --> 0102",
+            "2.000000 <-- ff"
+        ]
+
+    def test_clear(self):
+        trace = FrameTrace(size=2)
+        trace.inbound(b"\x01")
+        trace.clear()
+
+        assert trace.frames() == []
+
+
+class TestControllerTrace:
+    @pytest.mark.asyncio
+    async def test_records_frames(self):
+        conduit = MessageConduit([b"\x01\x01\x06\x00\x06\x00", b"\x01\x01"])
+        controller = Controller(conduit, trace=FrameTrace())
+        command = ReadValueCommandRequest.build({"id": [1], "type": "TEMPERATURE_SENSOR"})
+
+        await controller.send(command)
+        await controller.process_messages()
+
+        assert [(direction, frame) for _, direction, frame in controller.trace.frames()] == [
+            (OUTBOUND, command),
+            (INBOUND, b"\x01\x01\x06\x00\x06\x00"),
+            (INBOUND, b"\x01\x01")
+        ]
@@ -0,0 +1,317 @@
+import asyncio
+import random
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+import pytest
+
+from controlbox.cache import ReadValueCache
+from controlbox.controller import Controller
+from controlbox.conduit.virtual import VirtualControllerConduit
+from controlbox.resolver import RequestTimeoutError
+from controlbox.virtual import VirtualController
+from controlbox.protocol.v1 import ProtocolV1
+from controlbox.protocol.commands import (
+    ReadValueCommandRequest,
+    WriteValueCommandRequest,
+    SetMaskValueCommandRequest,
+    CreateObjectCommandRequest,
+    DeleteObjectCommandRequest,
+    ListObjectsCommandRequest,
+    FreeSlotCommandRequest,
+    FreeSlotRootCommandRequest,
+    CreateProfileCommandRequest,
+    DeleteProfileCommandRequest,
+    ActivateProfileCommandRequest,
+    ListProfilesCommandRequest,
+    LogValuesCommandRequest,
+    ResetCommandRequest,
+    ReadSystemValueCommandRequest,
+    SetSystemValueCommandRequest
+)
+
+decoder = ProtocolV1().decoder
+
+
+def create_object(object_id, data=b"\x01\x02"):
+    return CreateObjectCommandRequest.build(
+        {"id": object_id, "type": "SETPOINT_SIMPLE", "reserved_size": 4, "data": data})
+
+
+def read_value(object_id):
+    return ReadValueCommandRequest.build({"id": object_id, "type": "SETPOINT_SIMPLE"})
+
+
+class TestVirtualController:
+    def process(self, device, command):
+        return decoder.from_bytes(device.process_command_request(command))
+
+    def test_create_and_read_object(self):
+        device = VirtualController()
+
+        assert self.process(device, create_object([1])).status == 0
+        response = self.process(device, read_value([1]))
+
+        assert response.id == (1,)
+        assert response.expectedsize == 0
+        assert response.data == b"\x01\x02"
+
+    def test_read_missing_object(self):
+        response = self.process(VirtualController(), read_value([1]))
+
+        assert response.expectedsize == -1
+        assert response.data is None
+
+    def test_create_object_needs_container(self):
+        device = VirtualController()
+
+        assert self.process(device, create_object([1, 2])).status == -1
+        assert self.process(device, create_object([1])).status == 0
+        assert self.process(device, create_object([1, 2])).status == 0
+        assert self.process(device, create_object([1, 2])).status == -1
+
+    def test_write_and_mask_value(self):
+        device = VirtualController()
+        self.process(device, create_object([1]))
+
+        write = WriteValueCommandRequest.build({"id": [1], "type": "SETPOINT_SIMPLE", "data": b"\x10\x20"})
+        assert self.process(device, write).status == 0
+
+        mask = SetMaskValueCommandRequest.build(
+            {"id": [1], "type": "SETPOINT_SIMPLE", "data": b"\xff\xff", "mask": b"\x0f\x00"})
+        assert self.process(device, mask).status == 0
+        assert self.process(device, read_value([1])).data == b"\x1f\x20"
+
+    def test_delete_container_deletes_content(self):
+        device = VirtualController()
+        self.process(device, create_object([1]))
+        self.process(device, create_object([1, 0]))
+        self.process(device, create_object([2]))
+
+        delete = DeleteObjectCommandRequest.build({"id": [1]})
+        assert self.process(device, delete).status == 0
+        assert self.process(device, delete).status == -1
+
+        assert list(device.objects) == [(2,)]
+
+    def test_list_objects(self):
+        device = VirtualController()
+        self.process(device, create_object([2], b"\x02"))
+        self.process(device, create_object([1], b"\x01"))
+
+        response = self.process(device, ListObjectsCommandRequest.build({"profile_id": 0}))
+
+        assert response.status == 0
+        assert [obj.id for obj in response.objects] == [(1,), (2,)]
+        assert [bytes(obj.data) for obj in response.objects] == [b"\x01", b"\x02"]
+
+        response = self.process(device, ListObjectsCommandRequest.build({"profile_id": 3}))
+        assert response.status == -1
+        assert response.objects == []
+
+    def test_free_slots(self):
+        device = VirtualController()
+        self.process(device, create_object([0]))
+        self.process(device, create_object([0, 0]))
+        self.process(device, create_object([0, 1]))
+
+        assert self.process(device, FreeSlotRootCommandRequest.build({})).slot == 1
+        assert self.process(device, FreeSlotCommandRequest.build({"id": [0]})).slot == 2
+        assert self.process(device, FreeSlotCommandRequest.build({"id": [5]})).slot == -1
+
+    def test_profiles(self):
+        device = VirtualController(max_profiles=2)
+        self.process(device, create_object([1]))
+
+        assert self.process(device, CreateProfileCommandRequest.build({})).profile_id == 1
+        assert self.process(device, CreateProfileCommandRequest.build({})).profile_id == -1
+
+        activate = ActivateProfileCommandRequest.build({"profile_id": 1})
+        assert self.process(device, activate).status == 0
+        assert self.process(device, ListProfilesCommandRequest.build({})).active_profile == 1
+        assert self.process(device, read_value([1])).expectedsize == -1
+
+        assert self.process(device, DeleteProfileCommandRequest.build({"profile_id": 1})).status == 0
+        assert self.process(device, ListProfilesCommandRequest.build({})).active_profile == 0xFF
+        assert self.process(device, create_object([1])).status == -1
+
+    def test_log_values(self):
+        device = VirtualController()
+        self.process(device, create_object([1], b"\x01"))
+        self.process(device, create_object([1, 0], b"\x02"))
+        self.process(device, create_object([2], b"\x03"))
+
+        response = self.process(device, LogValuesCommandRequest.build({"flags": {"id_chain": False}, "id": None}))
+        assert [(entry.id, entry.data) for entry in response.entries] == [
+            ((1,), b"\x01"), ((1, 0), b"\x02"), ((2,), b"\x03")]
+
+        response = self.process(device, LogValuesCommandRequest.build({"flags": {"id_chain": True}, "id": [1]}))
+        assert [(entry.id, entry.data) for entry in response.entries] == [((1, 0), b"\x02")]
+
+    def test_reset_erases_profiles_not_system_values(self):
+        device = VirtualController()
+        self.process(device, create_object([1]))
+        set_system = SetSystemValueCommandRequest.build({"id": [2], "type": 3, "data": b"ab"})
+        assert self.process(device, set_system).status == 0
+
+        reset = ResetCommandRequest.build({"flags": {"erase_eeprom": True}})
+        assert self.process(device, reset).status == 0
+
+        assert device.profiles == {}
+        response = self.process(device, ReadSystemValueCommandRequest.build({"id": [2], "type": 3}))
+        assert response.data == b"ab"
+
+    def test_no_response(self):
+        device = VirtualController()
+
+        assert device.process_command_request(b"\x0d") is None
+        assert device.process_command_request(b"\x01") is None
+        assert device.process_command_request(b"\xf0") is None
+
+    def test_latency_by_opcode(self):
+        device = VirtualController(latency={"READ_VALUE": 0.5})
+
+        assert device.latency(read_value([1])) == 0.5
+        assert device.latency(create_object([1])) == 0.0
+
+
+@asynccontextmanager
+async def running_controller(conduit, **kwargs):
+    controller = Controller(conduit, **kwargs)
+    controller.connect()
+    task = asyncio.ensure_future(controller.run())
+    try:
+        yield controller
+    finally:
+        conduit.close()
+        await task
+
+
+class TestVirtualControllerConduit:
+    @pytest.mark.asyncio
+    async def test_round_trips(self):
+        conduit = VirtualControllerConduit(VirtualController())
+        async with running_controller(conduit, timeout=1) as controller:
+            assert (await (await controller.send(create_object([1])))).status == 0
+
+            futures = [await controller.send(read_value([1])) for i in range(100)]
+            responses = await asyncio.gather(*futures)
+
+        assert all(response.data == b"\x01\x02" for response in responses)
+
+    @pytest.mark.asyncio
+    async def test_latency_processes_commands_in_sequence(self):
+        loop = asyncio.get_event_loop()
+        conduit = VirtualControllerConduit(VirtualController(latency=0.01))
+        async with running_controller(conduit, timeout=1) as controller:
+            start = loop.time()
+            futures = [await controller.send(create_object([i])) for i in range(5)]
+            await asyncio.gather(*futures)
+
+        assert loop.time() - start >= 0.05
+
+    @pytest.mark.asyncio
+    async def test_baud_rate_throttles(self):
+        loop = asyncio.get_event_loop()
+        # The command and its response are hexadecimal lines of 15 and 17
+        # bytes, taking 0.32 seconds on the line at 1000 baud
+        conduit = VirtualControllerConduit(VirtualController(), baud_rate=1000)
+        async with running_controller(conduit, timeout=1) as controller:
+            start = loop.time()
+            await (await controller.send(create_object([1])))
+
+        assert loop.time() - start >= 0.3
+
+    @pytest.mark.asyncio
+    async def test_dropped_responses_time_out(self):
+        conduit = VirtualControllerConduit(VirtualController(), drop_rate=1.0)
+        async with running_controller(conduit, timeout=0.01) as controller:
+            with pytest.raises(RequestTimeoutError):
+                await (await controller.send(read_value([1])))
+
+        assert conduit.dropped == 1
+
+    @pytest.mark.asyncio
+    async def test_dropped_response_frees_its_slot(self):
+        conduit = VirtualControllerConduit(VirtualController(), drop_rate=1.0)
+        async with running_controller(conduit, max_in_flight=4, timeout=0.05) as controller:
+            lost = await controller.send(read_value([1]))
+            conduit.drop_rate = 0.0
+            with pytest.raises(RequestTimeoutError):
+                await lost
+
+            response = await asyncio.wait_for(await controller.send(read_value([2])), timeout=1)
+
+        assert response.expectedsize == -1
+        assert controller.window.in_flight == 0
+
+    @pytest.mark.asyncio
+    async def test_corrupted_responses(self):
+        device = VirtualController()
+        for i in range(16):
+            device.process_command_request(create_object([i]))
+
+        conduit = VirtualControllerConduit(device, corrupt_rate=0.5, rng=random.Random(1))
+        async with running_controller(conduit, timeout=0.05) as controller:
+            futures = [await controller.send(read_value([i])) for i in range(16)]
+            results = await asyncio.gather(*futures, return_exceptions=True)
+
+        assert conduit.corrupted > 0
+        assert any(not isinstance(result, Exception) for result in results)
+
+    @pytest.mark.asyncio
+    async def test_read_cache_follows_device(self):
+        conduit = VirtualControllerConduit(VirtualController())
+        async with running_controller(conduit, timeout=1, read_cache=ReadValueCache()) as controller:
+            assert (await (await controller.send(read_value([1])))).expectedsize == -1
+
+            await (await controller.send(create_object([1], b"\x01")))
+            assert (await (await controller.send(read_value([1])))).data == b"\x01"
+
+            await (await controller.send(create_object([1, 0], b"\x02")))
+            assert (await (await controller.send(read_value([1, 0])))).data == b"\x02"
+
+            await (await controller.send(DeleteObjectCommandRequest.build({"id": [1]})))
+            assert (await (await controller.send(read_value([1, 0])))).expectedsize == -1
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("executor", [None, ThreadPoolExecutor(1)])
+    async def test_log_values_fed_to_log_decoder(self, executor):
+        pytest.importorskip("numpy")
+        from controlbox.protocol.columnar import LogValuesDecoder, id_key
+
+        device = VirtualController()
+        device.process_command_request(create_object([1], b"\x00\x01"))
+        device.process_command_request(create_object([2], b"\x00\x02"))
+        log_decoder = LogValuesDecoder()
+        log_values = LogValuesCommandRequest.build({"flags": {"id_chain": False}, "id": None})
+
+        # Counts the responses parsed into a Container per entry
+        protocol = ProtocolV1()
+        parsed = []
+        parse = protocol.decoder._parsers[log_values[0]]
+        protocol.decoder._parsers[log_values[0]] = lambda msg: parsed.append(msg) or parse(msg)
+
+        conduit = VirtualControllerConduit(device)
+        async with running_controller(conduit, aProtocol=protocol, timeout=1, log_decoder=log_decoder,
+                                      decode_executor=executor) as controller:
+            responses = [await (await controller.send(log_values)) for i in range(3)]
+
+        values = log_decoder.batch()
+        assert list(values['id']) == [id_key((1,)), id_key((2,))] * 3
+        assert list(values['value']) == [1.0, 2.0] * 3
+        assert parsed == []
+
+        assert len(responses[0].entries) == 2
+        assert len(parsed) == 1
+
+    @pytest.mark.asyncio
+    async def test_closed_conduit_ends_messages(self):
+        conduit = VirtualControllerConduit(VirtualController())
+        conduit.bind()
+        conduit.close()
+
+        assert not conduit.is_bound
+        assert [message async for message in conduit.watch_messages()] == []
+        with pytest.raises(ConnectionError):
+            await conduit.write(b"0500\n")
@@ -0,0 +1,77 @@
+"""
+Tracing of the frames exchanged with a controller device.
+"""
+import logging
+import time
+from binascii import hexlify
+
+LOGGER = logging.getLogger(__name__)
+
+INBOUND = "<--"
+OUTBOUND = "-->"
+
+
+class FrameTrace:
+    """
+    Keeps the last frames sent to and received from a device, with the
+    monotonic time they were seen at, in a ring buffer allocated up front.
+
+    Tracing is disabled by not giving a FrameTrace to the controller, which
+    then only checks for its presence. Frames are stored as they are, and
+    only formatted when the trace is dumped.
+    """
+    def __init__(self, size=1024, clock=time.monotonic):
+        if size < 1:
+            raise ValueError("trace size must be at least 1")
+
+        self.size = size
+        self.clock = clock
+        self._times = [0.0] * size
+        self._directions = [None] * size
+        self._frames = [None] * size
+        self._next = 0
+        self._count = 0
+
+    def record(self, direction, frame: bytes):
+        """
+        Record a frame going in direction, INBOUND or OUTBOUND
+        """
+        index = self._next
+        self._times[index] = self.clock()
+        self._directions[index] = direction
+        self._frames[index] = frame
+
+        self._next = (index + 1) % self.size
+        if self._count < self.size:
+            self._count += 1
+
+    def inbound(self, frame: bytes):
+        self.record(INBOUND, frame)
+
+    def outbound(self, frame: bytes):
+        self.record(OUTBOUND, frame)
+
+    def frames(self):
+        """
+        Return the recorded frames as (time, direction, frame) tuples, oldest
+        first
+        """
+        start = (self._next - self._count) % self.size
+        indexes = [(start + i) % self.size for i in range(self._count)]
+        return [(self._times[i], self._directions[i], self._frames[i]) for i in indexes]
+
+    def dump(self, aLogger=LOGGER, level=logging.WARNING):
+        """
+        Log the recorded frames, oldest first, as hexadecimal
+        """
+        for timestamp, direction, frame in self.frames():
+            aLogger.log(level, "{0:.6f} {1} {2}".format(timestamp, direction,
+                                                        hexlify(frame).decode()))
+
+    def clear(self):
+        self._frames = [None] * self.size
+        self._next = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
@@ -0,0 +1,263 @@
+"""
+An in-memory controller device, to exercise controllers without hardware.
+"""
+import logging
+
+from construct import ConstructError
+
+from .protocol.commands import CBoxOpcodeEnum
+from .protocol.v1 import ProtocolV1
+
+LOGGER = logging.getLogger(__name__)
+
+# Children a container can have, the last byte of an ID holding 4 bits
+MAX_SLOTS = 16
+
+OK = 0
+ERROR = -1
+NO_PROFILE = -1
+
+
+class VirtualObject:
+    """
+    An object created on a VirtualController
+    """
+    __slots__ = ('type', 'reserved_size', 'data')
+
+    def __init__(self, object_type, reserved_size, data: bytes):
+        self.type = object_type
+        self.reserved_size = reserved_size
+        self.data = data
+
+    def __repr__(self):
+        return "<VirtualObject {0} {1}>".format(self.type, self.data.hex())
+
+
+class VirtualController:
+    """
+    Answers the commands of a protocol like a device would.
+
+    Objects are kept per profile, by ID, and created in the active profile.
+    Profile 0 is created and active to start with. System objects, read
+    and written with READ_SYSTEM_VALUE and SET_SYSTEM_VALUE, are kept
+    apart and survive resets.
+
+    Failing commands get a response with a negative status. Commands that
+    can't be decoded, and UNUSED, get no response.
+
+    latency is the time, in seconds, the device takes to process a command;
+    it may be given as a dict mapping opcode names to their latency, with
+    the commands not in it processed instantly. It is applied by the
+    VirtualControllerConduit the device is reached through.
+    """
+    def __init__(self, latency=0.0, max_profiles=4, aProtocol=ProtocolV1()):
+        self.max_profiles = max_profiles
+        self.command_mapping = aProtocol.command_mapping
+        self.set_latency(latency)
+
+        self.profiles = {0: {}}
+        self.active_profile = 0
+        self.system_objects = {}
+
+        self._handlers = {
+            opcode: getattr(self, '_' + name.lower())
+            for opcode, name in CBoxOpcodeEnum.decmapping.items()
+            if isinstance(opcode, int) and name != 'UNUSED'
+        }
+
+    def set_latency(self, latency):
+        """
+        Set the processing time of commands, a number of seconds for all of
+        them or a dict of seconds by opcode name
+        """
+        if isinstance(latency, dict):
+            self._latency = [0.0] * 256
+            for name, seconds in latency.items():
+                self._latency[CBoxOpcodeEnum.encmapping[name]] = seconds
+        else:
+            self._latency = [latency] * 256
+
+    def latency(self, aRequest: bytes) -> float:
+        """
+        Return the time taken to process a command
+        """
+        return self._latency[aRequest[0]] if aRequest else 0.0
+
+    @property
+    def objects(self):
+        """
+        The objects of the active profile
+        """
+        return self.profiles.get(self.active_profile)
+
+    def process_command_request(self, aRequest: bytes):
+        """
+        Process a command and return the bytes of its response, or None when
+        it gets no response
+        """
+        if not aRequest:
+            return None
+
+        opcode = aRequest[0]
+        try:
+            handler = self._handlers[opcode]
+            request_struct, response_struct = self.command_mapping[opcode]
+            command = request_struct.parse(aRequest)
+        except KeyError:
+            LOGGER.debug("unknown command {0}".format(aRequest))
+            return None
+        except ConstructError as e:
+            LOGGER.debug("malformed command {0}: {1}".format(aRequest, e))
+            return None
+
+        response = dict(command)
+        response.update(handler(command))
+        return response_struct.build(response)
+
+    # Objects
+
+    def _read_value(self, command):
+        objects = self.objects or {}
+        obj = objects.get(command.id)
+        if obj is None:
+            return {'expectedsize': ERROR, 'real-type': command.type, 'data': None}
+
+        return {'expectedsize': command.size, 'real-type': obj.type, 'data': obj.data}
+
+    def _write_value(self, command):
+        obj = (self.objects or {}).get(command.id)
+        if obj is None or obj.type != command.type:
+            return {'status': ERROR}
+
+        obj.data = command.data
+        return {'status': OK}
+
+    def _set_mask_value(self, command):
+        obj = (self.objects or {}).get(command.id)
+        if obj is None or obj.type != command.type or len(command.mask) != len(command.data):
+            return {'status': ERROR}
+
+        old = obj.data.ljust(len(command.data), b"\x00")
+        obj.data = bytes([(o & ~m) | (n & m) for o, n, m in zip(old, command.data, command.mask)]) \
+            + old[len(command.data):]
+        return {'status': OK}
+
+    def _create_object(self, command):
+        objects = self.objects
+        object_id = command.id
+        if (objects is None or object_id in objects
+                or (len(object_id) > 1 and object_id[:-1] not in objects)):
+            return {'status': ERROR}
+
+        objects[object_id] = VirtualObject(command.type, command.reserved_size, bytes(command.data))
+        return {'status': OK}
+
+    def _delete_object(self, command):
+        objects = self.objects
+        object_id = command.id
+        if objects is None or object_id not in objects:
+            return {'status': ERROR}
+
+        # Deleting a container deletes its content
+        depth = len(object_id)
+        for other_id in [other_id for other_id in objects if other_id[:depth] == object_id]:
+            del objects[other_id]
+
+        return {'status': OK}
+
+    def _list_objects(self, command):
+        objects = self.profiles.get(command.profile_id)
+        if objects is None:
+            return {'status': ERROR, 'objects': []}
+
+        return {'status': OK, 'objects': [
+            {'id': object_id, 'type': obj.type, 'reserved_size': obj.reserved_size, 'data': obj.data}
+            for object_id, obj in sorted(objects.items())
+        ]}
+
+    def _free_slot_in(self, container_id):
+        objects = self.objects
+        if objects is None:
+            return ERROR
+
+        depth = len(container_id) + 1
+        used = {object_id[-1] for object_id in objects
+                if len(object_id) == depth and object_id[:-1] == container_id}
+        return next((slot for slot in range(MAX_SLOTS) if slot not in used), ERROR)
+
+    def _free_slot(self, command):
+        if command.id not in (self.objects or {}):
+            return {'slot': ERROR}
+
+        return {'slot': self._free_slot_in(command.id)}
+
+    def _free_slot_root(self, command):
+        return {'slot': self._free_slot_in(())}
+
+    def _log_values(self, command):
+        objects = self.objects or {}
+        if command.flags.id_chain:
+            prefix = command.id
+            depth = len(prefix)
+            if prefix not in objects:
+                return {'entries': []}
+        else:
+            prefix = ()
+            depth = 0
+
+        return {'entries': [
+            {'id': object_id, 'data': obj.data}
+            for object_id, obj in sorted(objects.items())
+            if len(object_id) > depth and object_id[:depth] == prefix
+        ]}
+
+    # Profiles
+
+    def _create_profile(self, command):
+        profile_id = next((i for i in range(self.max_profiles) if i not in self.profiles), ERROR)
+        if profile_id != ERROR:
+            self.profiles[profile_id] = {}
+
+        return {'profile_id': profile_id}
+
+    def _delete_profile(self, command):
+        if self.profiles.pop(command.profile_id, None) is None:
+            return {'status': ERROR}
+
+        if self.active_profile == command.profile_id:
+            self.active_profile = NO_PROFILE
+        return {'status': OK}
+
+    def _activate_profile(self, command):
+        if command.profile_id != NO_PROFILE and command.profile_id not in self.profiles:
+            return {'status': ERROR}
+
+        self.active_profile = command.profile_id
+        return {'status': OK}
+
+    def _list_profiles(self, command):
+        return {'active_profile': self.active_profile & 0xFF}
+
+    # System
+
+    def _reset(self, command):
+        if command.flags.erase_eeprom:
+            self.profiles = {}
+            self.active_profile = NO_PROFILE
+
+        return {'status': OK}
+
+    def _read_system_value(self, command):
+        obj = self.system_objects.get(command.id)
+        if obj is None:
+            return {'expectedsize': ERROR, 'real-type': command.type, 'data': None}
+
+        return {'expectedsize': command.size, 'real-type': obj.type, 'data': obj.data}
+
+    def _set_system_value(self, command):
+        obj = self.system_objects.get(command.id)
+        if obj is not None and obj.type != command.type:
+            return {'status': ERROR}
+
+        self.system_objects[command.id] = VirtualObject(command.type, len(command.data), command.data)
+        return {'status': OK}